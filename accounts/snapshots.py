@@ -0,0 +1,177 @@
+"""
+Снапшоты статистики профиля.
+
+Агрегаты для страницы профиля считаются в Celery после событий, которые их
+меняют (завершение теста, вердикт проверки кода, лайк, решение запроса
+помощи), и кладутся в кэш одним ключом. Страница читает готовый снапшот;
+синхронный пересчёт — только если снапшота нет.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum, Max, Count, Q
+
+# Версия схемы снапшота: при изменении состава полей увеличить —
+# старые ключи просто перестанут читаться.
+PROFILE_SNAPSHOT_VERSION = 1
+PROFILE_SNAPSHOT_TIMEOUT = 60 * 60 * 24  # страховка от пропущенных событий
+
+
+def _snapshot_key(user_id):
+    return f'profile_snapshot:v{PROFILE_SNAPSHOT_VERSION}:{user_id}'
+
+
+def build_profile_snapshot(user):
+    """Считает все агрегаты профиля. Результат сериализуем (без ORM-объектов)."""
+    from quizzes.models import (
+        UserResult, UserAnswer, Quiz,
+        ExamTaskProgress, HelpRequest,
+    )
+
+    # === Базовая статистика ===
+    results = UserResult.objects.filter(user=user)
+    total_attempts = results.count()
+    unique_quizzes = results.values('quiz').distinct().count()
+
+    answers = UserAnswer.objects.filter(user_result__user=user)
+    total_answers = answers.values('question').distinct().count()
+    correct_answers = answers.filter(is_correct=True).values('question').distinct().count()
+
+    # Суммарное время
+    total_time = results.aggregate(t=Sum('duration'))['t']
+
+    # === Статистика по типам вопросов (уникальные вопросы) ===
+    type_stats_qs = (
+        answers
+        .values('question__question_type')
+        .annotate(
+            total=Count('question', distinct=True),
+            correct=Count('question', distinct=True, filter=Q(is_correct=True)),
+        )
+    )
+    type_stats = {}
+    for row in type_stats_qs:
+        qtype = row['question__question_type']
+        total = row['total']
+        correct = row['correct']
+        pct = round(correct / total * 100) if total > 0 else 0
+        type_stats[qtype] = {'total': total, 'correct': correct, 'pct': pct}
+
+    # === Статистика по тестам (лучший результат на каждый квиз) ===
+    quiz_stats = list(
+        results
+        .values('quiz__id', 'quiz__title')
+        .annotate(
+            best_score=Max('score'),
+            attempts=Count('id'),
+        )
+        .order_by('-best_score')
+    )
+    # Добавляем total вопросов для каждого квиза
+    quiz_ids = [qs['quiz__id'] for qs in quiz_stats]
+    quiz_totals = dict(
+        Quiz.objects.filter(id__in=quiz_ids)
+        .annotate(q_count=Count('questions'))
+        .values_list('id', 'q_count')
+    )
+    for qs in quiz_stats:
+        total_q = quiz_totals.get(qs['quiz__id'], 0)
+        qs['total'] = total_q
+        qs['pct'] = round(qs['best_score'] / total_q * 100) if total_q > 0 else 0
+
+    # === ЕГЭ прогресс ===
+    # Считаем всегда: флаг is_ege берётся из профиля при рендере
+    ege_agg = ExamTaskProgress.objects.filter(user=user).aggregate(
+        total=Count('id'),
+        solved=Count('id', filter=Q(is_solved=True)),
+        time_sec=Sum('time_spent_seconds'),
+    )
+    ege_stats = {
+        'total': ege_agg['total'] or 0,
+        'solved': ege_agg['solved'] or 0,
+        'time': timedelta(seconds=ege_agg['time_sec'] or 0),
+        'pct': round(ege_agg['solved'] / ege_agg['total'] * 100) if ege_agg['total'] else 0,
+    }
+
+    # === Последние результаты ===
+    # annotate max_score через Count чтобы избежать N+1 запросов
+    recent_results = [
+        {
+            'quiz': {'title': r.quiz.title, 'quiz_type': r.quiz.quiz_type},
+            'score': r.score,
+            'max_score': r.max_score,
+            'date_completed': r.date_completed,
+        }
+        for r in (
+            results
+            .select_related('quiz')
+            .annotate(max_score=Count('quiz__questions', distinct=True))
+            .order_by('-date_completed')[:5]
+        )
+    ]
+
+    # === Помощь ===
+    help_agg = HelpRequest.objects.filter(student=user).aggregate(
+        total=Count('id'),
+        resolved=Count('id', filter=Q(status='resolved')),
+    )
+
+    # === Лайки ===
+    likes_received = UserAnswer.objects.filter(
+        user_result__user=user, like_count__gt=0,
+    ).aggregate(total=Sum('like_count'))['total'] or 0
+
+    return {
+        'total_attempts': total_attempts,
+        'unique_quizzes': unique_quizzes,
+        'total_answers': total_answers,
+        'correct_answers': correct_answers,
+        'total_time': total_time,
+        'type_stats': type_stats,
+        'quiz_stats': quiz_stats,
+        'ege_stats': ege_stats,
+        'recent_results': recent_results,
+        'help_total': help_agg['total'],
+        'help_resolved': help_agg['resolved'],
+        'likes_received': likes_received,
+    }
+
+
+def refresh_profile_snapshot(user):
+    """Пересчитывает снапшот и записывает его в кэш."""
+    snapshot = build_profile_snapshot(user)
+    try:
+        cache.set(_snapshot_key(user.id), snapshot, PROFILE_SNAPSHOT_TIMEOUT)
+    except Exception:
+        pass  # кэш недоступен — страница посчитает синхронно
+    return snapshot
+
+
+def get_profile_snapshot(user):
+    """Снапшот из кэша; при промахе — синхронный пересчёт (fallback)."""
+    try:
+        snapshot = cache.get(_snapshot_key(user.id))
+    except Exception:
+        snapshot = None
+    if snapshot is None:
+        snapshot = refresh_profile_snapshot(user)
+    return snapshot
+
+
+def schedule_profile_snapshot(user_id):
+    """
+    Ставит пересчёт снапшота в очередь после коммита текущей транзакции.
+    Если брокер недоступен — сбрасывает ключ, чтобы страница пересчитала сама.
+    """
+    def _enqueue():
+        from .tasks import refresh_profile_snapshot_task
+        try:
+            refresh_profile_snapshot_task.delay(user_id)
+        except Exception:
+            try:
+                cache.delete(_snapshot_key(user_id))
+            except Exception:
+                pass
+
+    transaction.on_commit(_enqueue)
@@ -0,0 +1,13 @@
+from celery import shared_task
+
+
+@shared_task
+def refresh_profile_snapshot_task(user_id):
+    """Пересчёт снапшота статистики профиля (см. accounts.snapshots)."""
+    from django.contrib.auth.models import User
+    from .snapshots import refresh_profile_snapshot
+
+    user = User.objects.filter(id=user_id).first()
+    if not user:
+        return
+    refresh_profile_snapshot(user)
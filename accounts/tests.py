@@ -1,3 +1,69 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from quizzes.models import Quiz, UserResult
+
+from . import snapshots
+from .snapshots import get_profile_snapshot, schedule_profile_snapshot
+from .tasks import refresh_profile_snapshot_task
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProfileSnapshotTests(TestCase):
+    """accounts.snapshots: пересчёт после коммита и версия схемы в ключе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student')
+        cls.quiz = Quiz.objects.create(title='Тест')
+
+    def setUp(self):
+        cache.clear()
+
+    def _finish_quiz(self):
+        UserResult.objects.create(user=self.user, quiz=self.quiz, score=1)
+        schedule_profile_snapshot(self.user.id)
+
+    def test_rebuilt_after_commit(self):
+        self.assertEqual(get_profile_snapshot(self.user)['total_attempts'], 0)
+
+        # Задача выполняется сразу, как при работающем воркере
+        run_now = mock.patch.object(refresh_profile_snapshot_task, 'delay', side_effect=refresh_profile_snapshot_task)
+        with run_now as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self._finish_quiz()
+                delay.assert_not_called()
+                # До коммита страница видит прежний снапшот
+                self.assertEqual(get_profile_snapshot(self.user)['total_attempts'], 0)
+        delay.assert_called_once_with(self.user.id)
+
+        with mock.patch.object(snapshots, 'build_profile_snapshot') as build:
+            self.assertEqual(get_profile_snapshot(self.user)['total_attempts'], 1)
+        build.assert_not_called()
+
+    def test_broker_down_drops_snapshot(self):
+        get_profile_snapshot(self.user)
+        with mock.patch.object(refresh_profile_snapshot_task, 'delay', side_effect=ConnectionError):
+            with self.captureOnCommitCallbacks(execute=True):
+                self._finish_quiz()
+        self.assertIsNone(cache.get(snapshots._snapshot_key(self.user.id)))
+        self.assertEqual(get_profile_snapshot(self.user)['total_attempts'], 1)
+
+    def test_schema_version_in_key(self):
+        old_key = snapshots._snapshot_key(self.user.id)
+        get_profile_snapshot(self.user)
+        self.assertIsNotNone(cache.get(old_key))
+
+        with mock.patch.object(snapshots, 'PROFILE_SNAPSHOT_VERSION', snapshots.PROFILE_SNAPSHOT_VERSION + 1):
+            new_key = snapshots._snapshot_key(self.user.id)
+            self.assertNotEqual(new_key, old_key)
+            # Снапшот прежней схемы не читается — пересчитывается под новым ключом
+            with mock.patch.object(snapshots, 'build_profile_snapshot', return_value={'v': 2}) as build:
+                self.assertEqual(get_profile_snapshot(self.user), {'v': 2})
+            build.assert_called_once_with(self.user)
+            self.assertEqual(cache.get(new_key), {'v': 2})
@@ -27,4 +27,12 @@ app.conf.beat_schedule = {
         'task': 'quizzes.tasks.cleanup_stale_submissions',
         'schedule': 1800,  # every 30 minutes
     },
+    'flush-exam-time-buffer': {
+        'task': 'quizzes.tasks.flush_exam_time_buffer',
+        'schedule': 30,  # every 30 seconds
+    },
+    'reconcile-help-unread-counters': {
+        'task': 'quizzes.tasks.reconcile_help_unread_counters',
+        'schedule': 300,  # every 5 minutes
+    },
 }
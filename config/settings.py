@@ -152,6 +152,8 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # If True, download endpoints will use Nginx X-Accel-Redirect to stream files.
 # Enable on production behind Nginx with an internal location mapping to MEDIA_ROOT.
 USE_X_ACCEL_REDIRECT = os.getenv('USE_X_ACCEL_REDIRECT', 'False') == 'True'
+# Internal location в Nginx, отображённый на MEDIA_ROOT (см. pages/downloads.py)
+X_ACCEL_REDIRECT_LOCATION = os.getenv('X_ACCEL_REDIRECT_LOCATION', '/protected-media/')
 
 # Redirect to home URL after login (Default redirects to /accounts/profile/)
 LOGIN_REDIRECT_URL = '/'
@@ -171,16 +173,31 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 300  # 5 minutes max per task
 CELERY_RESULT_EXPIRES = 3600  # результаты задач хранятся 1 час (вместо 24ч по умолчанию)
 
+REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+
 # Django Channels Configuration
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            'hosts': [(os.getenv('REDIS_HOST', 'localhost'), int(os.getenv('REDIS_PORT', 6379)))],
+            'hosts': [(REDIS_HOST, REDIS_PORT)],
         },
     },
 }
 
+# Cache (Redis, отдельная БД от брокера и channel layer)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', f'redis://{REDIS_HOST}:{REDIS_PORT}/1'),
+        'KEY_PREFIX': 'kl',
+    },
+}
+
+# Прямой доступ к Redis для атомарных счётчиков и буферов (HINCRBY и т.п.)
+REDIS_URL = os.getenv('REDIS_URL', f'redis://{REDIS_HOST}:{REDIS_PORT}/2')
+
 # Logging configuration
 LOGGING = {
     'version': 1,
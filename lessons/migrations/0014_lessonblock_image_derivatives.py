@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0013_lesson_upload_paths_per_lesson'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonblock',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Производные изображения'),
+        ),
+    ]
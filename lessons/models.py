@@ -216,6 +216,13 @@ class LessonBlock(models.Model):
         null=True,
         verbose_name="Изображение"
     )
+    # WebP/AVIF-копии разных ширин, собираются в фоне (pages/images.py)
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Производные изображения"
+    )
     order = models.PositiveIntegerField(
         default=0,
         verbose_name="Порядок отображения"
@@ -1,20 +1,10 @@
-import mimetypes
-import os
-import re
-from urllib.parse import quote
-
 from django.shortcuts import render, get_object_or_404
-from django.http import FileResponse, Http404
+from django.http import Http404
 
+from pages.downloads import serve_file
 from .models import Lesson, Section, LessonAttachment
 
 
-def _attachment_content_disposition(filename: str) -> str:
-    safe = (filename or "download").replace("\r", "").replace("\n", "")
-    ascii_fallback = re.sub(r"[^A-Za-z0-9.\-_]", "_", safe) or "download"
-    return f'attachment; filename="{ascii_fallback}"; filename*=UTF-8\'\'{quote(safe)}'
-
-
 def lesson_list_view(request):
     sections = Section.objects.prefetch_related('lessons').all()
     orphan_lessons = Lesson.objects.filter(section__isnull=True)
@@ -45,17 +35,7 @@ def lesson_file_download_view(request, lesson_id, attachment_id):
     )
     if not attachment.file:
         raise Http404("Файл не найден")
-
-    filename = os.path.basename(attachment.file.name)
-    content_type, _ = mimetypes.guess_type(filename)
-
-    response = FileResponse(
-        attachment.file.open("rb"),
-        as_attachment=True,
-        content_type=content_type or "application/octet-stream",
-    )
-    response["Content-Disposition"] = _attachment_content_disposition(filename)
-    return response
+    return serve_file(request, attachment.file)
 
 
 def presentation_pdf_download_view(request, lesson_id):
@@ -63,14 +43,4 @@ def presentation_pdf_download_view(request, lesson_id):
     lesson = get_object_or_404(Lesson, id=lesson_id)
     if not lesson.presentation_pdf:
         raise Http404("PDF не найден")
-
-    filename = os.path.basename(lesson.presentation_pdf.name)
-    content_type, _ = mimetypes.guess_type(filename)
-
-    response = FileResponse(
-        lesson.presentation_pdf.open("rb"),
-        as_attachment=True,
-        content_type=content_type or "application/pdf",
-    )
-    response["Content-Disposition"] = _attachment_content_disposition(filename)
-    return response
+    return serve_file(request, lesson.presentation_pdf)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PagesConfig(AppConfig):
     name = 'pages'
+
+    def ready(self):
+        from .signals import connect_image_signals
+        connect_image_signals()
@@ -2,15 +2,21 @@ import re
 from pathlib import Path
 from django.conf import settings
 
+from .file_cache import cached_file_content
+
+VERSION_RE = re.compile(r'^## \[(.+?)\]', re.MULTILINE)
+
+
+def _latest_version(text):
+    m = VERSION_RE.search(text)
+    return m.group(1) if m else '0.0.1'
+
 
 def app_version(request):
-    """Добавляет текущую версию из CHANGELOG.md в контекст всех шаблонов."""
+    """
+    Добавляет текущую версию из CHANGELOG.md в контекст всех шаблонов.
+    Файл перечитывается только при изменении (pages/file_cache.py).
+    """
     changelog_path = Path(settings.BASE_DIR) / 'CHANGELOG.md'
-    version = '0.0.1'
-    if changelog_path.exists():
-        for line in changelog_path.read_text(encoding='utf-8').splitlines():
-            m = re.match(r'^## \[(.+?)\]', line)
-            if m:
-                version = m.group(1)
-                break
+    version = cached_file_content(changelog_path, _latest_version, default='0.0.1')
     return {'APP_VERSION': version}
@@ -0,0 +1,154 @@
+"""
+Отдача загруженных файлов (вложения уроков, PDF презентаций, файлы задач,
+материалы к решениям).
+
+serve_file() — единая точка для download-вьюх:
+- USE_X_ACCEL_REDIRECT=True: Django только проверяет доступ и отдаёт Nginx
+  заголовок X-Accel-Redirect (internal location X_ACCEL_REDIRECT_LOCATION
+  → MEDIA_ROOT). Range, ETag и кэширование Nginx обслуживает сам.
+- иначе файл отдаётся из Django, но с ETag/Last-Modified (304/412 по
+  If-None-Match, If-Modified-Since и т.д.) и одиночными Range-запросами
+  (206/416, If-Range) — докачка больших PDF не перечитывает файл целиком.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def attachment_content_disposition(filename: str) -> str:
+    """
+    Nginx-friendly Content-Disposition:
+    - ASCII fallback in filename=""
+    - RFC 5987 filename*=UTF-8''...
+    Also strips CR/LF to prevent header injection / invalid headers.
+    """
+    safe = (filename or "download").replace("\r", "").replace("\n", "")
+    ascii_fallback = re.sub(r"[^A-Za-z0-9.\-_]", "_", safe) or "download"
+    return f'attachment; filename="{ascii_fallback}"; filename*=UTF-8\'\'{quote(safe)}'
+
+
+def _x_accel_response(field_file, content_type, disposition):
+    location = settings.X_ACCEL_REDIRECT_LOCATION.rstrip('/')
+    response = HttpResponse(content_type=content_type)
+    response['X-Accel-Redirect'] = f'{location}/{quote(field_file.name)}'
+    response['Content-Disposition'] = disposition
+    return response
+
+
+def parse_range(header, size):
+    """
+    Одиночный диапазон из заголовка Range: (start, end) включительно.
+    None — заголовок не поддерживается (отдаём файл целиком),
+    'unsatisfiable' — диапазон за пределами файла (416).
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N — последние N байт
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return (max(0, size - length), size - 1)
+    start = int(first)
+    if start >= size:
+        return 'unsatisfiable'
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return (start, min(end, size - 1))
+
+
+def _if_range_matches(request, etag, last_modified):
+    """If-Range: ETag (сильное сравнение) или дата Last-Modified."""
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    value = value.strip()
+    if value.startswith('"'):
+        return value == etag
+    if value.startswith('W/'):
+        return False
+    return parse_http_date_safe(value) == last_modified
+
+
+def _read_range(f, start, length):
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def serve_file(request, field_file, filename=None, content_type=None):
+    """Ответ на скачивание FieldFile (вложение с корректным именем файла)."""
+    if not field_file:
+        raise Http404("Файл не найден")
+
+    filename = filename or os.path.basename(field_file.name)
+    if content_type is None:
+        content_type, _ = mimetypes.guess_type(filename)
+        content_type = content_type or "application/octet-stream"
+    disposition = attachment_content_disposition(filename)
+
+    if settings.USE_X_ACCEL_REDIRECT:
+        return _x_accel_response(field_file, content_type, disposition)
+
+    storage = field_file.storage
+    try:
+        size = storage.size(field_file.name)
+        last_modified = int(storage.get_modified_time(field_file.name).timestamp())
+    except (OSError, NotImplementedError):
+        raise Http404("Файл не найден")
+    # Как у Nginx: время изменения и размер в hex
+    etag = f'"{last_modified:x}-{size:x}"'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        not_modified['Last-Modified'] = http_date(last_modified)
+        return not_modified
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(range_header, size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(field_file.open('rb'), start, length),
+            status=206, content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+        response['Content-Disposition'] = disposition
+    else:
+        response = FileResponse(field_file.open('rb'), as_attachment=True, content_type=content_type)
+        response['Content-Disposition'] = disposition
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
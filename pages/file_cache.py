@@ -0,0 +1,51 @@
+"""
+Кэш содержимого файлов, разобранного в Python-структуры.
+
+cached_file_content(path, parser) вызывает parser(text) один раз на процесс
+и повторяет разбор, только когда у файла меняется mtime или размер (одна
+stat() на обращение вместо чтения и разбора). Подходит для любого
+контента страниц, который берётся из файлов в репозитории (CHANGELOG.md и т.п.).
+
+Результат общий для всех запросов процесса — вызывающий код не должен его
+изменять.
+"""
+import threading
+from pathlib import Path
+
+_entries = {}
+_lock = threading.Lock()
+
+
+def cached_file_content(path, parser, default=None):
+    """
+    parser(text) для файла path с кэшем по (path, parser) → (mtime, size).
+    Если файла нет — default.
+    """
+    path = Path(path)
+    try:
+        stat = path.stat()
+    except OSError:
+        return default
+    signature = (stat.st_mtime_ns, stat.st_size)
+    key = (str(path), parser)
+
+    entry = _entries.get(key)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        try:
+            text = path.read_text(encoding='utf-8')
+        except OSError:
+            return default
+        value = parser(text)
+        _entries[key] = (signature, value)
+    return value
+
+
+def clear_file_cache():
+    with _lock:
+        _entries.clear()
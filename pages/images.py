@@ -0,0 +1,191 @@
+"""
+Адаптивные производные изображений.
+
+Для загруженных картинок (QuestionImage, LessonBlock, ContentBlock,
+TheoryBlock) Celery-задача строит обрезанные по image_crop_* и уменьшенные
+копии в WebP и AVIF нескольких ширин. Имя файла содержит хэш содержимого,
+поэтому Nginx может отдавать derivatives/ с immutable-кэшированием.
+
+Описание производных хранится в поле image_derivatives модели:
+    {
+        "source": "<image.name>", "crop": [x, y, w, h] | null,
+        "width": 1280, "height": 720,
+        "webp": [[320, "<name>"], ...], "avif": [[320, "<name>"], ...]
+    }
+Пока описание не совпадает с текущим файлом и кропом, шаблоны отдают
+оригинал — как раньше. Оригинал остаётся доступен по прямой ссылке.
+"""
+import hashlib
+import io
+import os
+
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+# Модели с полями image и image_derivatives (подключаются в pages/signals.py)
+IMAGE_DERIVATIVE_MODELS = [
+    'quizzes.QuestionImage',
+    'lessons.LessonBlock',
+    'pages.ContentBlock',
+    'spetskurs.TheoryBlock',
+]
+
+DERIVATIVE_WIDTHS = (320, 640, 960, 1280)
+# Порядок важен: в <picture> первым идёт более компактный формат
+DERIVATIVE_FORMATS = (
+    ('avif', 'AVIF', {'quality': 55}),
+    ('webp', 'WEBP', {'quality': 80, 'method': 6}),
+)
+
+
+def crop_params(instance):
+    """Кроп из image_crop_* в пикселях исходника или None (у моделей без кропа — None)."""
+    width = getattr(instance, 'image_crop_width', 0) or 0
+    height = getattr(instance, 'image_crop_height', 0) or 0
+    if width <= 0 or height <= 0:
+        return None
+    return [instance.image_crop_x or 0, instance.image_crop_y or 0, width, height]
+
+
+def derivatives_fresh(instance):
+    """Описание производных соответствует текущему файлу и кропу."""
+    data = instance.image_derivatives or {}
+    return (
+        bool(instance.image)
+        and data.get('source') == instance.image.name
+        and data.get('crop') == crop_params(instance)
+    )
+
+
+def derivative_sources(instance):
+    """{формат: [(ширина, url), ...]} для свежих производных, иначе None."""
+    if not derivatives_fresh(instance):
+        return None
+    storage = instance.image.storage
+    sources = {}
+    for ext, _fmt, _options in DERIVATIVE_FORMATS:
+        entries = instance.image_derivatives.get(ext)
+        if entries:
+            sources[ext] = [(width, storage.url(name)) for width, name in entries]
+    return sources or None
+
+
+def srcset(entries):
+    return ', '.join(f'{url} {width}w' for width, url in entries)
+
+
+def _crop_box(instance, image):
+    crop = crop_params(instance)
+    if not crop:
+        return None
+    x, y, width, height = crop
+    # Кроп задан в координатах image_natural_*; файл мог быть заменён другим размером
+    scale_x = image.width / instance.image_natural_width if getattr(instance, 'image_natural_width', 0) else 1
+    scale_y = image.height / instance.image_natural_height if getattr(instance, 'image_natural_height', 0) else 1
+    left = max(0, round(x * scale_x))
+    top = max(0, round(y * scale_y))
+    right = min(image.width, round((x + width) * scale_x))
+    bottom = min(image.height, round((y + height) * scale_y))
+    if right - left < 1 or bottom - top < 1:
+        return None
+    return (left, top, right, bottom)
+
+
+def _target_widths(source_width):
+    largest = min(source_width, DERIVATIVE_WIDTHS[-1])
+    return [w for w in DERIVATIVE_WIDTHS if w < largest] + [largest]
+
+
+def _derivative_dir(instance):
+    meta = instance._meta
+    return f'derivatives/{meta.app_label}/{meta.model_name}/{instance.pk}'
+
+
+def build_derivatives(instance):
+    """Строит и сохраняет производные, возвращает описание для image_derivatives."""
+    storage = instance.image.storage
+    with instance.image.open('rb') as f:
+        image = Image.open(f)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    box = _crop_box(instance, image)
+    if box:
+        image = image.crop(box)
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    stem = os.path.splitext(os.path.basename(instance.image.name))[0]
+    directory = _derivative_dir(instance)
+    widths = _target_widths(image.width)
+    data = {
+        'source': instance.image.name,
+        'crop': crop_params(instance),
+        'width': widths[-1],
+        'height': round(image.height * widths[-1] / image.width),
+    }
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for ext, fmt, options in DERIVATIVE_FORMATS:
+            if ext == 'avif' and not features.check('avif'):
+                continue
+            buffer = io.BytesIO()
+            resized.save(buffer, fmt, **options)
+            content = buffer.getvalue()
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            name = f'{directory}/{stem}-{width}w.{digest}.{ext}'
+            if not storage.exists(name):
+                storage.save(name, io.BytesIO(content))
+            data.setdefault(ext, []).append([width, name])
+    return data
+
+
+def _derivative_names(data):
+    names = set()
+    for ext, _fmt, _options in DERIVATIVE_FORMATS:
+        names.update(name for _width, name in (data or {}).get(ext, []))
+    return names
+
+
+def delete_derivative_files(storage, data, keep=()):
+    for name in _derivative_names(data) - set(keep):
+        try:
+            storage.delete(name)
+        except Exception:
+            pass
+
+
+def refresh_derivatives(instance, force=False):
+    """
+    Пересобирает производные, если файл или кроп изменились.
+    Сохраняет через save(update_fields), чтобы сработали сигналы модели
+    (например, пересчёт HTML вопроса). Возвращает True, если обновлено.
+    """
+    if not instance.image:
+        return False
+    if not force and derivatives_fresh(instance):
+        return False
+    old = instance.image_derivatives or {}
+    data = build_derivatives(instance)
+    instance.image_derivatives = data
+    instance.save(update_fields=['image_derivatives'])
+    delete_derivative_files(instance.image.storage, old, keep=_derivative_names(data))
+    return True
+
+
+def schedule_derivatives(instance):
+    """Ставит сборку производных в очередь после коммита транзакции."""
+    label = instance._meta.label
+    pk = instance.pk
+
+    def _enqueue():
+        from .tasks import build_image_derivatives_task
+        try:
+            build_image_derivatives_task.delay(label, pk)
+        except Exception:
+            # Без брокера страницы продолжат отдавать оригинал
+            pass
+
+    transaction.on_commit(_enqueue)
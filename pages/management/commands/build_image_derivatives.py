@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from pages.images import IMAGE_DERIVATIVE_MODELS, refresh_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Собирает WebP/AVIF-производные загруженных изображений (pages/images.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', choices=IMAGE_DERIVATIVE_MODELS,
+            help='Только указанная модель (например, quizzes.QuestionImage)',
+        )
+        parser.add_argument('--force', action='store_true', help='Пересобрать даже актуальные производные')
+
+    def handle(self, *args, **options):
+        labels = [options['model']] if options['model'] else IMAGE_DERIVATIVE_MODELS
+
+        for label in labels:
+            model = apps.get_model(label)
+            updated = failed = 0
+            for instance in model.objects.exclude(image='').exclude(image__isnull=True).order_by('pk').iterator(chunk_size=100):
+                try:
+                    if refresh_derivatives(instance, force=options['force']):
+                        updated += 1
+                except (OSError, ValueError) as exc:
+                    failed += 1
+                    self.stderr.write(f'{label} #{instance.pk}: {exc}')
+            self.stdout.write(self.style.SUCCESS(f'{label}: обновлено {updated}, ошибок {failed}'))
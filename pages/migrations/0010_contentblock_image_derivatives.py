@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0009_contentblock_image_border_radius_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentblock',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Производные изображения'),
+        ),
+    ]
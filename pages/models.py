@@ -82,6 +82,13 @@ class ContentBlock(models.Model):
         null=True,
         verbose_name="Изображение"
     )
+    # WebP/AVIF-копии разных ширин, собираются в фоне (pages/images.py)
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Производные изображения"
+    )
     link_url = models.CharField(
         max_length=200,
         blank=True,
@@ -0,0 +1,34 @@
+"""
+Сигналы pages: сборка производных изображений (pages.images) для моделей
+из IMAGE_DERIVATIVE_MODELS. Подключаются в PagesConfig.ready().
+"""
+from django.apps import apps
+from django.db.models.signals import post_save, post_delete
+
+from .images import (
+    IMAGE_DERIVATIVE_MODELS, delete_derivative_files, derivatives_fresh, schedule_derivatives,
+)
+
+
+def image_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.image:
+        if not derivatives_fresh(instance):
+            schedule_derivatives(instance)
+    elif instance.image_derivatives:
+        # Картинку убрали — производные больше не нужны
+        delete_derivative_files(instance.image.storage, instance.image_derivatives)
+        sender.objects.filter(pk=instance.pk).update(image_derivatives={})
+
+
+def image_deleted(sender, instance, **kwargs):
+    if instance.image_derivatives:
+        delete_derivative_files(instance.image.storage, instance.image_derivatives)
+
+
+def connect_image_signals():
+    for label in IMAGE_DERIVATIVE_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(image_saved, sender=model, dispatch_uid=f'image_derivatives_save:{label}')
+        post_delete.connect(image_deleted, sender=model, dispatch_uid=f'image_derivatives_delete:{label}')
@@ -0,0 +1,14 @@
+from celery import shared_task
+
+
+@shared_task
+def build_image_derivatives_task(label, pk):
+    """Сборка WebP/AVIF-производных картинки (см. pages.images)."""
+    from django.apps import apps
+    from .images import refresh_derivatives
+
+    model = apps.get_model(label)
+    instance = model.objects.filter(pk=pk).first()
+    if not instance:
+        return
+    refresh_derivatives(instance)
@@ -0,0 +1,40 @@
+from django import template
+from django.utils.html import format_html_join
+
+from pages.images import derivative_sources, srcset
+
+register = template.Library()
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+@register.simple_tag
+def image_sources(obj, sizes='100vw'):
+    """
+    <source> с AVIF/WebP srcset по производным картинки (pages/images.py)
+    для <picture>. Пока производных нет — пусто, браузер берёт <img>.
+
+    <picture>
+        {% image_sources block "(max-width: 768px) 100vw, 768px" %}
+        <img src="{{ block|image_src }}" alt="..." class="...">
+    </picture>
+    """
+    if not obj or not obj.image:
+        return ''
+    sources = derivative_sources(obj) or {}
+    return format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[ext], srcset(entries), sizes) for ext, entries in sources.items()),
+    )
+
+
+@register.filter
+def image_src(obj):
+    """URL для <img>: самая широкая WebP-производная или оригинал, если производных ещё нет."""
+    if not obj or not obj.image:
+        return ''
+    sources = derivative_sources(obj)
+    if not sources:
+        return obj.image.url
+    entries = sources.get('webp') or next(iter(sources.values()))
+    return entries[-1][1]
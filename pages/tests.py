@@ -1,3 +1,256 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from .downloads import serve_file
+from .file_cache import cached_file_content, clear_file_cache
+from .images import derivatives_fresh, refresh_derivatives
+from .models import ContentBlock
+from .tasks import build_image_derivatives_task
+
+CONTENT = bytes(range(256)) * 4  # 1024 байта
+
+
+class TempMediaMixin:
+    """Временный MEDIA_ROOT на класс: создаётся в setUpClass, удаляется после его тестов."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+        super().setUpClass()
+
+
+@override_settings(USE_X_ACCEL_REDIRECT=False)
+class ServeFileTests(TempMediaMixin, SimpleTestCase):
+    """pages.downloads.serve_file: Range, условные запросы, X-Accel-Redirect."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(cls.media_root, 'content'))
+        with open(os.path.join(cls.media_root, 'content', 'data.pdf'), 'wb') as f:
+            f.write(CONTENT)
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        # Любой FieldFile подходит — берём поле image блока контента
+        self.field_file = ContentBlock(image='content/data.pdf').image
+
+    def _get(self, **headers):
+        return serve_file(self.factory.get('/download/', headers=headers), self.field_file)
+
+    def _body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_response(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('attachment; filename="data.pdf"', response['Content-Disposition'])
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self._body(response), CONTENT)
+
+    def test_partial_content(self):
+        response = self._get(Range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self._body(response), CONTENT[10:20])
+
+    def test_open_ended_and_suffix_ranges(self):
+        response = self._get(Range='bytes=1000-')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(self._body(response), CONTENT[1000:])
+
+        response = self._get(Range='bytes=-5')
+        self.assertEqual(response['Content-Range'], 'bytes 1019-1023/1024')
+        self.assertEqual(self._body(response), CONTENT[-5:])
+
+        # Конец за пределами файла обрезается по размеру
+        response = self._get(Range='bytes=1020-5000')
+        self.assertEqual(response['Content-Range'], 'bytes 1020-1023/1024')
+        self.assertEqual(self._body(response), CONTENT[1020:])
+
+    def test_unsatisfiable_range(self):
+        response = self._get(Range='bytes=2048-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_unsupported_range_returns_full_file(self):
+        response = self._get(Range='bytes=0-1,5-6')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), CONTENT)
+
+    def test_conditional_requests(self):
+        etag = self._get()['ETag']
+        last_modified = self._get()['Last-Modified']
+
+        response = self._get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        self.assertEqual(self._get(If_Modified_Since=last_modified).status_code, 304)
+        self.assertEqual(self._get(If_Match='"other"').status_code, 412)
+
+    def test_if_range(self):
+        etag = self._get()['ETag']
+        response = self._get(Range='bytes=0-9', If_Range=etag)
+        self.assertEqual(response.status_code, 206)
+
+        # Файл изменился — вместо диапазона отдаётся целиком
+        response = self._get(Range='bytes=0-9', If_Range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), CONTENT)
+
+    @override_settings(USE_X_ACCEL_REDIRECT=True, X_ACCEL_REDIRECT_LOCATION='/protected-media/')
+    def test_x_accel_redirect(self):
+        response = self._get(Range='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/content/data.pdf')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        self.assertEqual(response.content, b'')
+
+
+def png_upload(width=700, height=400, name='photo.png'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (30, 120, 200)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageDerivativesTests(TempMediaMixin, TestCase):
+    """pages.images: сборка производных, задача по сигналу и теги image_tags."""
+
+    def _block(self, **fields):
+        # Сигнал ставит задачу только после коммита — здесь он не срабатывает
+        return ContentBlock.objects.create(page='home', block_type='image', image=png_upload(), **fields)
+
+    def test_save_schedules_task_after_commit(self):
+        with mock.patch.object(build_image_derivatives_task, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                block = self._block()
+                delay.assert_not_called()
+        delay.assert_called_once_with('pages.ContentBlock', block.pk)
+
+    def test_task_builds_derivatives(self):
+        block = self._block()
+        with mock.patch.object(build_image_derivatives_task, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                build_image_derivatives_task('pages.ContentBlock', block.pk)
+        block.refresh_from_db()
+        data = block.image_derivatives
+
+        self.assertTrue(derivatives_fresh(block))
+        self.assertEqual((data['width'], data['height']), (700, 400))
+        self.assertEqual([width for width, _name in data['webp']], [320, 640, 700])
+        for _width, name in data['webp'] + data.get('avif', []):
+            self.assertTrue(block.image.storage.exists(name))
+        # Сохранение описания производных задачу повторно не ставит
+        delay.assert_not_called()
+
+    def test_crop_and_stale_files(self):
+        block = self._block()
+        refresh_derivatives(block)
+        old_names = [name for _width, name in block.image_derivatives['webp']]
+        self.assertFalse(refresh_derivatives(block))
+
+        block.image_crop_x, block.image_crop_y = 100, 50
+        block.image_crop_width, block.image_crop_height = 200, 100
+        block.image_natural_width, block.image_natural_height = 700, 400
+        self.assertFalse(derivatives_fresh(block))
+        self.assertTrue(refresh_derivatives(block))
+
+        data = block.image_derivatives
+        self.assertEqual(data['crop'], [100, 50, 200, 100])
+        self.assertEqual((data['width'], data['height']), (200, 100))
+        self.assertEqual([width for width, _name in data['webp']], [200])
+        for name in old_names:
+            self.assertFalse(block.image.storage.exists(name))
+
+    def _render(self, block):
+        return Template(
+            '{% load image_tags %}{% image_sources block "50vw" %}|{{ block|image_src }}'
+        ).render(Context({'block': block}))
+
+    def test_tags_without_derivatives(self):
+        block = self._block()
+        self.assertEqual(self._render(block), f'|{block.image.url}')
+
+        # Описание от прежнего файла не используется
+        refresh_derivatives(block)
+        block.image.save('other.png', png_upload(name='other.png'), save=False)
+        self.assertEqual(self._render(block), f'|{block.image.url}')
+
+        self.assertEqual(self._render(ContentBlock(page='home')), '|')
+
+    def test_tags_with_derivatives(self):
+        block = self._block()
+        refresh_derivatives(block)
+        sources, src = self._render(block).split('|')
+        webp = block.image_derivatives['webp']
+
+        self.assertIn('<source type="image/webp" srcset="', sources)
+        self.assertIn('sizes="50vw"', sources)
+        self.assertIn(f'{block.image.storage.url(webp[0][1])} 320w', sources)
+        self.assertEqual(src, block.image.storage.url(webp[-1][1]))
+
+
+class FileCacheTests(SimpleTestCase):
+    """pages.file_cache: разбор один раз на версию файла (mtime, размер)."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.addCleanup(clear_file_cache)
+        self.path = os.path.join(directory, 'CHANGELOG.md')
+        self.parser = mock.Mock(side_effect=str.upper)
+
+    def _write(self, text, mtime_ns):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # Явный mtime: запись в пределах одного тика часов ФС не меняет его
+        os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+    def _get(self):
+        return cached_file_content(self.path, self.parser, default='нет файла')
+
+    def test_parsed_once_per_version(self):
+        self._write('v1', 1_000_000_000)
+        self.assertEqual([self._get() for _ in range(3)], ['V1'] * 3)
+        self.assertEqual(self.parser.call_count, 1)
+
+    def test_mtime_change(self):
+        self._write('v1', 1_000_000_000)
+        self._get()
+        self._write('v2', 2_000_000_000)
+        self.assertEqual(self._get(), 'V2')
+        self.assertEqual(self.parser.call_count, 2)
+
+    def test_size_change(self):
+        self._write('v1', 1_000_000_000)
+        self._get()
+        # Тот же mtime, другой размер
+        self._write('v1.1', 1_000_000_000)
+        self.assertEqual(self._get(), 'V1.1')
+        self.assertEqual(self.parser.call_count, 2)
+
+    def test_parser_is_part_of_key(self):
+        self._write('v1', 1_000_000_000)
+        self._get()
+        self.assertEqual(cached_file_content(self.path, str.lower), 'v1')
+        self.assertEqual(self._get(), 'V1')
+        self.assertEqual(self.parser.call_count, 1)
+
+    def test_missing_file(self):
+        self.assertEqual(self._get(), 'нет файла')
+        self.parser.assert_not_called()
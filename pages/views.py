@@ -2,16 +2,21 @@ import re
 from pathlib import Path
 from django.shortcuts import render
 from django.conf import settings
+from .file_cache import cached_file_content
 from .models import ContentBlock
 
 
 def parse_changelog():
-    """Парсит CHANGELOG.md в структурированные данные для шаблона."""
+    """
+    Версии из CHANGELOG.md для шаблона. Разбор кэшируется в процессе
+    и повторяется только при изменении файла (pages/file_cache.py).
+    """
     changelog_path = Path(settings.BASE_DIR) / 'CHANGELOG.md'
-    if not changelog_path.exists():
-        return []
+    return cached_file_content(changelog_path, parse_changelog_text, default=[])
 
-    text = changelog_path.read_text(encoding='utf-8')
+
+def parse_changelog_text(text):
+    """Парсит текст CHANGELOG.md в структурированные данные для шаблона."""
     versions = []
     current_version = None
     current_category = None
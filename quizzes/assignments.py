@@ -0,0 +1,94 @@
+"""
+Кэш назначений тестов.
+
+Для каждого пользователя один раз строится карта
+quiz_id -> {start_date, end_date, max_attempts, quiz_type}: индивидуальное
+назначение важнее группового, пустые поля назначения берутся из Quiz.
+Карта лежит в кэше вместе с номером поколения.
+
+Инвалидация (quizzes/signals.py):
+- индивидуальное назначение или Profile ученика → удаляется ключ ученика;
+- групповое назначение или Quiz → растёт общее поколение, и все карты
+  пересобираются при следующем обращении.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import QuizAssignment
+
+ASSIGNMENTS_CACHE_TIMEOUT = 60 * 60 * 24
+GENERATION_KEY = 'quiz_assignments:generation'
+
+
+def _user_key(user_id):
+    return f'quiz_assignments:user:{user_id}'
+
+
+def build_assignment_map(user):
+    """Карта назначений пользователя из БД (один запрос + профиль)."""
+    filters = Q(user=user)
+    profile = getattr(user, 'profile', None)
+    if profile and profile.group_id:
+        filters |= Q(group_id=profile.group_id)
+
+    resolved = {}
+    assignments = QuizAssignment.objects.filter(filters).select_related('quiz')
+    for a in assignments:
+        existing = resolved.get(a.quiz_id)
+        # Индивидуальное назначение перекрывает групповое
+        if existing and (existing['is_user'] or a.user_id is None):
+            continue
+        quiz = a.quiz
+        resolved[a.quiz_id] = {
+            'start_date': a.start_date if a.start_date else quiz.start_date,
+            'end_date': a.end_date if a.end_date else quiz.end_date,
+            'max_attempts': a.max_attempts if a.max_attempts is not None else quiz.max_attempts,
+            'quiz_type': quiz.quiz_type,
+            'is_user': a.user_id is not None,
+        }
+    return resolved
+
+
+def get_assignment_map(user):
+    """Карта назначений из кэша: одно обращение к кэшу на попадание."""
+    user_key = _user_key(user.id)
+    try:
+        cached = cache.get_many([GENERATION_KEY, user_key])
+    except Exception:
+        return build_assignment_map(user)
+
+    generation = cached.get(GENERATION_KEY)
+    entry = cached.get(user_key)
+    if generation is not None and entry and entry[0] == generation:
+        return entry[1]
+
+    if generation is None:
+        generation = time.time_ns()
+        try:
+            cache.add(GENERATION_KEY, generation, None)
+            generation = cache.get(GENERATION_KEY, generation)
+        except Exception:
+            pass
+
+    resolved = build_assignment_map(user)
+    try:
+        cache.set(user_key, (generation, resolved), ASSIGNMENTS_CACHE_TIMEOUT)
+    except Exception:
+        pass
+    return resolved
+
+
+def invalidate_user_assignments(user_id):
+    try:
+        cache.delete(_user_key(user_id))
+    except Exception:
+        pass
+
+
+def bump_assignments_generation():
+    try:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+    except Exception:
+        pass
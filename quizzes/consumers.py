@@ -1,9 +1,169 @@
+import asyncio
 import json
+from functools import partial
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
 
-class QuizConsumer(AsyncWebsocketConsumer):
+def submission_payload(event):
+    return {
+        'type': 'submission_update',
+        'submission_id': event['submission_id'],
+        'question_id': event['question_id'],
+        'status': event['status'],
+        'is_correct': event['is_correct'],
+        'error_log': event['error_log'],
+        'event_type': event['event_type'],
+        'cpu_time_ms': event.get('cpu_time_ms'),
+        'memory_kb': event.get('memory_kb'),
+        'event_id': event.get('event_id'),
+    }
+
+
+def help_comment_payload(event):
+    return {
+        'type': 'help_comment',
+        'question_id': event['question_id'],
+        'comment': event['comment'],
+        'status': event.get('status'),
+        'resolved': event.get('resolved', False),
+        'event_id': event.get('event_id'),
+    }
+
+
+def help_notification_payload(event, count):
+    return {
+        'type': 'help_notification',
+        'help_request_id': event.get('help_request_id'),
+        'question_id': event.get('question_id'),
+        'quiz_id': event.get('quiz_id'),
+        'student_name': event.get('student_name'),
+        'unread_count': count,
+    }
+
+
+# Сообщения, которые можно досылать из журнала (quizzes/event_stream.py)
+REPLAY_PAYLOADS = {
+    'submission_update': submission_payload,
+    'help_comment_update': help_comment_payload,
+}
+
+
+@database_sync_to_async
+def get_active_submissions(user, quiz_id):
+    """
+    Get all pending/running submissions for this user and quiz.
+    """
+    from .models import CodeSubmission
+
+    submissions = CodeSubmission.objects.filter(
+        user=user,
+        quiz_id=quiz_id,
+        status__in=['pending', 'running']
+    ).values('id', 'question_id', 'status')
+
+    return list(submissions)
+
+
+@database_sync_to_async
+def get_monitor_snapshot(quiz_id):
+    from .monitor import monitor_snapshot
+    return monitor_snapshot(quiz_id)
+
+
+@database_sync_to_async
+def get_unread_count(user):
+    from .unread import get_unread_count
+    return get_unread_count(user)
+
+
+async def read_missed_events(user_id, quiz_id, last_event_id):
+    from .event_stream import read_missed_events
+    return await sync_to_async(read_missed_events, thread_sensitive=False)(
+        user_id, quiz_id, last_event_id
+    )
+
+
+async def send_quiz_initial_state(user, quiz_id, last_event_id, send):
+    """
+    Initial state of the user_{user_id}_quiz_{quiz_id} stream, sent via the
+    coroutine send(payload). Shared by QuizConsumer, QuizEventsConsumer and
+    the quiz:<id> topic of SessionConsumer.
+
+    Replay events missed since last_event_id from the Redis stream; without
+    it (or if the stream has a gap) send current pending/running
+    submissions from the DB.
+    """
+    if not last_event_id or not await replay_quiz_events(user, quiz_id, last_event_id, send):
+        await send_active_submissions(user, quiz_id, send)
+
+
+async def replay_quiz_events(user, quiz_id, last_event_id, send):
+    """
+    Send events missed since last_event_id. Returns False if the stream
+    cannot guarantee there is no gap (caller falls back to the DB).
+    """
+    events = await read_missed_events(user.id, quiz_id, last_event_id)
+    if events is None:
+        await send({'type': 'events_replayed', 'complete': False})
+        return False
+    for event in events:
+        build = REPLAY_PAYLOADS.get(event.get('type'))
+        if build:
+            await send(build(event))
+    await send({
+        'type': 'events_replayed',
+        'complete': True,
+        'count': len(events),
+    })
+    return True
+
+
+async def send_active_submissions(user, quiz_id, send):
+    """
+    Send list of active submissions to the client.
+    """
+    submissions = await get_active_submissions(user, quiz_id)
+    await send({
+        'type': 'active_submissions',
+        'submissions': submissions,
+    })
+
+
+class PublishedBatchMixin:
+    """
+    Unpacks publish.batch messages: several messages for one group that
+    quizzes/publisher.py sends with a single group_send. Each one is
+    dispatched in order to its usual handler.
+    """
+
+    async def publish_batch(self, event):
+        for message in event['messages']:
+            await self.dispatch(message)
+
+
+class QuizStreamMixin:
+    """
+    Initial state for consumers bound to one quiz stream: QuizConsumer
+    (WebSocket) and QuizEventsConsumer (SSE).
+    Subclasses set self.user / self.quiz_id and implement send_payload().
+    """
+
+    async def send_payload(self, payload):
+        raise NotImplementedError
+
+    async def send_initial_state(self, last_event_id):
+        await send_quiz_initial_state(self.user, self.quiz_id, last_event_id, self.send_payload)
+
+    async def send_active_submissions(self):
+        await send_active_submissions(self.user, self.quiz_id, self.send_payload)
+
+
+class QuizConsumer(PublishedBatchMixin, QuizStreamMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time quiz code submission updates.
     Each user joins a group: user_{user_id}_quiz_{quiz_id}
@@ -28,8 +188,11 @@ class QuizConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
-        # Send current pending/running submissions on connect
-        await self.send_active_submissions()
+        # Reconnect with ?last_event_id=...: replay missed events from the
+        # Redis stream; otherwise (or if the stream has a gap) send
+        # current pending/running submissions from the DB
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        await self.send_initial_state(query.get('last_event_id', [None])[0])
 
     async def disconnect(self, close_code):
         # Leave group
@@ -56,58 +219,20 @@ class QuizConsumer(AsyncWebsocketConsumer):
         """
         Handle submission update messages from Celery task.
         """
-        await self.send(text_data=json.dumps({
-            'type': 'submission_update',
-            'submission_id': event['submission_id'],
-            'question_id': event['question_id'],
-            'status': event['status'],
-            'is_correct': event['is_correct'],
-            'error_log': event['error_log'],
-            'event_type': event['event_type'],
-            'cpu_time_ms': event.get('cpu_time_ms'),
-            'memory_kb': event.get('memory_kb'),
-        }))
+        await self.send(text_data=json.dumps(submission_payload(event)))
 
     async def help_comment_update(self, event):
         """
         Handle help comment messages from teacher replies.
         Forwards to client so HelpRequestManager can display inline.
         """
-        await self.send(text_data=json.dumps({
-            'type': 'help_comment',
-            'question_id': event['question_id'],
-            'comment': event['comment'],
-            'status': event.get('status'),
-            'resolved': event.get('resolved', False),
-        }))
-
-    @database_sync_to_async
-    def get_active_submissions(self):
-        """
-        Get all pending/running submissions for this user and quiz.
-        """
-        from .models import CodeSubmission
+        await self.send(text_data=json.dumps(help_comment_payload(event)))
 
-        submissions = CodeSubmission.objects.filter(
-            user=self.user,
-            quiz_id=self.quiz_id,
-            status__in=['pending', 'running']
-        ).values('id', 'question_id', 'status')
+    async def send_payload(self, payload):
+        await self.send(text_data=json.dumps(payload))
 
-        return list(submissions)
 
-    async def send_active_submissions(self):
-        """
-        Send list of active submissions to the client.
-        """
-        submissions = await self.get_active_submissions()
-        await self.send(text_data=json.dumps({
-            'type': 'active_submissions',
-            'submissions': submissions,
-        }))
-
-
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(PublishedBatchMixin, AsyncWebsocketConsumer):
     """
     Global WebSocket consumer for navbar badge notifications.
     Groups: notifications_{user_id} (personal) + notifications_teachers (for superusers)
@@ -136,7 +261,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         await self.accept()
 
         # Send current unread count on connect
-        count = await self.get_unread_count()
+        count = await get_unread_count(self.user)
         await self.send(text_data=json.dumps({
             'type': 'unread_count_update',
             'unread_count': count,
@@ -157,26 +282,271 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     async def help_notification(self, event):
         """
         New help request or reply — update badge count.
+        The count comes in the event payload (quizzes/unread.py), no DB query.
+        """
+        count = event.get('unread_count')
+        if count is None:
+            count = await get_unread_count(self.user)
+        await self.send(text_data=json.dumps(help_notification_payload(event, count)))
+
+    async def unread_count_update(self, event):
+        """
+        Badge count changed without a new message (request marked as read).
         """
-        count = await self.get_unread_count()
         await self.send(text_data=json.dumps({
-            'type': 'help_notification',
-            'help_request_id': event.get('help_request_id'),
-            'question_id': event.get('question_id'),
-            'quiz_id': event.get('quiz_id'),
-            'student_name': event.get('student_name'),
-            'unread_count': count,
+            'type': 'unread_count_update',
+            'unread_count': event['unread_count'],
         }))
 
-    @database_sync_to_async
-    def get_unread_count(self):
-        from .models import HelpRequest
-        if self.user.is_superuser:
-            return HelpRequest.objects.filter(
-                has_unread_for_teacher=True
-            ).exclude(status='resolved').count()
-        else:
-            return HelpRequest.objects.filter(
-                student=self.user,
-                has_unread_for_student=True
-            ).count()
+
+class SessionConsumer(PublishedBatchMixin, AsyncWebsocketConsumer):
+    """
+    One multiplexed WebSocket per browser session (ws/session/) instead of
+    ws/quiz/<id>/ + ws/notifications/ per page.
+
+    Client -> server:
+        {"action": "subscribe", "topic": "quiz:5", "last_event_id": "..."}
+        {"action": "unsubscribe", "topic": "quiz:5"}
+        {"action": "get_status", "topic": "quiz:5"}
+    Server -> client: the same message types as QuizConsumer /
+    NotificationConsumer plus a "topic" field, and
+    {"type": "subscribed" | "error", "topic": ...}.
+
+    Topics map to the existing channel-layer groups, so senders
+    (Celery tasks, views) do not know which consumer is listening:
+        notifications -> notifications_{user_id} (+ notifications_teachers)
+        quiz:<id>     -> user_{user_id}_quiz_{id}
+        monitor:<id>  -> monitor_quiz_{id} (superusers only, quizzes/monitor.py)
+    A new topic kind = a branch in topic_groups() + initial state in
+    send_initial_state() + handlers for its message types.
+    """
+
+    MAX_TOPICS = 20
+
+    async def connect(self):
+        self.user = self.scope['user']
+
+        if self.user.is_anonymous:
+            await self.close()
+            return
+
+        self.topics = {}  # topic -> [group names]
+        self.monitors = {}  # monitor topic -> MonitorAggregator
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for topic in list(getattr(self, 'topics', {})):
+            await self.leave_topic(topic)
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(data, dict):
+            return
+
+        action = data.get('action')
+        topic = data.get('topic')
+        if action == 'subscribe':
+            await self.join_topic(topic, data)
+        elif action == 'unsubscribe':
+            await self.leave_topic(topic)
+        elif action == 'get_status' and topic in self.topics:
+            await self.send_initial_state(topic, {})
+
+    def topic_groups(self, topic):
+        """Channel-layer groups for a topic, None for an unknown topic."""
+        if topic == 'notifications':
+            groups = [f"notifications_{self.user.id}"]
+            if self.user.is_superuser:
+                groups.append('notifications_teachers')
+            return groups
+        kind, _, arg = str(topic).partition(':')
+        if kind == 'quiz' and arg.isdigit():
+            return [f"user_{self.user.id}_quiz_{arg}"]
+        if kind == 'monitor' and arg.isdigit() and self.user.is_superuser:
+            from .monitor import monitor_group
+            return [monitor_group(arg)]
+        return None
+
+    async def join_topic(self, topic, data):
+        groups = self.topic_groups(topic)
+        if groups is None:
+            await self.send_topic(topic, {'type': 'error', 'error': 'unknown topic'})
+            return
+        if topic not in self.topics:
+            if len(self.topics) >= self.MAX_TOPICS:
+                await self.send_topic(topic, {'type': 'error', 'error': 'too many topics'})
+                return
+            for group in groups:
+                await self.channel_layer.group_add(group, self.channel_name)
+            self.topics[topic] = groups
+            if topic.startswith('monitor:'):
+                from .monitor import MonitorAggregator
+                self.monitors[topic] = MonitorAggregator(
+                    lambda payload, topic=topic: self.send_topic(topic, payload)
+                )
+        await self.send_topic(topic, {'type': 'subscribed'})
+        await self.send_initial_state(topic, data)
+
+    async def leave_topic(self, topic):
+        aggregator = self.monitors.pop(topic, None)
+        if aggregator:
+            aggregator.cancel()
+        for group in self.topics.pop(topic, []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def send_initial_state(self, topic, data):
+        if topic == 'notifications':
+            count = await get_unread_count(self.user)
+            await self.send_topic(topic, {'type': 'unread_count_update', 'unread_count': count})
+            return
+        if topic.startswith('monitor:'):
+            snapshot = await get_monitor_snapshot(int(topic.partition(':')[2]))
+            await self.send_topic(topic, {'type': 'monitor_snapshot', **snapshot})
+            return
+
+        await send_quiz_initial_state(
+            self.user, int(topic.partition(':')[2]), data.get('last_event_id'),
+            partial(self.send_topic, topic),
+        )
+
+    async def send_topic(self, topic, payload):
+        await self.send(text_data=json.dumps({'topic': topic, **payload}))
+
+    def quiz_topic(self, event):
+        quiz_id = event.get('quiz_id')
+        if quiz_id is not None:
+            return f"quiz:{quiz_id}"
+        # Старые сообщения без quiz_id: однозначно только при одной подписке на тест
+        quiz_topics = [t for t in self.topics if t.startswith('quiz:')]
+        return quiz_topics[0] if len(quiz_topics) == 1 else None
+
+    async def submission_update(self, event):
+        topic = self.quiz_topic(event)
+        if topic in self.topics:
+            await self.send_topic(topic, submission_payload(event))
+
+    async def help_comment_update(self, event):
+        topic = self.quiz_topic(event)
+        if topic in self.topics:
+            await self.send_topic(topic, help_comment_payload(event))
+
+    async def help_notification(self, event):
+        count = event.get('unread_count')
+        if count is None:
+            count = await get_unread_count(self.user)
+        await self.send_topic('notifications', help_notification_payload(event, count))
+
+    async def unread_count_update(self, event):
+        await self.send_topic('notifications', {
+            'type': 'unread_count_update',
+            'unread_count': event['unread_count'],
+        })
+
+    async def monitor_event(self, event):
+        """Verdict/progress event for a monitored quiz — aggregated, throttled."""
+        aggregator = self.monitors.get(f"monitor:{event.get('quiz_id')}")
+        if aggregator:
+            aggregator.add(event)
+
+
+class QuizEventsConsumer(PublishedBatchMixin, QuizStreamMixin, AsyncHttpConsumer):
+    """
+    Server-Sent Events fallback for QuizConsumer: GET /sse/quiz/<quiz_id>/.
+
+    Used when a proxy blocks WebSocket. Joins the same group
+    user_{user_id}_quiz_{quiz_id} and writes each event as it arrives
+    instead of the client polling on an interval. The response is held for
+    STREAM_TIMEOUT seconds (with keepalive comments for proxies), then
+    closed; EventSource reconnects by itself with Last-Event-ID, and the
+    missed events are replayed from the Redis stream like on WS reconnect.
+    """
+
+    STREAM_TIMEOUT = 50
+    KEEPALIVE_INTERVAL = 10
+    RETRY_MS = 1000
+
+    keepalive_task = None
+    group_name = None
+
+    async def http_request(self, message):
+        # The base class stops the consumer right after handle(); the
+        # stream has to stay open, so it is closed by stream_timeout
+        # or http_disconnect instead
+        if 'body' in message:
+            self.body.append(message['body'])
+        if message.get('more_body'):
+            return
+        try:
+            streaming = await self.open_stream()
+        except Exception:
+            await self.disconnect()
+            raise
+        if not streaming:
+            await self.disconnect()
+            raise StopConsumer()
+
+    async def open_stream(self):
+        self.user = self.scope['user']
+        if self.user.is_anonymous:
+            await self.send_response(403, b'', headers=[(b'Content-Type', b'text/plain')])
+            return False
+
+        self.quiz_id = int(self.scope['url_route']['kwargs']['quiz_id'])
+        self.group_name = f"user_{self.user.id}_quiz_{self.quiz_id}"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+        await self.send_headers(headers=[
+            (b'Content-Type', b'text/event-stream'),
+            (b'Cache-Control', b'no-cache'),
+            # Nginx must not buffer the stream
+            (b'X-Accel-Buffering', b'no'),
+        ])
+        await self.send_body(f'retry: {self.RETRY_MS}\n\n'.encode(), more_body=True)
+
+        # EventSource sends Last-Event-ID on reconnect; the first request
+        # carries the id the page already has in ?last_event_id=
+        headers = dict(self.scope.get('headers', []))
+        last_event_id = headers.get(b'last-event-id', b'').decode() or None
+        if not last_event_id:
+            query = parse_qs(self.scope.get('query_string', b'').decode())
+            last_event_id = query.get('last_event_id', [None])[0]
+        await self.send_initial_state(last_event_id)
+
+        self.keepalive_task = asyncio.ensure_future(self.keepalive())
+        return True
+
+    async def keepalive(self):
+        for _ in range(self.STREAM_TIMEOUT // self.KEEPALIVE_INTERVAL):
+            await asyncio.sleep(self.KEEPALIVE_INTERVAL)
+            await self.send_body(b': ping\n\n', more_body=True)
+        # Close from the consumer's own loop so StopConsumer ends it
+        await self.channel_layer.send(self.channel_name, {'type': 'stream.timeout'})
+
+    async def stream_timeout(self, event):
+        await self.send_body(b'')
+        await self.disconnect()
+        raise StopConsumer()
+
+    async def disconnect(self):
+        if self.keepalive_task is not None:
+            self.keepalive_task.cancel()
+            self.keepalive_task = None
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            self.group_name = None
+
+    async def submission_update(self, event):
+        await self.send_payload(submission_payload(event))
+
+    async def help_comment_update(self, event):
+        await self.send_payload(help_comment_payload(event))
+
+    async def send_payload(self, payload):
+        lines = []
+        if payload.get('event_id'):
+            lines.append(f"id: {payload['event_id']}")
+        lines.append(f"data: {json.dumps(payload)}")
+        await self.send_body(('\n'.join(lines) + '\n\n').encode(), more_body=True)
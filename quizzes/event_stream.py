@@ -0,0 +1,96 @@
+"""
+Журнал WebSocket-событий тестов для повтора после переподключения.
+
+Сообщения channel layer (group_send) не доставляются, пока сокет
+переподключается. Поэтому события, адресованные QuizConsumer
+(submission_update, help_comment_update), дополнительно пишутся в
+Redis Stream ученика ws_events:user:<id> с ограниченной длиной и TTL.
+ID записи стрима уходит клиенту как event_id.
+
+Клиент переподключается с ?last_event_id=<id>, и consumer досылает
+события этого теста после него прямо из стрима — без запросов к БД.
+Если непрерывность не гарантирована (стрим обрезан дальше last_event_id,
+истёк или Redis недоступен), read_missed_events() возвращает None и
+consumer откатывается к выборке активных проверок из БД.
+"""
+import json
+
+from .redis_client import get_redis
+
+KEY_PREFIX = 'ws_events:user'
+# Примерная длина: XADD MAXLEN ~ обрезает целыми узлами, это дешевле точной
+STREAM_MAXLEN = 200
+STREAM_TTL = 3600
+REPLAY_LIMIT = 200
+
+
+def _stream_key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def parse_event_id(value):
+    """'1700000000000-3' → (1700000000000, 3); None для некорректного ID."""
+    try:
+        ms, seq = str(value).split('-', 1)
+        return int(ms), int(seq)
+    except (TypeError, ValueError):
+        return None
+
+
+def publish_event(user_id, quiz_id, message):
+    """
+    Пишет сообщение для группы user_<id>_quiz_<quiz_id> в стрим ученика
+    и проставляет в него event_id. Возвращает event_id или None.
+    """
+    key = _stream_key(user_id)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.xadd(
+            key,
+            {'quiz_id': quiz_id, 'data': json.dumps(message, default=str)},
+            maxlen=STREAM_MAXLEN, approximate=True,
+        )
+        pipe.expire(key, STREAM_TTL)
+        event_id = pipe.execute()[0]
+    except Exception:
+        # Без журнала клиент после переподключения получит состояние из БД
+        return None
+    message['event_id'] = event_id
+    return event_id
+
+
+def read_missed_events(user_id, quiz_id, last_event_id):
+    """
+    События теста после last_event_id в порядке записи (сообщения channel
+    layer с event_id). None — непрерывность не гарантирована.
+    """
+    last = parse_event_id(last_event_id)
+    if last is None:
+        return None
+    key = _stream_key(user_id)
+    try:
+        r = get_redis()
+        first = r.xrange(key, count=1)
+        # Стрим истёк или обрезан дальше last_event_id — события могли потеряться
+        if not first or parse_event_id(first[0][0]) > last:
+            return None
+        # min включителен: сама запись last_event_id + REPLAY_LIMIT + признак переполнения
+        entries = r.xrange(key, min=last_event_id, count=REPLAY_LIMIT + 2)
+    except Exception:
+        return None
+
+    entries = [(event_id, fields) for event_id, fields in entries if event_id != last_event_id]
+    if len(entries) > REPLAY_LIMIT:
+        return None
+
+    events = []
+    for event_id, fields in entries:
+        if str(fields.get('quiz_id')) != str(quiz_id):
+            continue
+        try:
+            message = json.loads(fields['data'])
+        except (KeyError, ValueError):
+            continue
+        message['event_id'] = event_id
+        events.append(message)
+    return events
@@ -0,0 +1,72 @@
+"""
+Список запросов помощи для учителя (help_requests_list_view).
+
+Страницы — keyset-пагинация по (updated_at, id) вместо OFFSET: курсор
+«<микросекунды updated_at>-<id>» последней строки, следующая страница —
+строки строго после него. Запрос идёт по индексу (status, -updated_at, -id)
+и читает не больше PAGE_SIZE + 1 строк, как бы ни росла история.
+
+Превью последнего комментария — один Subquery с id последнего
+HelpComment на строку и одна выборка этих комментариев с авторами,
+без запроса на каждую строку.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import HelpComment, HelpRequest
+
+PAGE_SIZE = 30
+STATUS_FILTERS = ('open', 'answered', 'resolved')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(hr):
+    return f'{(hr.updated_at - _EPOCH) // _MICROSECOND}-{hr.id}'
+
+
+def decode_cursor(value):
+    """'<микросекунды>-<id>' → (updated_at, id); None для некорректного курсора."""
+    try:
+        micros, pk = str(value).split('-', 1)
+        return _EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def inbox_page(status_filter, cursor=None, page_size=PAGE_SIZE):
+    """
+    Страница списка: (help_requests, next_cursor).
+    status_filter — 'open' / 'answered' / 'resolved', иное — все статусы.
+    У каждого запроса атрибут last_comment (HelpComment с author или None).
+    """
+    last_comment_id = HelpComment.objects.filter(
+        help_request=OuterRef('pk'),
+    ).order_by('-created_at', '-id').values('id')[:1]
+
+    qs = HelpRequest.objects.select_related('student', 'question', 'quiz').annotate(
+        last_comment_id=Subquery(last_comment_id),
+    ).order_by('-updated_at', '-id')
+
+    if status_filter in STATUS_FILTERS:
+        qs = qs.filter(status=status_filter)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        updated_at, pk = position
+        qs = qs.filter(Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=pk))
+
+    help_requests = list(qs[:page_size + 1])
+    next_cursor = None
+    if len(help_requests) > page_size:
+        help_requests = help_requests[:page_size]
+        next_cursor = encode_cursor(help_requests[-1])
+
+    comment_ids = [hr.last_comment_id for hr in help_requests if hr.last_comment_id]
+    comments = HelpComment.objects.select_related('author').in_bulk(comment_ids) if comment_ids else {}
+    for hr in help_requests:
+        hr.last_comment = comments.get(hr.last_comment_id)
+
+    return help_requests, next_cursor
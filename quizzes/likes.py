@@ -0,0 +1,58 @@
+"""
+Лайки решений.
+
+UserAnswer.like_count — денормализованный счётчик SolutionLike.
+toggle_like() переключает лайк и правит счётчик одним SQL-запросом
+(data-modifying CTE в PostgreSQL): DELETE ... RETURNING, иначе
+INSERT ... ON CONFLICT DO NOTHING RETURNING, затем UPDATE счётчика на
+фактическое число затронутых строк. Гонка двух кликов не уводит
+счётчик от реального количества лайков.
+
+Лайки, удалённые/созданные через ORM (админка, каскад при удалении
+пользователя), правят счётчик сигналами в quizzes/signals.py.
+"""
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SolutionLike, UserAnswer
+
+
+def toggle_like(user_id, answer_id):
+    """Переключает лайк пользователя. Возвращает (liked, like_count)."""
+    likes_table = SolutionLike._meta.db_table
+    answers_table = UserAnswer._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH removed AS (
+                DELETE FROM {likes_table}
+                WHERE user_id = %s AND answer_id = %s
+                RETURNING 1
+            ),
+            added AS (
+                INSERT INTO {likes_table} (user_id, answer_id, created_at)
+                SELECT %s, %s, %s
+                WHERE NOT EXISTS (SELECT 1 FROM removed)
+                ON CONFLICT (user_id, answer_id) DO NOTHING
+                RETURNING 1
+            )
+            UPDATE {answers_table}
+            SET like_count = GREATEST(
+                like_count + (SELECT COUNT(*) FROM added) - (SELECT COUNT(*) FROM removed), 0
+            )
+            WHERE id = %s
+            RETURNING like_count, NOT EXISTS (SELECT 1 FROM removed)
+            """,
+            [user_id, answer_id, user_id, answer_id, timezone.now(), answer_id],
+        )
+        like_count, liked = cursor.fetchone()
+    return liked, like_count
+
+
+def adjust_like_count(answer_id, delta):
+    """Сдвигает счётчик на delta (для изменений лайков через ORM)."""
+    qs = UserAnswer.objects.filter(id=answer_id)
+    if delta < 0:
+        qs = qs.filter(like_count__gte=-delta)
+    qs.update(like_count=F('like_count') + delta)
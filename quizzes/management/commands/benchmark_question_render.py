@@ -0,0 +1,188 @@
+import json
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.html import escape
+
+from quizzes.models import Question
+from quizzes.rendering import IMG_MARKER_RE, _img_tag, _render_table, question_image_map, render_text_html
+
+SUP_MARKER_RE = re.compile(r'\[sup:([^\]]+)\]')
+SUB_MARKER_RE = re.compile(r'\[sub:([^\]]+)\]')
+
+
+def render_text_html_legacy(text, image_map=None):
+    """
+    Прежний многопроходный рендер: предобработка строк, сборка блоков и три
+    regex-прохода по готовому HTML. Эталон для замера и для тестов
+    побайтового совпадения (quizzes/tests.py).
+    """
+    if not text:
+        return ''
+    image_map = image_map or {}
+
+    lines = text.split('\n')
+
+    # Pre-process: merge split table rows.
+    # The EGE parser sometimes splits a data row across lines: the first cell
+    # lands on a non-tab line, then one or more blank/nbsp lines, then the
+    # remaining cells on a \t-starting line (empty first cell).
+    # Heuristic: a non-tab line immediately preceding (across blanks) a
+    # \t-starting tab line is the missing first cell — merge them.
+    processed = []
+    i = 0
+    while i < len(lines):
+        line = lines[i].rstrip()
+        stripped = line.replace('\xa0', '').strip()
+        # Only short lines (≤ 30 chars) can be a split table-row first cell.
+        # Long lines are paragraph text that happens to precede a table.
+        if stripped and '\t' not in line and len(stripped) <= 30:
+            # Look ahead past blank/nbsp-only lines
+            j = i + 1
+            while j < len(lines) and not lines[j].rstrip().replace('\xa0', '').strip():
+                j += 1
+            if j < len(lines) and lines[j].rstrip().startswith('\t'):
+                # Merge: prepend this cell to the \t-starting continuation
+                processed.append(stripped + lines[j].rstrip())
+                i = j + 1
+                continue
+        processed.append(line)
+        i += 1
+    lines = processed
+
+    result = []
+    table_rows = []
+    para_lines = []
+
+    def flush_para():
+        if para_lines:
+            content = '<br>'.join(escape(l) for l in para_lines)
+            result.append(f'<p class="mb-2">{content}</p>')
+            para_lines.clear()
+
+    def flush_table():
+        if table_rows:
+            result.append(_render_table(table_rows))
+            table_rows.clear()
+
+    for line in lines:
+        line = line.rstrip()
+        stripped = line.replace('\xa0', '').strip()
+
+        if '\t' in line:
+            flush_para()
+            table_rows.append(line)
+        elif not stripped:
+            # Blank / nbsp-only line → paragraph break
+            flush_table()
+            flush_para()
+        else:
+            flush_table()
+            para_lines.append(line)
+
+    flush_table()
+    flush_para()
+
+    html = '\n'.join(result)
+
+    return _apply_markers_sequential(html, image_map)
+
+
+def _apply_markers_sequential(html, image_map):
+    """Маркеры тремя проходами по всему HTML — семантика прежнего рендера."""
+    # Replace [img:N] markers with actual <img> tags
+    if image_map:
+        def _replace_marker(m):
+            idx = int(m.group(1))
+            if idx in image_map:
+                return _img_tag(*image_map[idx])
+            return m.group(0)  # leave unknown markers as-is
+        html = IMG_MARKER_RE.sub(_replace_marker, html)
+
+    # Replace [sup:text] and [sub:text] markers with HTML tags
+    # Content is already escaped by flush_para, so it's safe
+    html = SUP_MARKER_RE.sub(r'<sup>\1</sup>', html)
+    html = SUB_MARKER_RE.sub(r'<sub>\1</sub>', html)
+    return html
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость однопроходного рендера текста вопросов с прежним '
+        'и проверяет побайтовое совпадение результата (вопросы из БД или JSON-варианты ЕГЭ)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'json_files', nargs='*', type=str,
+            help='JSON-варианты в формате load_ege; без них берутся вопросы из БД',
+        )
+        parser.add_argument('--quiz', type=int, help='Только вопросы указанного теста (id)')
+        parser.add_argument('--repeat', type=int, default=20, help='Число прогонов корпуса (по умолчанию 20)')
+
+    def _db_corpus(self, quiz_id):
+        questions = Question.objects.prefetch_related('images').order_by('id')
+        if quiz_id:
+            questions = questions.filter(quiz_id=quiz_id)
+        return [(q.id, q.get_body(), question_image_map(q)) for q in questions]
+
+    def _json_corpus(self, paths):
+        corpus = []
+        for path in paths:
+            json_path = Path(path)
+            if not json_path.exists():
+                raise CommandError(f'Файл не найден: {json_path}')
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for i, q_data in enumerate(data.get('questions', []), 1):
+                question = Question(title=q_data.get('title', ''), text=q_data['text'])
+                images = sorted(
+                    enumerate(q_data.get('images', [])),
+                    key=lambda item: item[1].get('order', item[0]),
+                )
+                image_map = {
+                    idx: (settings.MEDIA_URL + img['image'], img.get('alt_text', ''))
+                    for idx, (_j, img) in enumerate(images, 1)
+                }
+                corpus.append((f'{json_path.name}#{i}', question.get_body(), image_map))
+        return corpus
+
+    def handle(self, *args, **options):
+        if options['json_files']:
+            corpus = self._json_corpus(options['json_files'])
+        else:
+            corpus = self._db_corpus(options['quiz'])
+        if not corpus:
+            raise CommandError('Нет вопросов для замера')
+
+        mismatches = [
+            qid for qid, text, image_map in corpus
+            if render_text_html(text, image_map) != render_text_html_legacy(text, image_map)
+        ]
+
+        repeat = max(1, options['repeat'])
+        timings = {}
+        for name, render in (('legacy', render_text_html_legacy), ('single-pass', render_text_html)):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                for _qid, text, image_map in corpus:
+                    render(text, image_map)
+            timings[name] = time.perf_counter() - started
+
+        total_chars = sum(len(text or '') for _qid, text, _map in corpus)
+        self.stdout.write(f'Вопросов: {len(corpus)}, символов: {total_chars}, прогонов: {repeat}')
+        for name, elapsed in timings.items():
+            per_question = elapsed / (repeat * len(corpus)) * 1e6
+            self.stdout.write(f'{name:>12}: {elapsed:.3f} с ({per_question:.1f} мкс/вопрос)')
+        if timings['single-pass']:
+            self.stdout.write(f'Ускорение: x{timings["legacy"] / timings["single-pass"]:.2f}')
+
+        if mismatches:
+            self.stdout.write(self.style.ERROR(
+                f'Расхождения с прежним рендером: {len(mismatches)} (id: {", ".join(map(str, mismatches[:20]))})'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Результат совпадает побайтово'))
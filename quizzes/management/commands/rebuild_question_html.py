@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from quizzes.models import Question
+from quizzes.question_cache import bump_quiz_version
+from quizzes.rendering import refresh_rendered_html
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённый HTML текста вопросов (Question.rendered_html)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Только вопросы указанного теста (id)')
+        parser.add_argument('--force', action='store_true', help='Пересчитать даже при совпадении хэша')
+
+    def handle(self, *args, **options):
+        questions = Question.objects.prefetch_related('images').order_by('id')
+        if options['quiz']:
+            questions = questions.filter(quiz_id=options['quiz'])
+
+        updated = 0
+        quiz_ids = set()
+        for question in questions.iterator(chunk_size=200):
+            if refresh_rendered_html(question, force=options['force']):
+                updated += 1
+                quiz_ids.add(question.quiz_id)
+
+        for quiz_id in quiz_ids:
+            bump_quiz_version(quiz_id)
+
+        self.stdout.write(self.style.SUCCESS(f'Обновлено вопросов: {updated}'))
@@ -0,0 +1,319 @@
+import asyncio
+import gc
+import resource
+import time
+from importlib import import_module
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from config.asgi import application
+
+USERNAME_PREFIX = 'wsload_'
+MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def percentile(values, p):
+    """Перцентиль по ближайшему рангу; None для пустого списка."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(1, round(p / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def rss_bytes():
+    """Текущий RSS процесса (Linux /proc), иначе пиковый из getrusage."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Client:
+    """Один сокет нагрузочного теста: ученик (вердикты) или учитель (запросы помощи)."""
+
+    def __init__(self, user, session_key, teacher):
+        self.user = user
+        self.session_key = session_key
+        self.teacher = teacher
+        self.comm = None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест WebSocket consumer\'ов внутри процесса: открывает тысячи '
+        'авторизованных сокетов к config.asgi.application, рассылает вердикты и '
+        'уведомления о помощи через channel layer и печатает время подключения, '
+        'перцентили задержки доставки и память на соединение'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000, help='Сокетов учеников (по умолчанию 1000)')
+        parser.add_argument('--teachers', type=int, default=20, help='Сокетов учителей в группе notifications_teachers (по умолчанию 20)')
+        parser.add_argument(
+            '--endpoint', choices=['session', 'legacy'], default='session',
+            help='session — ws/session/ с подпиской на топики; legacy — ws/quiz/<id>/ и ws/notifications/',
+        )
+        parser.add_argument(
+            '--layer', choices=['settings', 'memory'], default='settings',
+            help='Channel layer: из настроек (Redis) или InMemoryChannelLayer',
+        )
+        parser.add_argument('--quiz', type=int, default=1, help='ID теста для групп user_<id>_quiz_<id>')
+        parser.add_argument('--rounds', type=int, default=5, help='Раундов рассылки каждого вида (по умолчанию 5)')
+        parser.add_argument('--concurrency', type=int, default=100, help='Одновременных подключений (по умолчанию 100)')
+        parser.add_argument('--timeout', type=float, default=10, help='Таймаут ожидания сообщения, сек')
+        parser.add_argument('--host', help='Host/Origin сокетов (по умолчанию из ALLOWED_HOSTS)')
+        parser.add_argument('--keep-users', action='store_true', help=f'Не удалять пользователей {USERNAME_PREFIX}* и их сессии')
+        parser.add_argument('--force', action='store_true', help='Запустить при DEBUG=False')
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1:
+            raise CommandError('--connections должен быть больше 0')
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('DEBUG=False: тест создаёт пользователей-superuser в БД. Для стенда добавьте --force')
+        self.options = options
+        self.host = options['host'] or self._default_host()
+
+        clients = self._create_clients(options['connections'], options['teachers'])
+        try:
+            if options['layer'] == 'memory':
+                with override_settings(CHANNEL_LAYERS=MEMORY_LAYER):
+                    asyncio.run(self._run(clients))
+            else:
+                asyncio.run(self._run(clients))
+        finally:
+            if not options['keep_users']:
+                self._delete_users([c.session_key for c in clients])
+
+    def _default_host(self):
+        for host in settings.ALLOWED_HOSTS:
+            if host != '*' and not host.startswith('.'):
+                return host
+        return 'localhost'
+
+    # --- Пользователи и сессии ---
+
+    def _create_clients(self, students, teachers):
+        """Временные пользователи без пароля и сессии к ним — сокеты проходят AuthMiddlewareStack."""
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        users = []
+        for i in range(students + teachers):
+            user = User(username=f'{USERNAME_PREFIX}{i:06d}', is_superuser=i >= students)
+            user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users)
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('username'))
+
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        clients = []
+        for user in users:
+            session = store_class()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            clients.append(Client(user, session.session_key, user.is_superuser))
+        self.stdout.write(f'Пользователей: {students} учеников, {teachers} учителей')
+        return clients
+
+    def _delete_users(self, session_keys):
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        for key in session_keys:
+            store_class(session_key=key).delete()
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    # --- Сокеты ---
+
+    def _path(self, client):
+        if self.options['endpoint'] == 'session':
+            return '/ws/session/'
+        if client.teacher:
+            return '/ws/notifications/'
+        return f'/ws/quiz/{self.options["quiz"]}/'
+
+    async def _connect(self, client):
+        """Подключение до первого сообщения с начальным состоянием; возвращает время в секундах."""
+        comm = WebsocketCommunicator(application, self._path(client), headers=[
+            (b'host', self.host.encode()),
+            (b'origin', f'http://{self.host}'.encode()),
+            (b'cookie', f'{settings.SESSION_COOKIE_NAME}={client.session_key}'.encode()),
+        ])
+        started = time.perf_counter()
+        connected, _code = await comm.connect(timeout=self.options['timeout'])
+        if not connected:
+            raise ConnectionError('rejected')
+        if self.options['endpoint'] == 'session':
+            topic = 'notifications' if client.teacher else f'quiz:{self.options["quiz"]}'
+            await comm.send_json_to({'action': 'subscribe', 'topic': topic})
+            # subscribed + начальное состояние топика
+            await comm.receive_json_from(self.options['timeout'])
+        await comm.receive_json_from(self.options['timeout'])
+        client.comm = comm
+        return time.perf_counter() - started
+
+    async def _connect_all(self, clients):
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+
+        async def connect(client):
+            async with semaphore:
+                try:
+                    return await self._connect(client)
+                except Exception:
+                    return None
+
+        return await asyncio.gather(*(connect(c) for c in clients))
+
+    async def _disconnect_all(self, clients):
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+
+        async def disconnect(client):
+            async with semaphore:
+                try:
+                    await client.comm.disconnect()
+                except Exception:
+                    pass
+
+        await asyncio.gather(*(disconnect(c) for c in clients if c.comm))
+
+    # --- Рассылки ---
+
+    async def _wait_for(self, client, msg_type, key, value):
+        """Время получения сообщения msg_type с payload[key] == value или None по таймауту."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.options['timeout']
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                data = await client.comm.receive_json_from(remaining)
+            except asyncio.TimeoutError:
+                return None
+            if data.get('type') == msg_type and data.get(key) == value:
+                return loop.time()
+
+    async def _verdict_round(self, students, seq):
+        """submission_update в группу каждого ученика — как check_code_task."""
+        layer = get_channel_layer()
+        quiz_id = self.options['quiz']
+        loop = asyncio.get_running_loop()
+        waiters = [
+            asyncio.ensure_future(self._wait_for(c, 'submission_update', 'submission_id', seq))
+            for c in students
+        ]
+        sent = {}
+
+        async def send(client):
+            sent[client.user.id] = loop.time()
+            await layer.group_send(f'user_{client.user.id}_quiz_{quiz_id}', {
+                'type': 'submission_update',
+                'submission_id': seq,
+                'quiz_id': quiz_id,
+                'question_id': 1,
+                'status': 'success',
+                'is_correct': True,
+                'error_log': None,
+                'event_type': 'completed',
+            })
+
+        started = loop.time()
+        await asyncio.gather(*(send(c) for c in students))
+        received = await asyncio.gather(*waiters)
+        total = loop.time() - started
+        latencies = [r - sent[c.user.id] for c, r in zip(students, received) if r is not None]
+        return latencies, len(students) - len(latencies), total
+
+    async def _help_round(self, teachers, seq):
+        """Один help_notification в notifications_teachers — fan-out на всю группу."""
+        layer = get_channel_layer()
+        loop = asyncio.get_running_loop()
+        waiters = [
+            asyncio.ensure_future(self._wait_for(c, 'help_notification', 'help_request_id', seq))
+            for c in teachers
+        ]
+        sent = loop.time()
+        await layer.group_send('notifications_teachers', {
+            'type': 'help_notification',
+            'help_request_id': seq,
+            'quiz_id': self.options['quiz'],
+            'question_id': 1,
+            'student_name': 'loadtest',
+            'unread_count': seq,
+        })
+        received = await asyncio.gather(*waiters)
+        latencies = [r - sent for r in received if r is not None]
+        return latencies, len(teachers) - len(latencies), loop.time() - sent
+
+    # --- Прогон ---
+
+    async def _run(self, clients):
+        opts = self.options
+        layer = get_channel_layer()
+        self.stdout.write(
+            f'Endpoint: {opts["endpoint"]}, channel layer: {type(layer).__name__}, host: {self.host}'
+        )
+
+        gc.collect()
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        times = await self._connect_all(clients)
+        wall = time.perf_counter() - started
+        gc.collect()
+        rss_after = rss_bytes()
+
+        connected = [c for c in clients if c.comm]
+        failed = len(clients) - len(connected)
+        self.stdout.write(f'\nПодключение: {len(connected)} сокетов за {wall:.2f} с, ошибок: {failed}')
+        self._report('время подключения', [t for t in times if t is not None])
+        if connected:
+            per_conn = (rss_after - rss_before) / len(connected)
+            self.stdout.write(
+                f'Память: RSS +{(rss_after - rss_before) / 2**20:.1f} МиБ, '
+                f'{per_conn / 1024:.1f} КиБ на соединение (вместе с клиентской стороной теста)'
+            )
+
+        students = [c for c in connected if not c.teacher]
+        teachers = [c for c in connected if c.teacher]
+        try:
+            for name, group, round_fn in (
+                ('Вердикты (submission_update)', students, self._verdict_round),
+                ('Помощь (help_notification → notifications_teachers)', teachers, self._help_round),
+            ):
+                if not group or opts['rounds'] < 1:
+                    continue
+                latencies, lost, totals = [], 0, []
+                for seq in range(1, opts['rounds'] + 1):
+                    round_latencies, round_lost, total = await round_fn(group, seq)
+                    latencies += round_latencies
+                    lost += round_lost
+                    totals.append(total)
+                self.stdout.write(
+                    f'\n{name}: {len(group)} получателей × {opts["rounds"]} раундов, '
+                    f'не доставлено: {lost}, раунд в среднем {sum(totals) / len(totals) * 1000:.1f} мс'
+                )
+                self._report('задержка доставки', latencies)
+        finally:
+            await self._disconnect_all(connected)
+
+        if failed or not connected:
+            self.stdout.write(self.style.WARNING(f'Не подключились: {failed}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\nГотово'))
+
+    def _report(self, label, values):
+        if not values:
+            self.stdout.write(f'  {label}: нет данных')
+            return
+        ms = [v * 1000 for v in values]
+        self.stdout.write(
+            f'  {label}, мс: p50 {percentile(ms, 50):.1f}, p95 {percentile(ms, 95):.1f}, '
+            f'p99 {percentile(ms, 99):.1f}, max {max(ms):.1f}'
+        )
+
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0030_move_ege_media_files'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='codesubmission',
+            name='quizzes_cod_user_id_433204_idx',
+        ),
+        migrations.AddIndex(
+            model_name='codesubmission',
+            index=models.Index(fields=['user', 'quiz', 'question', '-created_at'], name='quizzes_cod_user_id_96cd37_idx'),
+        ),
+    ]
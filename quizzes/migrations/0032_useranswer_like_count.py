@@ -0,0 +1,34 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_count(apps, schema_editor):
+    UserAnswer = apps.get_model('quizzes', 'UserAnswer')
+    SolutionLike = apps.get_model('quizzes', 'SolutionLike')
+    counts = (
+        SolutionLike.objects.filter(answer_id=OuterRef('pk'))
+        .order_by()
+        .values('answer_id')
+        .annotate(cnt=Count('id'))
+        .values('cnt')
+    )
+    UserAnswer.objects.filter(id__in=SolutionLike.objects.values('answer_id')).update(
+        like_count=Coalesce(Subquery(counts), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0031_code_submission_latest_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useranswer',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Лайков'),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0032_useranswer_like_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='rendered_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40, verbose_name='Хэш HTML текста'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='rendered_html',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='HTML текста'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0034_questionimage_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='helprequest',
+            index=models.Index(fields=['status', '-updated_at', '-id'], name='quizzes_hel_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='helprequest',
+            index=models.Index(fields=['-updated_at', '-id'], name='quizzes_hel_updated_idx'),
+        ),
+    ]
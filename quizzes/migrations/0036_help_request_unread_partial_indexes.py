@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0035_help_request_inbox_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='helprequest',
+            index=models.Index(condition=models.Q(('has_unread_for_teacher', True), models.Q(('status', 'resolved'), _negated=True)), fields=['id'], name='quizzes_hel_teacher_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='helprequest',
+            index=models.Index(condition=models.Q(('has_unread_for_student', True)), fields=['student'], name='quizzes_hel_student_unread_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+def _get_body(question):
+    """Копия Question.get_body(): у исторической модели методов нет."""
+    if question.title:
+        return question.text.strip()
+    lines = question.text.strip().split('\n')
+    if len(lines) > 1:
+        return '\n'.join(lines[1:])
+    return ''
+
+
+def backfill_rendered_html(apps, schema_editor):
+    """
+    Заполняет rendered_html/rendered_hash, добавленные в 0033, для уже
+    существующих вопросов — иначе фильтр render_question_text рендерит их
+    на каждый запрос, пока вопрос не пересохранят. Хэш тот же, что у
+    refresh_rendered_html, поэтому rebuild_question_html их не пересчитает.
+    """
+    from quizzes.rendering import question_image_map, render_hash, render_text_html
+
+    Question = apps.get_model('quizzes', 'Question')
+    questions = Question.objects.filter(rendered_hash='').prefetch_related('images').order_by('id')
+    for question in questions.iterator(chunk_size=200):
+        body = _get_body(question)
+        image_map = question_image_map(question)
+        Question.objects.filter(id=question.id).update(
+            rendered_html=render_text_html(body, image_map),
+            rendered_hash=render_hash(body, image_map),
+        )
+
+
+def clear_rendered_html(apps, schema_editor):
+    Question = apps.get_model('quizzes', 'Question')
+    Question.objects.all().update(rendered_html='', rendered_hash='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0036_help_request_unread_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rendered_html, clear_rendered_html),
+    ]
@@ -79,6 +79,10 @@ class Question(models.Model):
     points = models.PositiveIntegerField(default=1, verbose_name="Баллы")
     alternative_answers = models.JSONField(null=True, blank=True, verbose_name="Альтернативные ответы", help_text='Список строк, например: ["42", "42.0"]')
 
+    # HTML текста вопроса, пересчитывается сигналами (quizzes/rendering.py)
+    rendered_html = models.TextField(blank=True, default='', editable=False, verbose_name="HTML текста")
+    rendered_hash = models.CharField(max_length=40, blank=True, default='', editable=False, verbose_name="Хэш HTML текста")
+
     class Meta:
         verbose_name = "Вопрос"
         verbose_name_plural = "Вопросы"
@@ -159,6 +163,8 @@ class QuestionImage(models.Model):
     image = models.ImageField(upload_to=question_image_upload_path, verbose_name="Изображение")
     alt_text = models.CharField(max_length=200, blank=True, verbose_name="Альтернативный текст")
     order = models.PositiveIntegerField(default=0, verbose_name="Порядок")
+    # WebP/AVIF-копии разных ширин, собираются в фоне (pages/images.py)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Производные изображения")
 
     class Meta:
         verbose_name = "Изображение вопроса"
@@ -263,7 +269,8 @@ class CodeSubmission(models.Model):
         verbose_name_plural = "Отправки кода"
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['user', 'quiz', 'question']),
+            # Последняя отправка по задаче (DISTINCT ON / ORDER BY created_at DESC)
+            models.Index(fields=['user', 'quiz', 'question', '-created_at']),
             models.Index(fields=['status']),
             models.Index(fields=['celery_task_id']),
         ]
@@ -295,6 +302,18 @@ class HelpRequest(models.Model):
         unique_together = ['student', 'question']
         indexes = [
             models.Index(fields=['status', 'has_unread_for_teacher']),
+            # Keyset-пагинация списка учителя (quizzes/help_inbox.py): фильтр по статусу и «все»
+            models.Index(fields=['status', '-updated_at', '-id'], name='quizzes_hel_status_upd_idx'),
+            models.Index(fields=['-updated_at', '-id'], name='quizzes_hel_updated_idx'),
+            # Частичные индексы для COUNT при промахе Redis-счётчиков (quizzes/unread.py)
+            models.Index(
+                fields=['id'], name='quizzes_hel_teacher_unread_idx',
+                condition=models.Q(has_unread_for_teacher=True) & ~models.Q(status='resolved'),
+            ),
+            models.Index(
+                fields=['student'], name='quizzes_hel_student_unread_idx',
+                condition=models.Q(has_unread_for_student=True),
+            ),
         ]
 
     def __str__(self):
@@ -385,6 +404,8 @@ class UserAnswer(models.Model):
 
     is_correct = models.BooleanField(default=False, verbose_name="Верно?")
     submission = models.ForeignKey(CodeSubmission, null=True, blank=True, on_delete=models.SET_NULL, verbose_name="Отправка кода")
+    # Денормализованный счётчик SolutionLike (см. quizzes/likes.py)
+    like_count = models.PositiveIntegerField(default=0, verbose_name="Лайков")
 
     class Meta:
         verbose_name = "Ответ пользователя"
@@ -0,0 +1,145 @@
+"""
+Живой монитор класса по варианту ЕГЭ (для учителя).
+
+Источники — check_code_task (вердикты code-задач), ege_check_answer_view
+(попытки в тренировке) и ege_finish_view (завершение варианта) — шлют
+событие в группу monitor_quiz_<quiz_id> через фоновый publisher. Монитор
+сам в БД не ходит: вместо обновления ege_results_view каждые N секунд
+учитель получает дельты.
+
+SessionConsumer (топик monitor:<quiz_id>, только superuser) копит события
+в MonitorAggregator: клетки ученик × задача сливаются по ключу, и странице
+уходит не больше PUSH_RATE пачек в секунду, сколько бы вердиктов ни пришло.
+
+Начальное состояние (monitor_snapshot) собирается при подписке: прогресс
+задач, активные проверки, последние результаты и имена — по запросу на
+каждое.
+"""
+import asyncio
+
+from django.contrib.auth.models import User
+
+from .models import CodeSubmission, ExamTaskProgress, Question, UserResult
+from .publisher import publish
+
+PUSH_RATE = 2  # пачек дельт в секунду на один монитор
+
+
+def monitor_group(quiz_id):
+    return f"monitor_quiz_{quiz_id}"
+
+
+def display_name(user):
+    return f"{user.last_name} {user.first_name}".strip() or user.username
+
+
+def publish_monitor_event(quiz_id, user, cells=(), **student):
+    """
+    Событие для мониторов варианта.
+    cells — [{question_id, attempts?, is_solved?, status?}],
+    student — поля строки ученика (score, finished).
+    """
+    publish(monitor_group(quiz_id), {
+        'type': 'monitor_event',
+        'quiz_id': quiz_id,
+        'user_id': user.id,
+        'name': display_name(user),
+        'cells': list(cells),
+        'student': student,
+    })
+
+
+def monitor_snapshot(quiz_id):
+    """Текущее состояние варианта: задачи, ученики и клетки."""
+    questions = list(
+        Question.objects.filter(quiz_id=quiz_id, ege_number__isnull=False)
+        .order_by('ege_number').values('id', 'ege_number', 'points')
+    )
+
+    cells = {}
+    for row in ExamTaskProgress.objects.filter(quiz_id=quiz_id).values(
+        'user_id', 'question_id', 'attempts_to_solve', 'is_solved',
+    ):
+        cells[(row['user_id'], row['question_id'])] = {
+            'user_id': row['user_id'],
+            'question_id': row['question_id'],
+            'attempts': row['attempts_to_solve'],
+            'is_solved': row['is_solved'],
+        }
+    for row in CodeSubmission.objects.filter(
+        quiz_id=quiz_id, status__in=['pending', 'running'],
+    ).values('user_id', 'question_id', 'status'):
+        key = (row['user_id'], row['question_id'])
+        cells.setdefault(key, {'user_id': key[0], 'question_id': key[1]})['status'] = row['status']
+
+    # Последний результат каждого ученика
+    scores = {}
+    for user_id, score in UserResult.objects.filter(quiz_id=quiz_id).order_by(
+        'user_id', '-date_completed',
+    ).values_list('user_id', 'score'):
+        scores.setdefault(user_id, score)
+
+    user_ids = {user_id for user_id, _qid in cells} | set(scores)
+    students = [
+        {
+            'user_id': user.id,
+            'name': display_name(user),
+            'score': scores.get(user.id),
+            'finished': user.id in scores,
+        }
+        for user in User.objects.filter(id__in=user_ids).only('id', 'first_name', 'last_name', 'username')
+    ]
+    return {'questions': questions, 'students': students, 'cells': list(cells.values())}
+
+
+class MonitorAggregator:
+    """
+    Копит события монитора и отправляет дельты не чаще rate раз в секунду.
+    send — корутина, принимающая payload monitor_delta.
+    """
+
+    def __init__(self, send, rate=PUSH_RATE):
+        self.send = send
+        self.interval = 1 / rate
+        self.cells = {}
+        self.students = {}
+        self._task = None
+        self._last_flush = 0
+
+    def add(self, event):
+        user_id = event['user_id']
+        student = self.students.setdefault(user_id, {'user_id': user_id})
+        student['name'] = event.get('name') or student.get('name')
+        student.update(event.get('student') or {})
+
+        for cell in event.get('cells') or ():
+            key = (user_id, cell['question_id'])
+            merged = self.cells.setdefault(key, {'user_id': user_id, 'question_id': cell['question_id']})
+            solved = merged.get('is_solved') or cell.get('is_solved')
+            merged.update(cell)
+            # «Решена» не откатывается более поздним событием той же пачки
+            if solved:
+                merged['is_solved'] = True
+
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        loop = asyncio.get_running_loop()
+        delay = self._last_flush + self.interval - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        payload = {
+            'type': 'monitor_delta',
+            'students': list(self.students.values()),
+            'cells': list(self.cells.values()),
+        }
+        self.students, self.cells = {}, {}
+        self._last_flush = loop.time()
+        self._task = None
+        await self.send(payload)
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,156 @@
+"""
+Атомарные обновления ExamTaskProgress.
+
+ORM умеет upsert только с подстановкой EXCLUDED-значений, а нам нужны
+инкременты, поэтому здесь — один INSERT ... ON CONFLICT DO UPDATE на
+PostgreSQL вместо get_or_create + save.
+"""
+from django.db import connection
+from django.utils import timezone
+
+from .models import ExamTaskProgress
+
+UPSERT_BATCH_SIZE = 1000
+
+
+def _table():
+    return ExamTaskProgress._meta.db_table
+
+
+def add_time_bulk(rows):
+    """
+    Прибавляет время к задачам одним upsert'ом на пачку.
+
+    rows: iterable (user_id, quiz_id, question_id, seconds).
+    Время после первого верного решения не учитывается (WHERE NOT is_solved).
+    """
+    # Один ключ не может встретиться в VALUES дважды — суммируем заранее
+    totals = {}
+    for user_id, quiz_id, question_id, seconds in rows:
+        key = (user_id, quiz_id, question_id)
+        totals[key] = totals.get(key, 0) + seconds
+    rows = [(*key, seconds) for key, seconds in totals.items() if seconds > 0]
+    if not rows:
+        return
+    table = _table()
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            chunk = rows[start:start + UPSERT_BATCH_SIZE]
+            values_sql = ', '.join(["(%s, %s, %s, %s, 0, false, '', '')"] * len(chunk))
+            params = [value for row in chunk for value in row]
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (
+                    user_id, quiz_id, question_id, time_spent_seconds,
+                    attempts_to_solve, is_solved, best_cpu_code, best_memory_code
+                )
+                VALUES {values_sql}
+                ON CONFLICT (user_id, quiz_id, question_id) DO UPDATE
+                SET time_spent_seconds = {table}.time_spent_seconds + EXCLUDED.time_spent_seconds
+                WHERE NOT {table}.is_solved
+                """,
+                params,
+            )
+
+
+def record_attempt(user_id, quiz_id, question_id, is_correct):
+    """
+    Засчитывает попытку решения (text/choice в тренировке).
+
+    attempts_to_solve + 1, is_solved «залипает» в True, first_solved_at
+    ставится только при первом верном ответе. Возвращает (attempts, is_solved).
+    """
+    table = _table()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (
+                user_id, quiz_id, question_id, time_spent_seconds,
+                attempts_to_solve, is_solved, first_solved_at,
+                best_cpu_code, best_memory_code
+            )
+            VALUES (%s, %s, %s, 0, 1, %s, %s, '', '')
+            ON CONFLICT (user_id, quiz_id, question_id) DO UPDATE
+            SET attempts_to_solve = {table}.attempts_to_solve + 1,
+                is_solved = {table}.is_solved OR EXCLUDED.is_solved,
+                first_solved_at = COALESCE({table}.first_solved_at, EXCLUDED.first_solved_at)
+            RETURNING attempts_to_solve, is_solved
+            """,
+            [user_id, quiz_id, question_id, is_correct, timezone.now() if is_correct else None],
+        )
+        return cursor.fetchone()
+
+
+def mark_solved_bulk(user_id, quiz_id, question_ids):
+    """Отмечает задачи решёнными одним upsert'ом (завершение варианта)."""
+    question_ids = sorted(set(question_ids))
+    if not question_ids:
+        return
+    table = _table()
+    now = timezone.now()
+    values_sql = ', '.join(["(%s, %s, %s, 0, 0, true, %s, '', '')"] * len(question_ids))
+    params = [value for qid in question_ids for value in (user_id, quiz_id, qid, now)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (
+                user_id, quiz_id, question_id, time_spent_seconds,
+                attempts_to_solve, is_solved, first_solved_at,
+                best_cpu_code, best_memory_code
+            )
+            VALUES {values_sql}
+            ON CONFLICT (user_id, quiz_id, question_id) DO UPDATE
+            SET is_solved = true,
+                first_solved_at = COALESCE({table}.first_solved_at, EXCLUDED.first_solved_at)
+            WHERE NOT {table}.is_solved
+            """,
+            params,
+        )
+
+
+def record_code_result(submission):
+    """
+    Верное решение code-задачи: отметка решённой и лучшие метрики.
+
+    Лучшие CPU/память считаются через LEAST() (NULL игнорируется),
+    код лучшей попытки заменяется только при строгом улучшении метрики.
+    """
+    table = _table()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (
+                user_id, quiz_id, question_id, time_spent_seconds,
+                attempts_to_solve, is_solved, first_solved_at,
+                best_cpu_time_ms, best_cpu_code, best_memory_kb, best_memory_code
+            )
+            VALUES (%s, %s, %s, 0, 0, true, %s, %s, %s, %s, %s)
+            ON CONFLICT (user_id, quiz_id, question_id) DO UPDATE
+            SET is_solved = true,
+                first_solved_at = COALESCE({table}.first_solved_at, EXCLUDED.first_solved_at),
+                best_cpu_time_ms = LEAST({table}.best_cpu_time_ms, EXCLUDED.best_cpu_time_ms),
+                best_cpu_code = CASE
+                    WHEN EXCLUDED.best_cpu_time_ms IS NOT NULL
+                         AND ({table}.best_cpu_time_ms IS NULL
+                              OR EXCLUDED.best_cpu_time_ms < {table}.best_cpu_time_ms)
+                    THEN EXCLUDED.best_cpu_code
+                    ELSE {table}.best_cpu_code
+                END,
+                best_memory_kb = LEAST({table}.best_memory_kb, EXCLUDED.best_memory_kb),
+                best_memory_code = CASE
+                    WHEN EXCLUDED.best_memory_kb IS NOT NULL
+                         AND ({table}.best_memory_kb IS NULL
+                              OR EXCLUDED.best_memory_kb < {table}.best_memory_kb)
+                    THEN EXCLUDED.best_memory_code
+                    ELSE {table}.best_memory_code
+                END
+            """,
+            [
+                submission.user_id, submission.quiz_id, submission.question_id,
+                timezone.now(),
+                submission.cpu_time_ms,
+                submission.code if submission.cpu_time_ms is not None else '',
+                submission.memory_kb,
+                submission.code if submission.memory_kb is not None else '',
+            ],
+        )
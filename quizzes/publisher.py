@@ -0,0 +1,159 @@
+"""
+Фоновая отправка сообщений в channel layer.
+
+async_to_sync(channel_layer.group_send) на каждое сообщение поднимает мост
+к event loop и пул соединений Redis под него — а check_code_task шлёт до
+трёх сообщений на вердикт (running, completed/error).
+
+NotificationPublisher держит в фоновом потоке процесса один event loop и
+тем самым один пул соединений channels_redis. publish() только кладёт
+сообщение в очередь и сразу возвращается. Поток собирает сообщения,
+пришедшие за FLUSH_INTERVAL, и группирует их по группам: на каждую группу
+уходит один group_send (несколько сообщений — одним сообщением
+BATCH_TYPE со списком messages), разные группы — параллельно по общему
+пулу. Каждый group_send — это чтение состава группы и Lua-скрипт доставки,
+поэтому пачка из N сообщений одной группы стоит столько же обращений к
+Redis, сколько одно. Consumer'ы разворачивают пачку по порядку
+(PublishedBatchMixin в quizzes/consumers.py) — running не обгонит completed.
+
+Поток создаётся лениво и пересоздаётся после fork (prefork Celery,
+gunicorn --preload). При остановке процесса очередь дожимается flush().
+Если поток запустить не удалось, publish() отправляет синхронно — как раньше.
+"""
+import asyncio
+import atexit
+import os
+import threading
+
+from asgiref.sync import async_to_sync
+from celery.signals import worker_process_shutdown, worker_shutdown
+from channels.layers import get_channel_layer
+
+FLUSH_INTERVAL = 0.02
+BATCH_TYPE = 'publish.batch'
+MAX_BATCH = 200
+START_TIMEOUT = 5
+FLUSH_TIMEOUT = 5
+
+
+class NotificationPublisher:
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._loop = None
+        self._queue = None
+
+    def _running(self):
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def _ensure_started(self):
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            ready = threading.Event()
+            self._loop = None
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, args=(ready,), name='ws-publisher', daemon=True,
+            )
+            self._thread.start()
+            if not ready.wait(START_TIMEOUT) or self._loop is None:
+                raise RuntimeError('ws-publisher thread did not start')
+
+    def _run(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._queue = asyncio.Queue()
+        self._loop = loop
+        ready.set()
+        loop.run_until_complete(self._worker())
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._send_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send_batch(self, batch):
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return
+        by_group = {}
+        for group, message in batch:
+            by_group.setdefault(group, []).append(message)
+        await asyncio.gather(*(
+            self._send_group(channel_layer, group, messages)
+            for group, messages in by_group.items()
+        ))
+
+    async def _send_group(self, channel_layer, group, messages):
+        message = messages[0] if len(messages) == 1 else {'type': BATCH_TYPE, 'messages': messages}
+        try:
+            await channel_layer.group_send(group, message)
+        except Exception:
+            # WS нотификации не критичны — у клиентов есть повтор и polling
+            pass
+
+    def publish(self, group, message):
+        """Ставит сообщение в очередь отправки, не дожидаясь Redis."""
+        try:
+            self._ensure_started()
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, (group, message))
+        except Exception:
+            self._send_now(group, message)
+
+    def _send_now(self, group, message):
+        try:
+            channel_layer = get_channel_layer()
+            if channel_layer:
+                async_to_sync(channel_layer.group_send)(group, message)
+        except Exception:
+            pass
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """Ждёт отправки уже поставленных сообщений (при остановке процесса)."""
+        if not self._running():
+            return
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._queue.join(), self._loop)
+            future.result(timeout)
+        except Exception:
+            pass
+
+
+publisher = NotificationPublisher()
+
+
+def publish(group, message):
+    publisher.publish(group, message)
+
+
+def flush():
+    publisher.flush()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _flush_on_worker_shutdown(**kwargs):
+    flush()
+
+
+atexit.register(flush)
@@ -0,0 +1,78 @@
+"""
+Кэш графа вопросов теста.
+
+Страница прохождения теста работает с одним списком Question, у которого
+уже загружены choices, test_cases, images и files. Список собирается одним
+набором prefetch-запросов и кладётся в кэш под ключом версии теста.
+Версия меняется сигналами (quizzes/signals.py) при любом изменении вопросов
+и связанных объектов, поэтому явная инвалидация не нужна.
+"""
+import time
+
+from django.core.cache import cache
+
+from .models import Question
+
+QUESTIONS_CACHE_TIMEOUT = 60 * 60  # страховка на случай bulk-изменений мимо сигналов
+
+
+def _version_key(quiz_id):
+    return f'quiz_version:{quiz_id}'
+
+
+def _questions_key(quiz_id, version):
+    return f'quiz_questions:{quiz_id}:{version}'
+
+
+def get_quiz_version(quiz_id):
+    """Текущая версия теста. Отсутствующая версия заводится заново (не 0 — старые ключи не всплывут)."""
+    key = _version_key(quiz_id)
+    try:
+        version = cache.get(key)
+        if version is None:
+            version = time.time_ns()
+            cache.add(key, version, None)
+            version = cache.get(key, version)
+    except Exception:
+        return None
+    return version
+
+
+def bump_quiz_version(quiz_id):
+    """Сбрасывает кэш вопросов теста (вызывается из сигналов)."""
+    try:
+        cache.set(_version_key(quiz_id), time.time_ns(), None)
+    except Exception:
+        pass
+
+
+def load_quiz_questions(quiz_id):
+    """Вопросы теста с prefetch всех связанных объектов — фиксированное число запросов."""
+    return list(
+        Question.objects.filter(quiz_id=quiz_id)
+        .prefetch_related('choices', 'test_cases', 'images', 'files')
+        .order_by('id')
+    )
+
+
+def get_quiz_questions(quiz):
+    """
+    Граф вопросов теста из кэша (или БД). Возвращает новый список объектов
+    на каждый вызов — вызывающий код может навешивать на них атрибуты.
+    """
+    version = get_quiz_version(quiz.id)
+    if version is None:
+        return load_quiz_questions(quiz.id)
+
+    key = _questions_key(quiz.id, version)
+    try:
+        questions = cache.get(key)
+    except Exception:
+        questions = None
+    if questions is None:
+        questions = load_quiz_questions(quiz.id)
+        try:
+            cache.set(key, questions, QUESTIONS_CACHE_TIMEOUT)
+        except Exception:
+            pass
+    return questions
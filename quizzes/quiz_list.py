@@ -0,0 +1,194 @@
+"""
+Список тестов ученика (quiz_list_view) с кэшированием.
+
+build_quiz_list() раскладывает тесты по корзинам educational/assessments/
+archived и считает статусы. Результат кэшируется на пользователя:
+- ключ удаляется при новом/изменённом UserResult ученика
+  и его индивидуальном назначении / профиле (quizzes/signals.py);
+- запись хранит поколение списков, которое растёт при изменении Quiz,
+  групповых назначений и состава вопросов;
+- время жизни ограничено ближайшей датой start_date/end_date, после
+  которой статус теста меняется.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .assignments import get_assignment_map
+from .models import Quiz, Question, UserResult
+
+QUIZ_LIST_CACHE_TIMEOUT = 60 * 60
+GENERATION_KEY = 'quiz_list:generation'
+
+
+def _user_key(user_id):
+    return f'quiz_list:user:{user_id}'
+
+
+def build_quiz_list(user, now=None):
+    """
+    Корзины тестов пользователя из БД.
+    Возвращает (context, next_boundary) — ближайший момент смены статуса или None.
+    """
+    now = now or timezone.now()
+
+    # quiz_id -> {start, end, max}: user assignment wins over group (cached)
+    effective_assignments = {
+        qid: a for qid, a in get_assignment_map(user).items()
+        if a['quiz_type'] != 'exam'
+    }
+
+    if user.is_superuser:
+        quizzes = Quiz.objects.exclude(quiz_type='exam')
+        # Fallback for superuser viewing unassigned quizzes
+        for quiz in quizzes:
+            effective_assignments.setdefault(quiz.id, {
+                'start_date': quiz.start_date,
+                'end_date': quiz.end_date,
+                'max_attempts': quiz.max_attempts
+            })
+    else:
+        quizzes = list(Quiz.objects.filter(id__in=list(effective_assignments)))
+
+    # Pre-load attempts and best scores
+    stats = UserResult.objects.filter(user=user).values('quiz_id').annotate(
+        count=Count('id'),
+        best_score=Max('score')
+    )
+    user_results = {item['quiz_id']: item for item in stats}
+
+    # Pre-load question counts
+    all_quiz_ids = [q.id for q in quizzes]
+    question_counts = {}
+    if all_quiz_ids:
+        q_counts = Question.objects.filter(quiz_id__in=all_quiz_ids).values('quiz_id').annotate(count=Count('id'))
+        question_counts = {item['quiz_id']: item['count'] for item in q_counts}
+
+    educational_tasks = []
+    assessments = []
+    archived = []
+    next_boundary = None
+
+    for quiz in quizzes:
+        settings = effective_assignments.get(quiz.id)
+        if not settings:
+            continue
+
+        start_date = settings['start_date']
+        end_date = settings['end_date']
+        max_attempts = settings['max_attempts']
+
+        # Ближайшая смена статуса по датам — граница жизни кэша
+        for boundary in (start_date, end_date):
+            if boundary and boundary > now and (next_boundary is None or boundary < next_boundary):
+                next_boundary = boundary
+
+        stats = user_results.get(quiz.id, {})
+        attempts_count = stats.get('count', 0)
+        best_score = stats.get('best_score')
+        total_questions = question_counts.get(quiz.id, 0)
+
+        is_blocked = False
+        remaining_attempts = None
+        status_text = "(Открыто)"
+        status_color = "green"
+
+        if start_date and now < start_date:
+            is_blocked = True
+            status_text = "(Недоступно)"
+            status_color = "#e6b800" # Dark yellow/gold
+
+        elif end_date and now > end_date:
+            is_blocked = True
+            status_text = "(Завершился)"
+            status_color = "red"
+
+        if max_attempts > 0:
+            remaining_attempts = max_attempts - attempts_count
+            if remaining_attempts <= 0:
+                is_blocked = True
+                remaining_attempts = 0
+                # If it was open by date, but blocked by attempts -> show attempts exhausted
+                if status_text == "(Открыто)":
+                    status_text = "(Попытки исчерпаны)"
+                    status_color = "red"
+
+        item_data = {
+            'quiz': quiz,
+            'attempts_count': attempts_count,
+            'best_score': best_score,
+            'total_questions': total_questions,
+            'is_blocked': is_blocked,
+            'remaining_attempts': remaining_attempts,
+            'status_text': status_text,
+            'status_color': status_color,
+            'start_date': start_date,
+            'end_date': end_date,
+            'max_attempts': max_attempts
+        }
+
+        # Expired quizzes go to archive instead of main lists
+        if end_date and now > end_date:
+            archived.append(item_data)
+        elif max_attempts == 0:
+            educational_tasks.append(item_data)
+        else:
+            assessments.append(item_data)
+
+    # Sort archive: most recently expired first
+    archived.sort(key=lambda x: x['end_date'], reverse=True)
+
+    return {
+        'educational_tasks': educational_tasks,
+        'assessments': assessments,
+        'archived': archived,
+    }, next_boundary
+
+
+def get_quiz_list(user):
+    """Корзины тестов из кэша; при промахе — build_quiz_list() и запись в кэш."""
+    user_key = _user_key(user.id)
+    now = timezone.now()
+    try:
+        cached = cache.get_many([GENERATION_KEY, user_key])
+    except Exception:
+        return build_quiz_list(user, now)[0]
+
+    generation = cached.get(GENERATION_KEY)
+    entry = cached.get(user_key)
+    if generation is not None and entry and entry[0] == generation and (entry[2] is None or now < entry[2]):
+        return entry[1]
+
+    if generation is None:
+        generation = time.time_ns()
+        try:
+            cache.add(GENERATION_KEY, generation, None)
+            generation = cache.get(GENERATION_KEY, generation)
+        except Exception:
+            pass
+
+    context, next_boundary = build_quiz_list(user, now)
+    timeout = QUIZ_LIST_CACHE_TIMEOUT
+    if next_boundary is not None:
+        timeout = max(1, min(timeout, int((next_boundary - now).total_seconds()) + 1))
+    try:
+        cache.set(user_key, (generation, context, next_boundary), timeout)
+    except Exception:
+        pass
+    return context
+
+
+def invalidate_user_quiz_list(user_id):
+    try:
+        cache.delete(_user_key(user_id))
+    except Exception:
+        pass
+
+
+def bump_quiz_list_generation():
+    try:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+    except Exception:
+        pass
@@ -0,0 +1,17 @@
+"""
+Общий клиент Redis для атомарных счётчиков и буферов.
+
+Кэш Django (CACHES) не даёт хэшей и HINCRBY, поэтому для них — отдельный
+клиент на REDIS_URL. Соединения берутся из пула, клиент создаётся лениво.
+"""
+import redis
+from django.conf import settings
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
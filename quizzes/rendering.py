@@ -0,0 +1,361 @@
+"""
+Рендеринг текста вопроса в HTML.
+
+Текст вопроса (формат парсера ЕГЭ) превращается в HTML: блоки с табуляцией —
+в таблицы, остальное — в абзацы, маркеры [img:N], [sup:], [sub:] — в теги.
+
+Результат хранится в Question.rendered_html вместе с rendered_hash — хэшем
+текста и набора картинок. Пересчёт выполняют сигналы при сохранении вопроса
+и его картинок (quizzes/signals.py) и команда rebuild_question_html;
+фильтр render_question_text лишь отдаёт сохранённый HTML.
+"""
+import hashlib
+import re
+
+from django.utils.html import escape
+
+from pages.images import derivative_sources, srcset
+
+IMG_MARKER_RE = re.compile(r'\[img:(\d+)\]')
+# Токены маркеров в готовом HTML: [img:N], открывающие [sup:/[sub: и любая ']'
+_MARKER_TOKEN_RE = re.compile(r'(\[img:(\d+)\]|\[su[pb]:|\])')
+# В HTML картинки [img:N] уже не маркер, но '[sup:'/'[sub:' и ']' в нём считаются
+_TEXT_TOKEN_RE = re.compile(r'(\[su[pb]:|\])')
+# [sup:текст]/[sub:текст] без скобок внутри и начало строки только из них и текста
+_SIMPLE_MARKER_RE = re.compile(r'\[(su[pb]):([^\[\]]+)\]')
+_SAFE_PREFIX_RE = re.compile(r'(?:[^\[\]]+|\[su[pb]:[^\[\]]+\])*')
+INLINE_IMAGE_SIZES = '(max-width: 768px) 100vw, 768px'
+
+
+def _render_table(rows):
+    """Convert list of tab-separated strings to a styled HTML table."""
+    raw = [row.split('\t') for row in rows]
+
+    # Merge continuation rows: the EGE parser splits multi-line table headers
+    # into separate tab-separated lines. A continuation row has significantly
+    # fewer cells than the header row. We merge its first cell onto the last
+    # cell of the previous row and treat remaining cells as new columns.
+    merged = []
+    ref_cols = len(raw[0]) if raw else 0
+    for i, cells in enumerate(raw):
+        if i == 0:
+            merged.append(list(cells))
+            continue
+        if len(cells) < ref_cols and len(cells) <= max(2, ref_cols // 2):
+            prev = merged[-1]
+            # Append first cell text to last cell of previous row
+            if cells[0].strip():
+                prev[-1] = prev[-1].rstrip() + ' ' + cells[0].strip()
+            # Add remaining cells as new columns on previous row
+            prev.extend(cells[1:])
+            if len(prev) > ref_cols:
+                ref_cols = len(prev)
+        else:
+            merged.append(list(cells))
+
+    parsed = merged
+    max_cols = max(len(r) for r in parsed)
+
+    # Pad all rows to the same column count
+    for row in parsed:
+        row += [''] * (max_cols - len(row))
+
+    html = ['<div class="overflow-x-auto my-3"><table class="text-sm border-collapse">']
+    html.append('<thead>')
+    # First row is the column header row
+    html.append('<tr>')
+    for cell in parsed[0]:
+        html.append(
+            f'<th class="border border-gray-300 px-2 py-1 bg-gray-100 '
+            f'font-semibold text-center min-w-[2.5rem]">{escape(cell.strip())}</th>'
+        )
+    html.append('</tr>')
+    html.append('</thead>')
+
+    if len(parsed) > 1:
+        html.append('<tbody>')
+        for row in parsed[1:]:
+            html.append('<tr>')
+            for j, cell in enumerate(row):
+                content = escape(cell.strip())
+                if j == 0:
+                    # Row header
+                    html.append(
+                        f'<th class="border border-gray-300 px-2 py-1 bg-gray-100 '
+                        f'font-semibold text-center">{content}</th>'
+                    )
+                else:
+                    html.append(
+                        f'<td class="border border-gray-300 px-2 py-1 text-center">'
+                        f'{content}</td>'
+                    )
+            html.append('</tr>')
+        html.append('</tbody>')
+
+    html.append('</table></div>')
+    return ''.join(html)
+
+
+def _img_tag(url, alt, srcset=''):
+    # Производные WebP (pages/images.py): браузер выберет ширину по экрану
+    responsive = f' srcset="{escape(srcset)}" sizes="{INLINE_IMAGE_SIZES}"' if srcset else ''
+    return (
+        f'<div class="my-3">'
+        f'<img src="{escape(url)}"{responsive} alt="{escape(alt)}" '
+        f'class="max-w-full rounded-lg border">'
+        f'</div>'
+    )
+
+
+def _simple_marker(m):
+    tag, body = m.groups()
+    return f'<{tag}>{body}</{tag}>'
+
+
+class _MarkerWriter:
+    """
+    Замена маркеров за один проход по блокам HTML по мере их сборки.
+
+    Семантика та же, что у прежних трёх проходов по всему HTML
+    ([img:N], затем [sup:текст], затем [sub:текст]): тело [sup:/[sub:
+    тянется до ближайшей ']' — хоть через строки, ячейки и блоки, а ']',
+    закрывшая [sup:, для [sub: уже не существует. Поэтому открывающий
+    маркер записывается как текст и заменяется тегом, когда находится его
+    ']'; не закрытый до конца текста так и остаётся текстом.
+    """
+
+    def __init__(self, image_map):
+        self.image_map = image_map
+        self.parts = []
+        self.sup = None  # индекс в parts незакрытого '[sup:'
+        self.sub = None
+
+    def write(self, html, token_re=_MARKER_TOKEN_RE):
+        if '[' not in html and ']' not in html:
+            self.parts.append(html)
+            return
+        parts = self.parts
+        append = parts.append
+        # split с группой: текст и токены чередуются, токены — на нечётных местах
+        pieces = token_re.split(html)
+        step = token_re.groups + 1
+        if pieces[0]:
+            append(pieces[0])
+        last = len(pieces) - step
+        for i in range(1, len(pieces), step):
+            token = pieces[i]
+            text = pieces[i + step - 1]
+            if token == ']':
+                self._close()
+            elif token[1] == 'i':
+                img = self.image_map.get(int(pieces[i + 1]))
+                if img is None:
+                    # Неизвестная картинка остаётся текстом, её ']' — обычная скобка
+                    append(token[:-1])
+                    self._close()
+                else:
+                    tag = _img_tag(*img)
+                    if '[' in tag or ']' in tag:
+                        self.write(tag, _TEXT_TOKEN_RE)
+                    else:
+                        append(tag)
+            else:
+                append(token)
+                # Пустое тело ('[sup:]') — не маркер
+                if text:
+                    empty = False
+                else:
+                    empty = i >= last or pieces[i + step] == ']'
+                if token[3] == 'p':
+                    if self.sup is None and not empty:
+                        self.sup = len(parts) - 1
+                elif self.sub is None and not (empty and self.sup is None):
+                    # ']' сразу после '[sub:' внутри [sup: станет '</sup>' — тело не пустое
+                    self.sub = len(parts) - 1
+            if text:
+                append(text)
+
+    def write_paragraph(self, content):
+        if self.sup is not None or self.sub is not None:
+            self.write(f'<p class="mb-2">{content}</p>')
+            return
+        # Начало абзаца из текста и простых [sup:]/[sub:] заменяется одним subn,
+        # токенами разбирается только хвост с первой «неудобной» скобки
+        end = _SAFE_PREFIX_RE.match(content).end()
+        head = _SIMPLE_MARKER_RE.sub(_simple_marker, content[:end])
+        if end == len(content):
+            self.parts.append(f'<p class="mb-2">{head}</p>')
+        else:
+            self.parts.append(f'<p class="mb-2">{head}')
+            self.write(f'{content[end:]}</p>')
+
+    def write_table(self, block, rows):
+        # Скобки в ячейках нет и незакрытых маркеров нет: ']' из класса
+        # min-w-[2.5rem] остаётся обычной скобкой
+        if self.sup is None and self.sub is None and not any('[' in r or ']' in r for r in rows):
+            self.parts.append(block)
+        else:
+            self.write(block)
+
+    def _close(self):
+        if self.sup is not None:
+            self.parts[self.sup] = '<sup>'
+            self.parts.append('</sup>')
+            self.sup = None
+        elif self.sub is not None:
+            self.parts[self.sub] = '<sub>'
+            self.parts.append('</sub>')
+            self.sub = None
+        else:
+            self.parts.append(']')
+
+    def html(self):
+        return ''.join(self.parts)
+
+
+def render_text_html(text, image_map=None):
+    """
+    Renders question text with tab-separated blocks converted to HTML tables.
+    Regular paragraphs are wrapped in <p> tags with proper spacing.
+    Supports [img:N] markers for inline image placement (1-based index).
+
+    image_map: {1-based index: (url, alt[, srcset])}.
+
+    Один проход по строкам: склейка разорванных строк таблицы, сборка
+    блоков и замена маркеров (_MarkerWriter) выполняются на лету. Результат
+    побайтово совпадает с прежним многопроходным рендером (эталон —
+    команда benchmark_question_render).
+    """
+    if not text:
+        return ''
+
+    # Без '[' маркеров нет — блоки просто собираются
+    writer = _MarkerWriter(image_map or {}) if '[' in text else None
+    result = writer.parts if writer else []
+    table_rows = []
+    para_lines = []
+
+    def flush_para():
+        content = '<br>'.join(escape(l) for l in para_lines)
+        para_lines.clear()
+        if result:
+            result.append('\n')
+        if writer:
+            writer.write_paragraph(content)
+        else:
+            result.append(f'<p class="mb-2">{content}</p>')
+
+    def flush_table():
+        block = _render_table(table_rows)
+        if result:
+            result.append('\n')
+        if writer:
+            writer.write_table(block, table_rows)
+        else:
+            result.append(block)
+        table_rows.clear()
+
+    # Короткая строка без табуляции, которая может оказаться первой ячейкой
+    # строки таблицы, разорванной парсером ЕГЭ: решение откладывается до
+    # первой непустой строки после неё (склейка, если та начинается с \t).
+    pending = None
+    pending_gap = False
+
+    for line in text.split('\n'):
+        # rstrip() снимает и \xa0, так что пустая строка — ровно ''
+        line = line.rstrip()
+        if pending is not None:
+            if not line:
+                pending_gap = True
+                continue
+            if line[0] == '\t':
+                if para_lines:
+                    flush_para()
+                table_rows.append(pending[1] + line)
+                pending = None
+                continue
+            if table_rows:
+                flush_table()
+            para_lines.append(pending[0])
+            if pending_gap:
+                flush_para()
+            pending = None
+
+        if not line:
+            # Blank / nbsp-only line → paragraph break
+            if table_rows:
+                flush_table()
+            if para_lines:
+                flush_para()
+        elif '\t' in line:
+            if para_lines:
+                flush_para()
+            table_rows.append(line)
+        else:
+            # Only short lines (≤ 30 chars) can be a split table-row first cell.
+            stripped = line.replace('\xa0', '').strip() if '\xa0' in line else line.lstrip()
+            if len(stripped) <= 30:
+                pending = (line, stripped)
+                pending_gap = False
+                continue
+            if table_rows:
+                flush_table()
+            para_lines.append(line)
+
+    if pending is not None:
+        if table_rows:
+            flush_table()
+        para_lines.append(pending[0])
+    if table_rows:
+        flush_table()
+    if para_lines:
+        flush_para()
+
+    return ''.join(result)
+
+
+def question_image_map(question):
+    """
+    Картинки вопроса для маркеров [img:N]: {1-based index: (url, alt[, srcset])}.
+    Когда готовы производные (pages/images.py), вместо оригинала — WebP со srcset.
+    """
+    image_map = {}
+    for idx, img in enumerate(question.images.all(), 1):
+        sources = derivative_sources(img)
+        webp = sources.get('webp') if sources else None
+        if webp:
+            image_map[idx] = (webp[-1][1], img.alt_text or '', srcset(webp))
+        else:
+            image_map[idx] = (img.image.url, img.alt_text or '')
+    return image_map
+
+
+def render_hash(text, image_map):
+    """Хэш исходных данных рендера: текст + упорядоченный набор картинок."""
+    digest = hashlib.sha1((text or '').encode('utf-8'))
+    for idx in sorted(image_map):
+        parts = ''.join(f'\0{part}' for part in image_map[idx])
+        digest.update(f'\0{idx}{parts}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def refresh_rendered_html(question, force=False):
+    """
+    Пересчитывает Question.rendered_html, если изменились текст или картинки.
+    Пишет через update(), чтобы не вызывать post_save повторно.
+    Возвращает True, если HTML был обновлён.
+    """
+    from .models import Question
+
+    body = question.get_body()
+    image_map = question_image_map(question)
+    new_hash = render_hash(body, image_map)
+    if not force and new_hash == question.rendered_hash:
+        return False
+    question.rendered_html = render_text_html(body, image_map)
+    question.rendered_hash = new_hash
+    Question.objects.filter(id=question.id).update(
+        rendered_html=question.rendered_html,
+        rendered_hash=question.rendered_hash,
+    )
+    return True
@@ -1,7 +1,14 @@
+from channels.auth import AuthMiddlewareStack
 from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/quiz/(?P<quiz_id>\d+)/$', consumers.QuizConsumer.as_asgi()),
     re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
+    re_path(r'ws/session/$', consumers.SessionConsumer.as_asgi()),
+]
+
+# HTTP-маршруты ASGI (Daphne); остальное уходит в Django
+http_urlpatterns = [
+    re_path(r'^sse/quiz/(?P<quiz_id>\d+)/$', AuthMiddlewareStack(consumers.QuizEventsConsumer.as_asgi())),
 ]
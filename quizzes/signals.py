@@ -0,0 +1,106 @@
+"""
+Сигналы quizzes: пересчёт HTML текста вопроса (rendering), инвалидация
+кэша графа вопросов (question_cache), кэша назначений (assignments) и
+списка тестов (quiz_list), счётчик лайков для изменений SolutionLike
+через ORM (likes), счётчики непрочитанных запросов помощи (unread).
+Подключаются в QuizzesConfig.ready().
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.models import Profile
+from .assignments import bump_assignments_generation, invalidate_user_assignments
+from .likes import adjust_like_count
+from .models import (
+    Quiz, QuizAssignment, Question, Choice, TestCase, QuestionImage, QuestionFile,
+    UserResult, SolutionLike, HelpRequest,
+)
+from .question_cache import bump_quiz_version
+from .rendering import refresh_rendered_html
+from .quiz_list import bump_quiz_list_generation, invalidate_user_quiz_list
+from .unread import help_request_created, help_request_deleted
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    bump_quiz_version(instance.id)
+    # Даты и лимит попыток теста входят в карты назначений и списки тестов
+    bump_assignments_generation()
+    bump_quiz_list_generation()
+
+
+@receiver([post_save, post_delete], sender=QuizAssignment)
+def assignment_changed(sender, instance, **kwargs):
+    if instance.user_id:
+        invalidate_user_assignments(instance.user_id)
+        invalidate_user_quiz_list(instance.user_id)
+    else:
+        bump_assignments_generation()
+        bump_quiz_list_generation()
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    # Смена класса меняет набор групповых назначений ученика
+    invalidate_user_assignments(instance.user_id)
+    invalidate_user_quiz_list(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=UserResult)
+def user_result_changed(sender, instance, **kwargs):
+    # Попытки и лучший балл в списке тестов
+    invalidate_user_quiz_list(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, created=False, **kwargs):
+    # HTML пересчитываем до сброса версии — кэш подхватит уже новый текст
+    if kwargs['signal'] is post_save and not kwargs.get('raw'):
+        refresh_rendered_html(instance)
+    bump_quiz_version(instance.quiz_id)
+    # Число вопросов в списке тестов меняется только при добавлении/удалении
+    if created or kwargs['signal'] is post_delete:
+        bump_quiz_list_generation()
+
+
+@receiver([post_save, post_delete], sender=Choice)
+@receiver([post_save, post_delete], sender=TestCase)
+@receiver([post_save, post_delete], sender=QuestionFile)
+def question_part_changed(sender, instance, **kwargs):
+    # При каскадном удалении вопроса строки уже может не быть —
+    # тогда версию сбросит question_changed
+    quiz_id = Question.objects.filter(id=instance.question_id).values_list('quiz_id', flat=True).first()
+    if quiz_id:
+        bump_quiz_version(quiz_id)
+
+
+@receiver([post_save, post_delete], sender=QuestionImage)
+def question_image_changed(sender, instance, **kwargs):
+    # Картинки входят в HTML через маркеры [img:N]
+    question = Question.objects.filter(id=instance.question_id).first()
+    if question:
+        refresh_rendered_html(question)
+        bump_quiz_version(question.quiz_id)
+
+
+@receiver(post_save, sender=SolutionLike)
+def solution_like_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_like_count(instance.answer_id, 1)
+
+
+@receiver(post_delete, sender=SolutionLike)
+def solution_like_deleted(sender, instance, **kwargs):
+    adjust_like_count(instance.answer_id, -1)
+
+
+@receiver(post_save, sender=HelpRequest)
+def help_request_saved(sender, instance, created, **kwargs):
+    # Смену флагов у существующих запросов учитывает update_help_request()
+    if created and not kwargs.get('raw'):
+        help_request_created(instance)
+
+
+@receiver(post_delete, sender=HelpRequest)
+def help_request_removed(sender, instance, **kwargs):
+    help_request_deleted(instance)
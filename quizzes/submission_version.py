@@ -0,0 +1,72 @@
+"""
+Версия отправок кода пользователя для условных GET в polling-режиме.
+
+Когда WebSocket недоступен, quiz-async.js опрашивает статусы проверок.
+Чтобы неизменившийся опрос не ходил в БД, у каждого пользователя есть
+счётчик sub_version:user:<id>: он увеличивается при каждой смене статуса
+его CodeSubmission (создание, running, вердикт, ошибка). ETag ответа
+submission_statuses_view строится из версии, и при совпадении
+If-None-Match view отвечает 304 до запроса к CodeSubmission.
+
+Увеличение делается после коммита транзакции — иначе опрос между INCR
+и COMMIT закэшировал бы старые статусы под новой версией.
+
+Отсутствующий ключ (истёк TTL, Redis очищен) заполняется текущим временем
+в микросекундах, а не нулём: новая версия всегда больше любой выданной
+раньше, и старый ETag клиента не совпадёт случайно. Если Redis недоступен,
+get_version() возвращает None — ETag не выдаётся, ответ всегда из БД.
+"""
+import time
+
+from django.db import transaction
+
+from .redis_client import get_redis
+
+KEY_PREFIX = 'sub_version:user'
+VERSION_TTL = 86400
+
+# INCR только для существующего ключа: отсутствующий заполнит get_version()
+_INCR_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return redis.call('INCR', KEYS[1])
+end
+return nil
+"""
+
+
+def _version_key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def get_version(user_id):
+    """Текущая версия отправок пользователя или None, если Redis недоступен."""
+    key = _version_key(user_id)
+    try:
+        r = get_redis()
+        value = r.get(key)
+        if value is None:
+            r.set(key, time.time_ns() // 1000, nx=True, ex=VERSION_TTL)
+            value = r.get(key)
+        return int(value)
+    except Exception:
+        return None
+
+
+def _bump(user_ids):
+    try:
+        r = get_redis()
+        pipe = r.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.eval(_INCR_IF_EXISTS, 1, _version_key(user_id), VERSION_TTL)
+        pipe.execute()
+    except Exception:
+        # Без Redis ETag не выдаётся — опрос идёт в БД как раньше
+        pass
+
+
+def bump_version(*user_ids):
+    """Отмечает смену статуса отправок пользователей (после коммита)."""
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: _bump(user_ids))
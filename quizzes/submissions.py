@@ -0,0 +1,87 @@
+"""
+Пакетные операции с CodeSubmission.
+
+Используются при завершении теста/варианта, чтобы число запросов не росло
+с количеством code-задач: последние отправки — одним DISTINCT ON,
+новые отправки — одним bulk_create, постановка в очередь — одной Celery group.
+"""
+from celery import group
+from django.utils import timezone
+
+from .models import CodeSubmission
+from .submission_version import bump_version
+from .tasks import check_code_task
+
+CHECKER_UNAVAILABLE = 'Сервер проверки временно недоступен'
+
+
+def latest_submissions(user, quiz, question_ids, statuses=None, order_field='created_at'):
+    """
+    Последняя отправка по каждому вопросу: {question_id: CodeSubmission}.
+    Один запрос SELECT DISTINCT ON (question_id) (PostgreSQL).
+    """
+    question_ids = list(question_ids)
+    if not question_ids:
+        return {}
+    qs = CodeSubmission.objects.filter(user=user, quiz=quiz, question_id__in=question_ids)
+    if statuses:
+        qs = qs.filter(status__in=statuses)
+    qs = qs.order_by('question_id', f'-{order_field}').distinct('question_id')
+    return {sub.question_id: sub for sub in qs}
+
+
+def best_submissions(user, quiz, question_ids, metric):
+    """
+    Лучшая верная отправка по метрике (меньше = лучше) для каждого вопроса:
+    {question_id: CodeSubmission}. Один запрос DISTINCT ON.
+    """
+    question_ids = list(question_ids)
+    if not question_ids:
+        return {}
+    qs = CodeSubmission.objects.filter(
+        user=user, quiz=quiz, question_id__in=question_ids,
+        is_correct=True, **{f'{metric}__isnull': False},
+    ).order_by('question_id', metric).distinct('question_id')
+    return {sub.question_id: sub for sub in qs}
+
+
+def create_submissions(user, quiz, codes):
+    """
+    Создаёт pending-отправки одним INSERT: codes = {question_id: code}.
+    В очередь не ставит — см. enqueue_checks().
+    """
+    if not codes:
+        return {}
+    created = CodeSubmission.objects.bulk_create([
+        CodeSubmission(user=user, quiz=quiz, question_id=qid, code=code, status='pending')
+        for qid, code in codes.items()
+    ])
+    bump_version(user.id)
+    return {sub.question_id: sub for sub in created}
+
+
+def enqueue_checks(submissions):
+    """
+    Ставит проверку всех отправок в очередь одной Celery group.
+    Если брокер недоступен — помечает отправки как error (одним UPDATE).
+    """
+    submissions = list(submissions)
+    if not submissions:
+        return
+    try:
+        result = group(check_code_task.s(sub.id) for sub in submissions).apply_async()
+    except Exception:
+        now = timezone.now()
+        CodeSubmission.objects.filter(id__in=[sub.id for sub in submissions]).update(
+            status='error', error_log=CHECKER_UNAVAILABLE, completed_at=now,
+        )
+        for sub in submissions:
+            sub.status = 'error'
+            sub.error_log = CHECKER_UNAVAILABLE
+            sub.completed_at = now
+        bump_version(*(sub.user_id for sub in submissions))
+        return
+
+    for sub, task in zip(submissions, result.results):
+        sub.celery_task_id = task.id
+    CodeSubmission.objects.bulk_update(submissions, ['celery_task_id'])
@@ -1,9 +1,12 @@
 import os
 from celery import shared_task
 from django.utils import timezone
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from datetime import timedelta
+from accounts.snapshots import schedule_profile_snapshot
+from .event_stream import publish_event
+from .monitor import publish_monitor_event
+from .publisher import publish
+from .submission_version import bump_version
 
 
 def normalize_output(text):
@@ -104,6 +107,9 @@ def check_code_task(self, submission_id):
         # Update ExamTaskProgress (best metrics, solved status) — works even without UserAnswer
         update_exam_progress_from_submission(submission)
 
+        # Profile stats depend on answers and progress — recompute in background
+        schedule_profile_snapshot(submission.user_id)
+
         # Send WebSocket notification - completed
         send_ws_notification(submission, 'completed')
 
@@ -141,10 +147,11 @@ def cleanup_stale_submissions():
 
     threshold = timezone.now() - timedelta(minutes=10)
 
+    # quiz и user читает send_ws_notification (тип теста, монитор ЕГЭ)
     stale = CodeSubmission.objects.filter(
         status__in=['pending', 'running'],
         created_at__lt=threshold
-    )
+    ).select_related('quiz', 'user')
 
     for submission in stale:
         submission.status = "error"
@@ -152,10 +159,33 @@ def cleanup_stale_submissions():
         submission.completed_at = timezone.now()
         submission.save(update_fields=['status', 'error_log', 'completed_at'])
         update_user_answer_from_submission(submission)
+        schedule_profile_snapshot(submission.user_id)
         send_ws_notification(submission, 'error')    
 
 
 
+@shared_task
+def flush_exam_time_buffer():
+    """
+    Periodic task: move buffered EGE task time from Redis to ExamTaskProgress.
+    Runs every 30 seconds via Celery Beat.
+    """
+    from .time_buffer import flush_time_buffer
+
+    return flush_time_buffer()
+
+
+@shared_task
+def reconcile_help_unread_counters():
+    """
+    Periodic task: overwrite Redis unread counters of help requests
+    with values from PostgreSQL. Runs every 5 minutes via Celery Beat.
+    """
+    from .unread import reconcile_counters
+
+    return reconcile_counters()
+
+
 def update_user_answer_from_submission(submission):
     """
     After Celery checks a submission, update linked UserAnswer and recalculate score.
@@ -213,49 +243,28 @@ def update_exam_progress_from_submission(submission):
     if submission.quiz.quiz_type != 'exam' or not submission.is_correct:
         return
 
-    from .models import ExamTaskProgress
-
-    progress, _ = ExamTaskProgress.objects.get_or_create(
-        user=submission.user,
-        quiz=submission.quiz,
-        question=submission.question,
-    )
-    fields_to_update = []
-
-    if not progress.is_solved:
-        progress.is_solved = True
-        progress.first_solved_at = timezone.now()
-        fields_to_update += ['is_solved', 'first_solved_at']
+    from .progress import record_code_result
+    from .time_buffer import flush_user_time
 
-    # Обновляем лучшие метрики (меньше = лучше) и запоминаем код
-    if submission.cpu_time_ms is not None:
-        if progress.best_cpu_time_ms is None or submission.cpu_time_ms < progress.best_cpu_time_ms:
-            progress.best_cpu_time_ms = submission.cpu_time_ms
-            progress.best_cpu_code = submission.code
-            fields_to_update += ['best_cpu_time_ms', 'best_cpu_code']
-    if submission.memory_kb is not None:
-        if progress.best_memory_kb is None or submission.memory_kb < progress.best_memory_kb:
-            progress.best_memory_kb = submission.memory_kb
-            progress.best_memory_code = submission.code
-            fields_to_update += ['best_memory_kb', 'best_memory_code']
+    # Время до решения должно попасть в прогресс до заморозки
+    flush_user_time(submission.user_id, submission.quiz_id)
 
-    if fields_to_update:
-        progress.save(update_fields=fields_to_update)
+    # Один upsert: решена + лучшие метрики (меньше = лучше) с кодом
+    record_code_result(submission)
 
 
 def send_ws_notification(submission, event_type):
     """
     Send WebSocket notification about submission status change.
+    Non-blocking: the message is queued to the process-wide publisher
+    (quizzes/publisher.py), the task does not wait for Redis.
     """
-    channel_layer = get_channel_layer()
-    if not channel_layer:
-        return
-
     group_name = f"user_{submission.user_id}_quiz_{submission.quiz_id}"
 
     message = {
         'type': 'submission_update',
         'submission_id': submission.id,
+        'quiz_id': submission.quiz_id,
         'question_id': submission.question_id,
         'status': submission.status,
         'is_correct': submission.is_correct,
@@ -264,8 +273,15 @@ def send_ws_notification(submission, event_type):
         'cpu_time_ms': submission.cpu_time_ms,
         'memory_kb': submission.memory_kb,
     }
-
-    try:
-        async_to_sync(channel_layer.group_send)(group_name, message)
-    except Exception:
-        pass  # Ignore WebSocket errors, they are non-critical
+    # Новая версия отправок — polling-клиенты получат не 304, а новые статусы
+    bump_version(submission.user_id)
+    # Журнал для повтора пропущенных событий при переподключении
+    publish_event(submission.user_id, submission.quiz_id, message)
+    publish(group_name, message)
+
+    # Живой монитор учителя (только варианты ЕГЭ)
+    if submission.quiz.quiz_type == 'exam':
+        cell = {'question_id': submission.question_id, 'status': submission.status}
+        if submission.is_correct:
+            cell['is_solved'] = True
+        publish_monitor_event(submission.quiz_id, submission.user, [cell])
@@ -1,3 +1,744 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import event_stream, submission_version, time_buffer, unread
+from .consumers import NotificationConsumer, SessionConsumer
+from .help_inbox import decode_cursor, encode_cursor, inbox_page
+from .management.commands.benchmark_question_render import render_text_html_legacy
+from .models import (
+    Quiz, QuizAssignment, Question, Choice, CodeSubmission, ExamTaskProgress, HelpRequest, HelpComment,
+    TestCase as CodeTestCase,
+)
+from .monitor import MonitorAggregator
+from .publisher import BATCH_TYPE, NotificationPublisher
+from .rendering import render_text_html
+from .submissions import create_submissions
+from .tasks import send_ws_notification
+from .views import MAX_STATUS_IDS
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+# Без collectstatic manifest-хранилище не отрендерит {% static %}
+PLAIN_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class FakeRedis:
+    """Словарь вместо Redis: get/set и Lua-скрипты «INCR(BY), если ключ есть»."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value)
+        return True
+
+    def eval(self, script, numkeys, key, arg):
+        if key not in self.data:
+            return None
+        # В скриптах версий ARGV[1] — TTL, прибавляется единица
+        delta = int(arg) if 'INCRBY' in script else 1
+        self.data[key] = str(int(self.data[key]) + delta)
+        return int(self.data[key])
+
+    def pipeline(self, transaction=False):
+        return self
+
+    def execute(self):
+        pass
+
+
+@override_settings(CACHES=LOCMEM_CACHE, STORAGES=PLAIN_STORAGES)
+class QuizDetailQueryCountTests(TestCase):
+    """Страница прохождения теста: число запросов не зависит от числа вопросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='password123')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _make_quiz(self, per_type):
+        quiz = Quiz.objects.create(title=f'Тест x{per_type}', max_attempts=0)
+        QuizAssignment.objects.create(quiz=quiz, user=self.user)
+        for i in range(per_type):
+            choice_q = Question.objects.create(quiz=quiz, text=f'Выбор {i}', question_type='choice')
+            Choice.objects.create(question=choice_q, text='Да', is_correct=True)
+            Choice.objects.create(question=choice_q, text='Нет', is_correct=False)
+            Question.objects.create(
+                quiz=quiz, text=f'Текст {i}', question_type='text', correct_text_answer='42',
+            )
+            code_q = Question.objects.create(quiz=quiz, text=f'Код {i}', question_type='code')
+            CodeTestCase.objects.create(question=code_q, input_data='1', output_data='1')
+        return quiz
+
+    def _count_queries(self, quiz):
+        url = reverse('quizzes:quiz_detail', args=[quiz.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_independent_of_question_count(self):
+        small = self._make_quiz(1)
+        large = self._make_quiz(5)
+        # Прогрев кэша графа вопросов и сессии
+        self._count_queries(small)
+        self._count_queries(large)
+
+        self.assertEqual(self._count_queries(small), self._count_queries(large))
+
+    def test_cached_questions_invalidated_on_change(self):
+        quiz = self._make_quiz(1)
+        url = reverse('quizzes:quiz_detail', args=[quiz.id])
+        self.client.get(url)
+
+        question = quiz.questions.filter(question_type='choice').first()
+        Choice.objects.create(question=question, text='Новый вариант', is_correct=False)
+
+        self.assertContains(self.client.get(url), 'Новый вариант')
+
+
+# Фрагменты текстов вариантов ЕГЭ в том виде, в каком их выдаёт парсер
+EGE_SAMPLES = [
+    'Определите значение x[sub:2] + 2[sup:10].',
+    'На рисунке схема дорог.\n[img:1]\nВ таблице — длины дорог.',
+    '\tП1\tП2\tП3\nП1\t\t5\t\nП2\t5\t\t7\nП3\t\t7\t',
+    # Первая ячейка строки оторвана от остальных пустыми/nbsp-строками
+    'Таблица:\n\tA\tB\tC\nA\n\xa0\n\n\t\t3\t4\nB\n\t3\t\t\nC\xa0\xa0\n \n\t4\t\t',
+    # Многострочная шапка: строки-продолжения с меньшим числом ячеек
+    'Номер\tНаименование\tЦена\tКоличество\nтовара\tтовара\nИтого\t1\t2\t3\n1\tРучка\t10\t3',
+    'Короткая строка\nпродолжение абзаца\n\nДлинная строка, которая точно не может быть ячейкой таблицы\n\t1\t2',
+    '<script>alert(1)</script> & "кавычки"\n\ta<b\tc&d\n[sup:a<b] [sub:&]',
+    'Маркер без картинки [img:7], пустой [sup:] и незакрытый [sub:x',
+    'Вложенные [sup:a[sub:b]] и [sub:a\nb] через строку',
+    '\xa0\n\n\t\n  \nТекст\xa0с\xa0неразрывными\xa0пробелами\xa0\n\n',
+]
+
+
+class QuestionRenderTests(SimpleTestCase):
+    """Однопроходный рендер текста вопроса совпадает с прежним побайтово."""
+
+    IMAGE_MAPS = [
+        None,
+        {1: ('/media/ege/1.png', 'Схема <дорог>')},
+        {1: ('/media/ege/[sup:1].png', 'alt [sub:x]')},
+    ]
+
+    def assertSameHtml(self, text, image_map=None):
+        self.assertEqual(
+            render_text_html(text, image_map),
+            render_text_html_legacy(text, image_map),
+            msg=repr(text),
+        )
+
+    def test_ege_samples(self):
+        for text in EGE_SAMPLES:
+            for image_map in self.IMAGE_MAPS:
+                with self.subTest(text=text, image_map=image_map):
+                    self.assertSameHtml(text, image_map)
+
+    def test_random_texts(self):
+        fragments = [
+            'a', 'Задача', 'x' * 40, '\t', '\t', '\n', '\n', '\n', '\xa0', ' ',
+            '[sup:2]', '[sub:i]', '[img:1]', '[img:3]', '[sup:', '[sub:', ']', '[',
+            '<b>&', '1\t2\t3', '\t4\t5', '\xa0\n', 'Таблица 1',
+        ]
+        rnd = random.Random(37)
+        for _ in range(5000):
+            text = ''.join(rnd.choice(fragments) for _ in range(rnd.randint(0, 25)))
+            self.assertSameHtml(text, rnd.choice(self.IMAGE_MAPS))
+
+    def test_markers_and_tables(self):
+        html = render_text_html('x[sub:2]\n\n\tA\nA\t[sup:3]', {1: ('/m/1.png', '')})
+        self.assertIn('x<sub>2</sub>', html)
+        self.assertIn('<sup>3</sup></td>', html)
+        self.assertEqual(html.count('<table'), 1)
+
+
+class HelpUnreadCounterTests(TestCase):
+    """Счётчики непрочитанных сдвигаются на разницу с заблокированной строкой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student')
+        cls.quiz = Quiz.objects.create(title='Тест')
+        cls.question = Question.objects.create(quiz=cls.quiz, text='Код', question_type='code')
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch('quizzes.unread.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.hr = HelpRequest.objects.create(student=self.student, question=self.question, quiz=self.quiz)
+        # Ключи заполняются COUNT'ом из БД при первом чтении
+        self.assertEqual(unread.get_teacher_unread_count(), 1)
+        self.assertEqual(unread.get_student_unread_count(self.student.id), 0)
+
+    def _update(self, hr, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return unread.update_help_request(hr, **fields)
+
+    def assertCounts(self, teacher, student):
+        self.assertEqual(self.redis.get(unread.TEACHERS_KEY), str(teacher))
+        self.assertEqual(self.redis.get(unread._student_key(self.student.id)), str(student))
+        # Счётчики совпадают с тем, что насчитала бы сверка
+        self.assertEqual(unread._db_teacher_count(), teacher)
+        self.assertEqual(unread._db_student_count(self.student.id), student)
+
+    def test_reply(self):
+        self._update(self.hr, status='answered', has_unread_for_student=True, has_unread_for_teacher=False)
+        self.assertCounts(teacher=0, student=1)
+
+    def test_resolve(self):
+        self._update(self.hr, status='resolved', has_unread_for_student=True, has_unread_for_teacher=False)
+        self.assertCounts(teacher=0, student=1)
+        self._update(self.hr, touch=False, has_unread_for_student=False)
+        self.assertCounts(teacher=0, student=0)
+
+    def test_reopen(self):
+        self._update(self.hr, status='resolved', has_unread_for_student=True, has_unread_for_teacher=False)
+        previous = self._update(self.hr, reopen=True, has_unread_for_teacher=True)
+        self.assertEqual(previous['status'], 'resolved')
+        self.assertEqual(self.hr.status, 'open')
+        self.assertCounts(teacher=1, student=1)
+
+    def test_stale_instance(self):
+        stale = HelpRequest.objects.get(id=self.hr.id)
+        # Учитель решил запрос, пока у ученика был загружен открытый
+        self._update(self.hr, status='resolved', has_unread_for_student=True, has_unread_for_teacher=False)
+        self._update(stale, has_unread_for_teacher=True)
+        self.assertEqual(HelpRequest.objects.get(id=self.hr.id).status, 'resolved')
+        self.assertCounts(teacher=0, student=1)
+        # Повтор того же флага счётчики не трогает
+        self._update(stale, has_unread_for_teacher=True)
+        self.assertCounts(teacher=0, student=1)
+
+
+class StreamRedis:
+    """Redis Stream в памяти: только XRANGE с min и count."""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def xrange(self, key, min='-', max='+', count=None):
+        entries = self.entries
+        if min != '-':
+            start = event_stream.parse_event_id(min)
+            entries = [e for e in entries if event_stream.parse_event_id(e[0]) >= start]
+        return entries[:count] if count else entries
+
+
+class EventReplayTests(SimpleTestCase):
+    """Повтор пропущенных событий из журнала ученика."""
+
+    def _entry(self, event_id, quiz_id=1, **message):
+        return event_id, {'quiz_id': str(quiz_id), 'data': json.dumps({'type': 'submission_update', **message})}
+
+    def _read(self, entries, last_event_id, quiz_id=1):
+        with mock.patch('quizzes.event_stream.get_redis', return_value=StreamRedis(entries)):
+            return event_stream.read_missed_events(7, quiz_id, last_event_id)
+
+    def test_parse_event_id(self):
+        self.assertEqual(event_stream.parse_event_id('1700000000000-3'), (1700000000000, 3))
+        for value in (None, '', '17', 'a-b', '1-2-3'):
+            with self.subTest(value=value):
+                self.assertIsNone(event_stream.parse_event_id(value))
+
+    def test_replays_after_last_event(self):
+        entries = [self._entry('100-0', n=0), self._entry('100-1', n=1), self._entry('101-0', n=2)]
+        events = self._read(entries, '100-0')
+        # Само событие last_event_id клиент уже получил
+        self.assertEqual([e['event_id'] for e in events], ['100-1', '101-0'])
+        self.assertEqual([e['n'] for e in events], [1, 2])
+
+    def test_foreign_quiz_skipped(self):
+        entries = [self._entry('100-0'), self._entry('101-0', quiz_id=2), self._entry('102-0')]
+        self.assertEqual([e['event_id'] for e in self._read(entries, '100-0')], ['102-0'])
+
+    def test_trimmed_or_missing_stream(self):
+        # Начало стрима новее last_event_id — часть событий обрезана
+        self.assertIsNone(self._read([self._entry('200-0')], '100-0'))
+        self.assertIsNone(self._read([], '100-0'))
+        self.assertIsNone(self._read([self._entry('100-0')], 'garbage'))
+
+    def test_overflow(self):
+        entries = [self._entry(f'100-{i}') for i in range(event_stream.REPLAY_LIMIT + 1)]
+        self.assertEqual(len(self._read(entries, '100-0')), event_stream.REPLAY_LIMIT)
+        entries.append(self._entry('101-0'))
+        self.assertIsNone(self._read(entries, '100-0'))
+
+    def test_redis_unavailable(self):
+        with mock.patch('quizzes.event_stream.get_redis', side_effect=ConnectionError):
+            self.assertIsNone(event_stream.read_missed_events(7, 1, '100-0'))
+
+
+@override_settings(CACHES=LOCMEM_CACHE, STORAGES=PLAIN_STORAGES)
+class HelpInboxTests(TestCase):
+    """Keyset-страницы списка запросов помощи и превью последнего комментария."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', is_superuser=True)
+        cls.quiz = Quiz.objects.create(title='Тест')
+        cls.base = datetime(2026, 10, 19, 12, 0, 0, 123456, tzinfo=dt_timezone.utc)
+        cls.help_requests = []
+        for i in range(5):
+            student = User.objects.create_user(f'student{i}')
+            question = Question.objects.create(quiz=cls.quiz, text=f'Код {i}', question_type='code')
+            cls.help_requests.append(HelpRequest.objects.create(student=student, question=question, quiz=cls.quiz))
+        # Первые три — с одинаковым updated_at: порядок между ними решает id
+        for i, hr in enumerate(cls.help_requests):
+            hr.updated_at = cls.base + timedelta(microseconds=max(i - 2, 0) * 7)
+            HelpRequest.objects.filter(id=hr.id).update(updated_at=hr.updated_at)
+
+    def _ids(self, help_requests):
+        return [hr.id for hr in help_requests]
+
+    def test_cursor_round_trip(self):
+        hr = self.help_requests[4]
+        self.assertNotEqual(hr.updated_at.microsecond, 0)
+        self.assertEqual(decode_cursor(encode_cursor(hr)), (hr.updated_at, hr.id))
+
+    def test_pages_cover_all_rows(self):
+        expected = sorted(self.help_requests, key=lambda hr: (hr.updated_at, hr.id), reverse=True)
+        seen, cursor = [], None
+        while True:
+            page, cursor = inbox_page('all', cursor, page_size=2)
+            seen += page
+            if not cursor:
+                break
+        self.assertEqual(self._ids(seen), self._ids(expected))
+
+    def test_tie_break_by_id(self):
+        tied = sorted(self.help_requests[:3], key=lambda hr: hr.id, reverse=True)
+        page, cursor = inbox_page('all', encode_cursor(tied[0]), page_size=10)
+        self.assertEqual(self._ids(page), self._ids(tied[1:]))
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        first_page, _ = inbox_page('all', page_size=2)
+        for cursor in ('garbage', '1-x', '-', '9' * 30 + '-1', '-9' + '9' * 30 + '-1'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+                page, _ = inbox_page('all', cursor, page_size=2)
+                self.assertEqual(self._ids(page), self._ids(first_page))
+
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('quizzes:help_requests_list'), {'status': 'all', 'after': '9' * 30 + '-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['help_requests']), 5)
+
+    def test_last_comment_matches_comments_last(self):
+        hr = self.help_requests[0]
+        for offset, author in ((0, hr.student), (30, self.teacher), (10, hr.student)):
+            comment = HelpComment.objects.create(help_request=hr, author=author, text=f'+{offset}')
+            # Созданный последним может быть не самым поздним по created_at
+            HelpComment.objects.filter(id=comment.id).update(created_at=self.base + timedelta(seconds=offset))
+
+        with self.assertNumQueries(2):
+            page, _ = inbox_page('all', page_size=10)
+            previews = {r.id: (r.last_comment and (r.last_comment.text, r.last_comment.author.username)) for r in page}
+
+        for r in self.help_requests:
+            last = r.comments.select_related('author').last()
+            self.assertEqual(previews[r.id], last and (last.text, last.author.username))
+        self.assertEqual(previews[hr.id], ('+30', 'teacher'))
+
+
+class SubmissionStatusesTests(TestCase):
+    """Пакетный опрос статусов: 304 по ETag, пока версия отправок не сменилась."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student')
+        quiz = Quiz.objects.create(title='Тест')
+        question = Question.objects.create(quiz=quiz, text='Код', question_type='code')
+        cls.submissions = [
+            CodeSubmission.objects.create(user=cls.user, question=question, quiz=quiz, code='print(1)')
+            for _ in range(2)
+        ]
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch('quizzes.submission_version.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+        self.url = reverse('quizzes:submission_statuses')
+
+    def _get(self, ids, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(self.url, {'ids': ids}, headers=headers)
+
+    def _ids(self, *submissions):
+        return ','.join(str(sub.id) for sub in submissions)
+
+    def test_not_modified_without_submission_query(self):
+        ids = self._ids(*self.submissions)
+        response = self._get(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['submissions']), 2)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._get(ids, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertFalse(any(CodeSubmission._meta.db_table in q['sql'] for q in ctx.captured_queries))
+
+    def test_bump_invalidates_etag(self):
+        ids = self._ids(*self.submissions)
+        etag = self._get(ids)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            submission_version.bump_version(self.user.id)
+        response = self._get(ids, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_other_user_bump_keeps_etag(self):
+        other = User.objects.create_user('other')
+        self.assertIsNotNone(submission_version.get_version(other.id))
+        ids = self._ids(*self.submissions)
+        etag = self._get(ids)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            submission_version.bump_version(other.id)
+        self.assertEqual(self._get(ids, etag).status_code, 304)
+
+    def test_ids_in_etag(self):
+        first, second = self.submissions
+        etag = self._get(self._ids(first))['ETag']
+        self.assertNotEqual(self._get(self._ids(first, second))['ETag'], etag)
+        self.assertEqual(self._get(self._ids(first, second), etag).status_code, 200)
+        # Порядок и повторы ids набор не меняют
+        self.assertEqual(self._get(f'{second.id},{first.id},{first.id}')['ETag'], self._get(self._ids(first, second))['ETag'])
+
+    def test_bad_requests(self):
+        too_many = ','.join(str(i) for i in range(1, MAX_STATUS_IDS + 2))
+        for ids in ('', ',', 'abc', '1,x', too_many):
+            with self.subTest(ids=ids[:20]):
+                self.assertEqual(self._get(ids).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'quiz': 'x'}).status_code, 400)
+
+    def test_status_changes_bump_version(self):
+        submission = self.submissions[0]
+        with mock.patch('quizzes.submission_version._bump') as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                create_submissions(self.user, submission.quiz, {submission.question_id: 'print(2)'})
+            bump.assert_called_once_with({self.user.id})
+
+            bump.reset_mock()
+            with mock.patch('quizzes.tasks.publish_event'), mock.patch('quizzes.tasks.publish'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    send_ws_notification(submission, 'completed')
+            bump.assert_called_once_with({self.user.id})
+
+    def test_without_redis(self):
+        with mock.patch('quizzes.submission_version.get_redis', side_effect=ConnectionError):
+            response = self._get(self._ids(*self.submissions), '"*"')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIsNone(response.json()['version'])
+
+
+class MonitorAggregatorTests(SimpleTestCase):
+    """Монитор ЕГЭ: события копятся и уходят одной дельтой за интервал."""
+
+    def _run(self, scenario, rate=10):
+        sent = []
+
+        async def send(payload):
+            sent.append((asyncio.get_running_loop().time(), payload))
+
+        async def main():
+            aggregator = MonitorAggregator(send, rate=rate)
+            try:
+                await scenario(aggregator)
+            finally:
+                aggregator.cancel()
+
+        asyncio.run(main())
+        return sent
+
+    def test_merges_cell_and_keeps_solved(self):
+        async def scenario(aggregator):
+            aggregator.add({'user_id': 1, 'name': 'Иванов', 'cells': [
+                {'question_id': 5, 'status': 'success', 'is_solved': True},
+            ]})
+            aggregator.add({'user_id': 1, 'student': {'score': 3}, 'cells': [
+                {'question_id': 5, 'status': 'running'},
+            ]})
+            await asyncio.sleep(0.01)
+
+        sent = self._run(scenario)
+        self.assertEqual(len(sent), 1)
+        payload = sent[0][1]
+        self.assertEqual(payload['type'], 'monitor_delta')
+        self.assertEqual(payload['students'], [{'user_id': 1, 'name': 'Иванов', 'score': 3}])
+        self.assertEqual(payload['cells'], [
+            {'user_id': 1, 'question_id': 5, 'status': 'running', 'is_solved': True},
+        ])
+
+    def test_one_delta_per_interval(self):
+        async def scenario(aggregator):
+            # Первая дельта — сразу, следующие — не раньше чем через интервал
+            aggregator.add({'user_id': 1, 'cells': [{'question_id': 0, 'status': 'running'}]})
+            await asyncio.sleep(0.01)
+            for question_id in range(1, 6):
+                aggregator.add({'user_id': 2, 'cells': [{'question_id': question_id, 'status': 'pending'}]})
+                await asyncio.sleep(0.005)
+            await asyncio.sleep(0.15)
+
+        sent = self._run(scenario, rate=10)
+        self.assertEqual(len(sent), 2)
+        (first_at, first), (second_at, second) = sent
+        self.assertEqual(len(first['cells']), 1)
+        self.assertEqual([c['question_id'] for c in second['cells']], [1, 2, 3, 4, 5])
+        self.assertGreaterEqual(second_at - first_at, 0.1 - 0.005)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, STORAGES=PLAIN_STORAGES)
+class EgeMonitorPageTests(TestCase):
+    """Страница монитора: транспорт выбирается в init(), снимок доступен по HTTP."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', is_superuser=True)
+        cls.quiz = Quiz.objects.create(title='Вариант', quiz_type='exam', is_public=True)
+        Question.objects.create(quiz=cls.quiz, text='Задача', question_type='code', ege_number=1)
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def test_session_socket_loads_before_alpine(self):
+        html = self.client.get(reverse('ege:ege_monitor', args=[self.quiz.id])).content.decode()
+        self.assertLess(html.index('js/session-socket.js'), html.index('alpinejs'))
+
+    def test_snapshot(self):
+        response = self.client.get(reverse('ege:ege_monitor_snapshot', args=[self.quiz.id]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['type'], 'monitor_snapshot')
+        self.assertEqual([q['ege_number'] for q in data['questions']], [1])
+
+    def test_snapshot_for_teachers_only(self):
+        self.client.force_login(User.objects.create_user('student'))
+        response = self.client.get(reverse('ege:ege_monitor_snapshot', args=[self.quiz.id]))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class SessionQuizTopicTests(SimpleTestCase):
+    """Топик quiz:<id> общего сокета отдаёт начальное состояние так же, как ws/quiz/<id>/."""
+
+    EVENT = {
+        'type': 'submission_update', 'submission_id': 3, 'question_id': 5, 'status': 'success',
+        'is_correct': True, 'error_log': None, 'event_type': 'completed', 'event_id': '100-1',
+    }
+
+    def _subscribe(self, missed, last_event_id='100-0'):
+        async def main():
+            communicator = WebsocketCommunicator(SessionConsumer.as_asgi(), '/ws/session/')
+            communicator.scope['user'] = User(id=7, username='student')
+            await communicator.connect()
+            await communicator.send_json_to({'action': 'subscribe', 'topic': 'quiz:1', 'last_event_id': last_event_id})
+            messages = []
+            while not await communicator.receive_nothing(0.05):
+                messages.append(await communicator.receive_json_from())
+            await communicator.disconnect()
+            return messages
+
+        active = mock.AsyncMock(return_value=[{'id': 4, 'question_id': 6, 'status': 'running'}])
+        with mock.patch('quizzes.consumers.read_missed_events', mock.AsyncMock(return_value=missed)) as read, \
+                mock.patch('quizzes.consumers.get_active_submissions', active):
+            messages = asyncio.run(main())
+        return messages, read, active
+
+    def test_replay(self):
+        messages, read, active = self._subscribe([self.EVENT])
+        read.assert_awaited_once_with(7, 1, '100-0')
+        active.assert_not_awaited()
+        self.assertEqual([m['type'] for m in messages], ['subscribed', 'submission_update', 'events_replayed'])
+        self.assertTrue(all(m['topic'] == 'quiz:1' for m in messages))
+        self.assertEqual(messages[1]['event_id'], '100-1')
+        self.assertEqual(messages[2]['count'], 1)
+
+    def test_gap_falls_back_to_db(self):
+        messages, _read, active = self._subscribe(None)
+        self.assertEqual([m['type'] for m in messages], ['subscribed', 'events_replayed', 'active_submissions'])
+        self.assertFalse(messages[1]['complete'])
+        self.assertEqual(messages[2]['submissions'][0]['id'], 4)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class PublisherBatchTests(SimpleTestCase):
+    """Пачка publisher'а: один group_send на группу, consumer разворачивает её по порядку."""
+
+    def test_one_group_send_per_group(self):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        batch = [
+            ('a', {'type': 'x', 'n': 1}),
+            ('b', {'type': 'x', 'n': 2}),
+            ('a', {'type': 'x', 'n': 3}),
+        ]
+        with mock.patch('quizzes.publisher.get_channel_layer', return_value=layer):
+            asyncio.run(NotificationPublisher()._send_batch(batch))
+        calls = {c.args[0]: c.args[1] for c in layer.group_send.await_args_list}
+        self.assertEqual(layer.group_send.await_count, 2)
+        self.assertEqual(calls['a'], {'type': BATCH_TYPE, 'messages': [{'type': 'x', 'n': 1}, {'type': 'x', 'n': 3}]})
+        # Одиночное сообщение уходит как есть
+        self.assertEqual(calls['b'], {'type': 'x', 'n': 2})
+
+    def test_consumer_unpacks_batch(self):
+        async def run():
+            with mock.patch('quizzes.consumers.get_unread_count', mock.AsyncMock(return_value=0)):
+                communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+                communicator.scope['user'] = User(id=7, username='student')
+                await communicator.connect()
+                await communicator.receive_json_from()
+                await get_channel_layer().group_send('notifications_7', {'type': BATCH_TYPE, 'messages': [
+                    {'type': 'unread_count_update', 'unread_count': n} for n in (1, 2, 3)
+                ]})
+                counts = [(await communicator.receive_json_from())['unread_count'] for _ in range(3)]
+                await communicator.disconnect()
+                return counts
+
+        self.assertEqual(asyncio.run(run()), [1, 2, 3])
+
+
+class HashPipeline:
+    """Копит команды и выполняет их на HashRedis в execute()."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args) for name, args in self.calls]
+
+
+class HashRedis:
+    """Хэши и множества в памяти для буфера времени (quizzes/time_buffer.py)."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.sets = {}
+
+    def pipeline(self, transaction=True):
+        return HashPipeline(self)
+
+    def hincrby(self, key, field, amount):
+        data = self.hashes.setdefault(key, {})
+        data[str(field)] = str(int(data.get(str(field), 0)) + amount)
+        return int(data[str(field)])
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def delete(self, key):
+        return int(self.hashes.pop(key, None) is not None)
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    def srem(self, key, *members):
+        self.sets.get(key, set()).difference_update(members)
+
+    def srandmember(self, key, count):
+        return sorted(self.sets.get(key, ()))[:count]
+
+
+class EgeSaveTimeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student')
+        cls.quiz = Quiz.objects.create(title='Вариант', quiz_type='exam', is_public=True)
+        cls.question = Question.objects.create(quiz=cls.quiz, text='Задача', question_type='code', ege_number=1)
+
+    def setUp(self):
+        self.client.force_login(self.student)
+        self.redis = HashRedis()
+        patcher = mock.patch('quizzes.time_buffer.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _save(self, seconds):
+        return self.client.post(
+            reverse('ege:ege_save_time', args=[self.quiz.id]),
+            json.dumps({'question_id': self.question.id, 'seconds': seconds}),
+            content_type='application/json',
+        ).json()
+
+    def test_total_includes_buffer(self):
+        ExamTaskProgress.objects.create(user=self.student, quiz=self.quiz, question=self.question, time_spent_seconds=100)
+        self.assertEqual(self._save(30), {'ok': True, 'total_seconds': 130, 'pending_seconds': 30})
+        self.assertEqual(self._save(20), {'ok': True, 'total_seconds': 150, 'pending_seconds': 50})
+
+    def test_frozen_after_solve(self):
+        ExamTaskProgress.objects.create(
+            user=self.student, quiz=self.quiz, question=self.question, time_spent_seconds=100, is_solved=True,
+        )
+        self.assertEqual(self._save(30), {'ok': True, 'total_seconds': 100, 'frozen': True})
+        self.assertEqual(self.redis.hashes, {})
+
+
+class TimeBufferFlushTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student')
+        cls.quiz = Quiz.objects.create(title='Вариант', quiz_type='exam', is_public=True)
+        cls.question = Question.objects.create(quiz=cls.quiz, text='Задача', question_type='code', ege_number=1)
+
+    def setUp(self):
+        self.redis = HashRedis()
+        patcher = mock.patch('quizzes.time_buffer.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        time_buffer.add_time(self.student.id, self.quiz.id, self.question.id, 40)
+
+    def assertBuffered(self, seconds):
+        key = time_buffer._key(self.student.id, self.quiz.id)
+        self.assertEqual(time_buffer.get_pending_time(self.student.id, self.quiz.id), {self.question.id: seconds})
+        self.assertEqual(self.redis.sets[time_buffer.DIRTY_SET], {key})
+
+    def test_flush(self):
+        self.assertEqual(time_buffer.flush_time_buffer(), 1)
+        progress = ExamTaskProgress.objects.get(user=self.student, question=self.question)
+        self.assertEqual(progress.time_spent_seconds, 40)
+        self.assertEqual(self.redis.hashes, {})
+        self.assertEqual(self.redis.sets[time_buffer.DIRTY_SET], set())
+
+    def test_failed_write_keeps_buffer(self):
+        with mock.patch('quizzes.time_buffer.add_time_bulk', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                time_buffer.flush_time_buffer()
+        self.assertBuffered(40)
+        self.assertFalse(ExamTaskProgress.objects.exists())
+
+    def test_failed_drain_keeps_keys(self):
+        with mock.patch.object(HashPipeline, 'execute', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                time_buffer.flush_time_buffer()
+        self.assertBuffered(40)
+        self.assertEqual(time_buffer.flush_time_buffer(), 1)
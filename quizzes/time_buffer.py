@@ -0,0 +1,163 @@
+"""
+Буфер времени по задачам ЕГЭ.
+
+Heartbeat'ы таймера (ege_save_time_view) не пишут в PostgreSQL, а копятся
+в Redis: хэш ege_time:<user_id>:<quiz_id> (поле — question_id, значение —
+секунды, HINCRBY). Ключи с данными лежат в множестве ege_time:dirty.
+Периодическая задача flush_exam_time_buffer сливает всё одним bulk upsert'ом.
+
+Читающие страницы добавляют несброшенную дельту через get_pending_time(),
+поэтому отображаемое время точное.
+"""
+from .progress import add_time_bulk
+from .redis_client import get_redis
+
+KEY_PREFIX = 'ege_time'
+DIRTY_SET = f'{KEY_PREFIX}:dirty'
+FLUSH_BATCH = 500
+
+
+def _key(user_id, quiz_id):
+    return f'{KEY_PREFIX}:{user_id}:{quiz_id}'
+
+
+def _parse_key(key):
+    _, user_id, quiz_id = key.split(':')
+    return int(user_id), int(quiz_id)
+
+
+def add_time(user_id, quiz_id, question_id, seconds):
+    """
+    Прибавляет секунды к буферу. Возвращает несброшенную сумму по задаче.
+    Если Redis недоступен — пишет сразу в БД.
+    """
+    key = _key(user_id, quiz_id)
+    try:
+        pipe = get_redis().pipeline()
+        pipe.hincrby(key, question_id, seconds)
+        pipe.sadd(DIRTY_SET, key)
+        pending, _ = pipe.execute()
+        return pending
+    except Exception:
+        add_time_bulk([(user_id, quiz_id, question_id, seconds)])
+        return 0
+
+
+def get_pending_time(user_id, quiz_id):
+    """Несброшенное время: {question_id: seconds}."""
+    try:
+        raw = get_redis().hgetall(_key(user_id, quiz_id))
+    except Exception:
+        return {}
+    return {int(qid): int(secs) for qid, secs in raw.items()}
+
+
+def get_pending_time_for_users(quiz_id, user_ids):
+    """Несброшенное время для нескольких учеников: {(user_id, question_id): seconds}."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for uid in user_ids:
+            pipe.hgetall(_key(uid, quiz_id))
+        replies = pipe.execute()
+    except Exception:
+        return {}
+    pending = {}
+    for uid, raw in zip(user_ids, replies):
+        for qid, secs in raw.items():
+            pending[(uid, int(qid))] = int(secs)
+    return pending
+
+
+def effective_time(progress, pending_seconds):
+    """Время задачи с учётом буфера. После решения время заморожено."""
+    stored = progress.time_spent_seconds if progress else 0
+    if progress and progress.is_solved:
+        return stored
+    return stored + pending_seconds
+
+
+def _drain(keys):
+    """
+    Атомарно забирает и удаляет хэши вместе с их ключами в ege_time:dirty.
+    Возвращает строки для add_time_bulk.
+    """
+    r = get_redis()
+    pipe = r.pipeline()  # MULTI/EXEC: HINCRBY не проскочит между HGETALL и DEL
+    for key in keys:
+        pipe.hgetall(key)
+        pipe.delete(key)
+    pipe.srem(DIRTY_SET, *keys)
+    replies = pipe.execute()
+
+    rows = []
+    for key, raw in zip(keys, replies[:-1:2]):
+        user_id, quiz_id = _parse_key(key)
+        for qid, secs in raw.items():
+            rows.append((user_id, quiz_id, int(qid), int(secs)))
+    return rows
+
+
+def _restore(rows):
+    """Возвращает дельты в буфер, если запись в БД не удалась."""
+    pipe = get_redis().pipeline()
+    for user_id, quiz_id, question_id, seconds in rows:
+        key = _key(user_id, quiz_id)
+        pipe.hincrby(key, question_id, seconds)
+        pipe.sadd(DIRTY_SET, key)
+    pipe.execute()
+
+
+def _flush_keys(keys):
+    rows = _drain(keys)
+    if not rows:
+        return 0
+    try:
+        _write_rows(rows)
+    except Exception:
+        _restore(rows)
+        raise
+    return len(rows)
+
+
+def _write_rows(rows):
+    """Пишет строки, отбрасывая удалённые задачи (иначе FK уронит всю пачку)."""
+    from django.contrib.auth.models import User
+    from .models import Question
+
+    question_quiz = dict(
+        Question.objects.filter(id__in={r[2] for r in rows}).values_list('id', 'quiz_id')
+    )
+    user_ids = set(User.objects.filter(id__in={r[0] for r in rows}).values_list('id', flat=True))
+    add_time_bulk([
+        r for r in rows
+        if r[0] in user_ids and question_quiz.get(r[2]) == r[1]
+    ])
+
+
+def flush_time_buffer():
+    """Сливает весь буфер в БД. Возвращает количество записанных строк."""
+    r = get_redis()
+    flushed = 0
+    while True:
+        # Ключи уходят из множества только в _drain вместе с данными: если
+        # Redis упадёт раньше, следующий слив их увидит; при ошибке записи
+        # в БД _restore вернёт и дельты, и ключи
+        keys = r.srandmember(DIRTY_SET, FLUSH_BATCH)
+        if not keys:
+            break
+        flushed += _flush_keys(keys)
+    return flushed
+
+
+def flush_user_time(user_id, quiz_id):
+    """
+    Сливает буфер одного ученика по варианту. Вызывается перед отметкой
+    задачи решённой, чтобы время до решения не отбросилось условием is_solved.
+    """
+    try:
+        _flush_keys([_key(user_id, quiz_id)])
+    except Exception:
+        pass
@@ -0,0 +1,173 @@
+"""
+Счётчики непрочитанных запросов помощи.
+
+Бейдж в навбаре показывает:
+- учителю — число HelpRequest с has_unread_for_teacher и status != 'resolved'
+  (один общий счётчик help_unread:teachers);
+- ученику — число его HelpRequest с has_unread_for_student
+  (help_unread:student:<id>).
+
+Счётчики лежат в Redis и меняются только на фактическую смену флагов:
+update_help_request() читает строку под SELECT ... FOR UPDATE, пишет новые
+значения и прибавляет разницу с заблокированными через INCRBY. Создание и удаление
+HelpRequest (в т.ч. каскадное и из админки) учитывают сигналы
+(quizzes/signals.py). Отсутствующий ключ заполняется COUNT'ом из БД, а
+периодическая задача reconcile_help_unread_counters сверяет всё с PostgreSQL
+— на случай правок мимо этих путей.
+
+Счётчики кладутся в payload WS-событий, consumer'ы в БД не ходят.
+"""
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import HelpRequest
+from .redis_client import get_redis
+
+KEY_PREFIX = 'help_unread'
+TEACHERS_KEY = f'{KEY_PREFIX}:teachers'
+STATE_FIELDS = ('status', 'has_unread_for_teacher', 'has_unread_for_student')
+
+# INCRBY только для существующего ключа: отсутствующий заполнит COUNT из БД
+_INCR_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+def _student_key(user_id):
+    return f'{KEY_PREFIX}:student:{user_id}'
+
+
+def teacher_unread(status, has_unread_for_teacher):
+    return bool(has_unread_for_teacher) and status != 'resolved'
+
+
+def _db_teacher_count():
+    return HelpRequest.objects.filter(has_unread_for_teacher=True).exclude(status='resolved').count()
+
+
+def _db_student_count(user_id):
+    return HelpRequest.objects.filter(student_id=user_id, has_unread_for_student=True).count()
+
+
+def _get_count(key, db_count):
+    try:
+        r = get_redis()
+        value = r.get(key)
+        if value is not None:
+            return max(0, int(value))
+        count = db_count()
+        r.set(key, count, nx=True)
+        return count
+    except Exception:
+        return db_count()
+
+
+def get_teacher_unread_count():
+    return _get_count(TEACHERS_KEY, _db_teacher_count)
+
+
+def get_student_unread_count(user_id):
+    return _get_count(_student_key(user_id), lambda: _db_student_count(user_id))
+
+
+def get_unread_count(user):
+    """Счётчик для бейджа пользователя (учитель — общий, ученик — свой)."""
+    if user.is_superuser:
+        return get_teacher_unread_count()
+    return get_student_unread_count(user.id)
+
+
+def adjust_counts(student_id, teacher_delta=0, student_delta=0):
+    """Сдвигает счётчики после коммита транзакции (в autocommit — сразу)."""
+    if not teacher_delta and not student_delta:
+        return
+
+    def _apply():
+        try:
+            r = get_redis()
+            if teacher_delta:
+                r.eval(_INCR_IF_EXISTS, 1, TEACHERS_KEY, teacher_delta)
+            if student_delta:
+                r.eval(_INCR_IF_EXISTS, 1, _student_key(student_id), student_delta)
+        except Exception:
+            # Без Redis счётчики читаются из БД, расхождение поправит сверка
+            pass
+
+    transaction.on_commit(_apply)
+
+
+def update_help_request(hr, touch=True, reopen=False, **fields):
+    """
+    Сохраняет status/has_unread_for_* запроса и правит счётчики на
+    фактическую смену флагов. Строка читается под SELECT ... FOR UPDATE,
+    поэтому разница считается от её текущих значений, а не от hr.
+    reopen — перевести решённый запрос в 'open' (решается по заблокированной
+    строке), touch — обновить updated_at.
+    Меняет атрибуты hr на записанные значения и возвращает прежние.
+    """
+    with transaction.atomic():
+        old = HelpRequest.objects.select_for_update().values(*STATE_FIELDS).get(id=hr.id)
+        new = {**old, **fields}
+        if reopen and old['status'] == 'resolved':
+            new['status'] = 'open'
+        values = dict(new)
+        if touch:
+            values['updated_at'] = timezone.now()
+        HelpRequest.objects.filter(id=hr.id).update(**values)
+
+        teacher_delta = (
+            teacher_unread(new['status'], new['has_unread_for_teacher'])
+            - teacher_unread(old['status'], old['has_unread_for_teacher'])
+        )
+        student_delta = int(new['has_unread_for_student']) - int(old['has_unread_for_student'])
+        adjust_counts(hr.student_id, teacher_delta, student_delta)
+
+    for name, value in values.items():
+        setattr(hr, name, value)
+    return old
+
+
+def help_request_created(hr):
+    adjust_counts(
+        hr.student_id,
+        teacher_delta=int(teacher_unread(hr.status, hr.has_unread_for_teacher)),
+        student_delta=int(hr.has_unread_for_student),
+    )
+
+
+def help_request_deleted(hr):
+    adjust_counts(
+        hr.student_id,
+        teacher_delta=-int(teacher_unread(hr.status, hr.has_unread_for_teacher)),
+        student_delta=-int(hr.has_unread_for_student),
+    )
+
+
+def reconcile_counters():
+    """
+    Перезаписывает счётчики значениями из PostgreSQL (два запроса).
+    Возвращает число учеников с непрочитанными.
+    """
+    student_counts = dict(
+        HelpRequest.objects.filter(has_unread_for_student=True)
+        .values('student_id').annotate(n=Count('id')).values_list('student_id', 'n')
+    )
+    teacher_count = _db_teacher_count()
+
+    r = get_redis()
+    stale = [
+        key for key in r.scan_iter(match=_student_key('*'), count=500)
+        if int(key.rsplit(':', 1)[1]) not in student_counts
+    ]
+    pipe = r.pipeline(transaction=False)
+    pipe.set(TEACHERS_KEY, teacher_count)
+    for student_id, count in student_counts.items():
+        pipe.set(_student_key(student_id), count)
+    for key in stale:
+        pipe.set(key, 0)
+    pipe.execute()
+    return len(student_counts)
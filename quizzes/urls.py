@@ -8,6 +8,7 @@ from .views import (
     question_file_download_view,
     submit_code_view,
     submission_status_view,
+    submission_statuses_view,
     finish_quiz_view,
     help_request_view,
     help_requests_list_view,
@@ -28,6 +29,7 @@ urlpatterns = [
     # Async code submission API
     path('<int:quiz_id>/question/<int:question_id>/submit/', submit_code_view, name='submit_code'),
     path('submission/<int:submission_id>/status/', submission_status_view, name='submission_status'),
+    path('submissions/status/', submission_statuses_view, name='submission_statuses'),
     path('<int:quiz_id>/finish/', finish_quiz_view, name='finish_quiz'),
 
     # Статистика
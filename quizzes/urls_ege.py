@@ -10,8 +10,12 @@ urlpatterns = [
     path('<int:quiz_id>/finish/', views.ege_finish_view, name='ege_finish'),
     path('<int:quiz_id>/result/', views.ege_result_view, name='ege_result'),
     path('<int:quiz_id>/results/', views.ege_results_view, name='ege_results'),
+    path('<int:quiz_id>/monitor/', views.ege_monitor_view, name='ege_monitor'),
+    path('<int:quiz_id>/monitor/snapshot/', views.ege_monitor_snapshot_view, name='ege_monitor_snapshot'),
+    path('<int:quiz_id>/task-code/<int:question_id>/', views.ege_task_code_view, name='ege_task_code'),
     path('<int:quiz_id>/save-time/', views.ege_save_time_view, name='ege_save_time'),
     path('<int:quiz_id>/task/<int:ege_number>/upload-attachment/', views.ege_upload_attachment_view, name='ege_upload_attachment'),
+    path('attachments/<int:attachment_id>/download/', views.ege_attachment_download_view, name='ege_attachment_download'),
     path('<int:quiz_id>/task/<int:ege_number>/solution/<int:user_id>/', views.ege_solution_detail_view, name='ege_user_solution'),
     path('solutions/<int:answer_id>/like/', views.ege_toggle_like_view, name='ege_toggle_like'),
     path('<int:quiz_id>/results/student/<int:user_id>/', views.ege_student_stats_view, name='ege_student_stats'),
@@ -2,21 +2,34 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
 from django.contrib.auth.models import User
-from django.db.models import Max, Count, Q, Sum
-from django.http import FileResponse, Http404, JsonResponse
+from django.db.models import Max, Count, Sum
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
 from django.conf import settings
 from django.views.decorators.http import require_POST, require_GET
 from django.views.decorators.csrf import csrf_protect
-from .models import Quiz, Choice, UserResult, UserAnswer, TestCase, QuizAssignment, Question, CodeSubmission, HelpRequest, HelpComment, QuestionFile, ExamTaskProgress, SolutionAttachment, SolutionLike
+from .models import Quiz, UserResult, UserAnswer, TestCase, Question, CodeSubmission, HelpRequest, HelpComment, QuestionFile, ExamTaskProgress, SolutionAttachment, SolutionLike
 from accounts.models import StudentGroup
+from accounts.snapshots import schedule_profile_snapshot
+from pages.downloads import serve_file
 import datetime
 import os
 import json
-import mimetypes
 import re
-from urllib.parse import quote
-from .utils import run_code_in_docker
 from .tasks import check_code_task
+from . import time_buffer
+from .progress import record_attempt, mark_solved_bulk
+from .submissions import latest_submissions, best_submissions, create_submissions, enqueue_checks
+from .question_cache import get_quiz_questions
+from .likes import toggle_like
+from .monitor import PUSH_RATE, monitor_snapshot, publish_monitor_event
+from .assignments import get_assignment_map
+from .quiz_list import get_quiz_list
+from .help_inbox import inbox_page
+from .event_stream import publish_event
+from .publisher import publish
+from .submission_version import bump_version, get_version
+from .unread import get_student_unread_count, get_teacher_unread_count, get_unread_count, update_help_request
 
 # Перевод первичных баллов ЕГЭ по информатике в тестовые (2024)
 EGE_SCORE_CONVERSION = {
@@ -43,38 +56,18 @@ def _natural_sort_key(text):
     return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', text)]
 
 
-def _attachment_content_disposition(filename: str) -> str:
-    """
-    Nginx-friendly Content-Disposition:
-    - ASCII fallback in filename=""
-    - RFC 5987 filename*=UTF-8''...
-    Also strips CR/LF to prevent header injection / invalid headers.
-    """
-    safe = (filename or "download").replace("\r", "").replace("\n", "")
-    ascii_fallback = re.sub(r"[^A-Za-z0-9.\-_]", "_", safe) or "download"
-    return f'attachment; filename="{ascii_fallback}"; filename*=UTF-8\'\'{quote(safe)}'
-
-from .tasks import normalize_output
-
-
 def get_effective_quiz_settings(user, quiz):
     """
     Returns a dict with effective start_date, end_date, max_attempts
-    based on user/group assignments.
+    based on user/group assignments (cached map, see quizzes/assignments.py).
     Returns None if no assignment found for this user (unless superuser).
     """
-    # Check for individual assignment first
-    assignment = QuizAssignment.objects.filter(user=user, quiz=quiz).first()
-    
-    # If no individual, check group
-    if not assignment and hasattr(user, 'profile') and user.profile.group:
-        assignment = QuizAssignment.objects.filter(group=user.profile.group, quiz=quiz).first()
-    
-    if assignment:
+    resolved = get_assignment_map(user).get(quiz.id)
+    if resolved:
         return {
-            'start_date': assignment.start_date if assignment.start_date else quiz.start_date,
-            'end_date': assignment.end_date if assignment.end_date else quiz.end_date,
-            'max_attempts': assignment.max_attempts if assignment.max_attempts is not None else quiz.max_attempts
+            'start_date': resolved['start_date'],
+            'end_date': resolved['end_date'],
+            'max_attempts': resolved['max_attempts'],
         }
 
     # If not assigned, but superuser -> show global settings
@@ -93,162 +86,14 @@ def question_file_download_view(request, file_id):
     Download a QuestionFile attachment with a stable filename across browsers/OS.
     """
     qf = get_object_or_404(QuestionFile, id=file_id)
-
-    filename = qf.get_filename()
-    content_type, _ = mimetypes.guess_type(filename)
-
-    response = FileResponse(
-        qf.file.open("rb"),
-        as_attachment=True,
-        content_type=content_type or "application/octet-stream",
-    )
-    response["Content-Disposition"] = _attachment_content_disposition(filename)
-    return response
+    return serve_file(request, qf.file, filename=qf.get_filename())
 
 def quiz_list_view(request):
     if not request.user.is_authenticated:
         return render(request, 'quizzes/quiz_list.html', {'educational_tasks': [], 'assessments': [], 'archived': []})
 
-    user = request.user
-    
-    effective_assignments = {} # quiz_id -> {start, end, max}
-
-    # Get assignments for user (even if superuser, we want to see if they are assigned)
-    filters = Q(user=user)
-    if hasattr(user, 'profile') and user.profile.group:
-        filters |= Q(group=user.profile.group)
-    
-    assignments = QuizAssignment.objects.filter(filters).select_related('quiz')
-    
-    # Deduplicate, prioritizing user assignment over group
-    temp_assignments = {} # quiz_id -> assignment object
-
-    for a in assignments:
-        qid = a.quiz_id
-        if qid not in temp_assignments:
-            temp_assignments[qid] = a
-        else:
-            existing = temp_assignments[qid]
-            if existing.user is None and a.user is not None:
-                temp_assignments[qid] = a
-    
-    if user.is_superuser:
-        quizzes = Quiz.objects.exclude(quiz_type='exam')
-    else:
-        quizzes = []
-        for qid, a in temp_assignments.items():
-            if a.quiz.quiz_type != 'exam':
-                quizzes.append(a.quiz)
-
-    # Process effective settings
-    for quiz in quizzes:
-        a = temp_assignments.get(quiz.id)
-        if a:
-            effective_assignments[quiz.id] = {
-                'start_date': a.start_date if a.start_date else quiz.start_date,
-                'end_date': a.end_date if a.end_date else quiz.end_date,
-                'max_attempts': a.max_attempts if a.max_attempts is not None else quiz.max_attempts
-            }
-        else:
-            # Fallback for superuser viewing unassigned quizzes
-            effective_assignments[quiz.id] = {
-                'start_date': quiz.start_date,
-                'end_date': quiz.end_date,
-                'max_attempts': quiz.max_attempts
-            }
-
-    # Pre-load attempts and best scores
-    user_results = {}
-    if request.user.is_authenticated:
-        stats = UserResult.objects.filter(user=request.user).values('quiz_id').annotate(
-            count=Count('id'),
-            best_score=Max('score')
-        )
-        user_results = {item['quiz_id']: item for item in stats}
-    
-    # Pre-load question counts
-    all_quiz_ids = [q.id for q in quizzes]
-    question_counts = {}
-    if all_quiz_ids:
-        q_counts = Question.objects.filter(quiz_id__in=all_quiz_ids).values('quiz_id').annotate(count=Count('id'))
-        question_counts = {item['quiz_id']: item['count'] for item in q_counts}
-
-    educational_tasks = []
-    assessments = []
-    archived = []
-
-    now = timezone.now()
-
-    for quiz in quizzes:
-        settings = effective_assignments.get(quiz.id)
-        if not settings:
-            continue
-
-        start_date = settings['start_date']
-        end_date = settings['end_date']
-        max_attempts = settings['max_attempts']
-
-        stats = user_results.get(quiz.id, {})
-        attempts_count = stats.get('count', 0)
-        best_score = stats.get('best_score')
-        total_questions = question_counts.get(quiz.id, 0)
-
-        is_blocked = False
-        remaining_attempts = None
-        status_text = "(Открыто)"
-        status_color = "green"
-
-        if start_date and now < start_date:
-            is_blocked = True
-            status_text = "(Недоступно)"
-            status_color = "#e6b800" # Dark yellow/gold
-
-        elif end_date and now > end_date:
-            is_blocked = True
-            status_text = "(Завершился)"
-            status_color = "red"
-
-        if max_attempts > 0:
-            remaining_attempts = max_attempts - attempts_count
-            if remaining_attempts <= 0:
-                is_blocked = True
-                remaining_attempts = 0
-                # If it was open by date, but blocked by attempts -> show attempts exhausted
-                if status_text == "(Открыто)":
-                    status_text = "(Попытки исчерпаны)"
-                    status_color = "red"
-
-        item_data = {
-            'quiz': quiz,
-            'attempts_count': attempts_count,
-            'best_score': best_score,
-            'total_questions': total_questions,
-            'is_blocked': is_blocked,
-            'remaining_attempts': remaining_attempts,
-            'status_text': status_text,
-            'status_color': status_color,
-            'start_date': start_date,
-            'end_date': end_date,
-            'max_attempts': max_attempts
-        }
-
-        # Expired quizzes go to archive instead of main lists
-        if end_date and now > end_date:
-            archived.append(item_data)
-        elif max_attempts == 0:
-            educational_tasks.append(item_data)
-        else:
-            assessments.append(item_data)
-
-    # Sort archive: most recently expired first
-    archived.sort(key=lambda x: x['end_date'], reverse=True)
-
-    context = {
-        'educational_tasks': educational_tasks,
-        'assessments': assessments,
-        'archived': archived,
-    }
-    return render(request, 'quizzes/quiz_list.html', context)
+    # Корзины строятся в quizzes/quiz_list.py и кэшируются по пользователю
+    return render(request, 'quizzes/quiz_list.html', get_quiz_list(request.user))
 
 def get_user_ege_stats(user, quiz_ids):
     """Агрегация результатов пользователя по вариантам ЕГЭ (один запрос)."""
@@ -284,6 +129,7 @@ def build_ege_results_matrix(quiz):
     users_map = {}  # user_id -> User object
     # {(user_id, question_id): answer_id} — лучший ответ (correct > latest)
     best_answer_map = {}
+    like_counts = {}  # answer_id -> like_count (денормализованный счётчик)
 
     for ans in all_answers:
         uid = ans.user_result.user_id
@@ -293,6 +139,7 @@ def build_ege_results_matrix(quiz):
         prev_solved = user_best[uid].get(qid) is True
         if not prev_solved:
             user_best[uid][qid] = ans.is_correct
+        like_counts[ans.id] = ans.like_count
         key = (uid, qid)
         if key not in best_answer_map:
             best_answer_map[key] = ans.id
@@ -326,7 +173,7 @@ def build_ege_results_matrix(quiz):
     # Сортировка: по баллам desc, затем по фамилии
     matrix.sort(key=lambda r: (-r['score'], r['full_name']))
 
-    return matrix, questions, best_answer_map
+    return matrix, questions, best_answer_map, like_counts
 
 
 def ege_list_view(request):
@@ -387,26 +234,28 @@ def ege_detail_view(request, quiz_id):
     questions = list(quiz.questions.all().order_by('ege_number', 'id'))
 
     # Загрузка прогресса
-    progress_qs = ExamTaskProgress.objects.filter(user=request.user, quiz=quiz)
+    progress_qs = ExamTaskProgress.objects.filter(
+        user=request.user, quiz=quiz,
+    ).defer('best_cpu_code', 'best_memory_code')
     progress_map = {p.question_id: p for p in progress_qs}
+    pending_time = time_buffer.get_pending_time(request.user.id, quiz.id)
 
-    # Последние CodeSubmission для code-задач (для тренировки — показать статус)
+    # Последние CodeSubmission для code-задач (для тренировки — показать статус).
+    # Один DISTINCT ON-запрос; сам код не отдаём — он подгружается по задаче
+    # через ege_task_code_view.
     code_questions = [q for q in questions if q.question_type == 'code']
     last_submissions = {}
-    if code_questions:
-        for q in code_questions:
-            sub = CodeSubmission.objects.filter(
-                user=request.user, quiz=quiz, question=q
-            ).order_by('-created_at').first()
-            if sub:
-                last_submissions[q.id] = {
-                    'id': sub.id,
-                    'status': sub.status,
-                    'is_correct': sub.is_correct,
-                    'code': sub.code,
-                    'cpu_time_ms': sub.cpu_time_ms,
-                    'memory_kb': sub.memory_kb,
-                }
+    latest = latest_submissions(
+        request.user, quiz, [q.id for q in code_questions],
+    )
+    for qid, sub in latest.items():
+        last_submissions[qid] = {
+            'id': sub.id,
+            'status': sub.status,
+            'is_correct': sub.is_correct,
+            'cpu_time_ms': sub.cpu_time_ms,
+            'memory_kb': sub.memory_kb,
+        }
 
     # Последние текстовые ответы из UserAnswer (для нерешённых text-задач)
     text_questions = [q for q in questions if q.question_type == 'text']
@@ -444,16 +293,17 @@ def ege_detail_view(request, quiz_id):
             'points': q.points,
             'is_solved': prog.is_solved if prog else False,
             'attempts': prog.attempts_to_solve if prog else 0,
-            'time_spent': prog.time_spent_seconds if prog else 0,
+            'time_spent': time_buffer.effective_time(prog, pending_time.get(q.id, 0)),
             'saved_answer': saved_answer,
             'saved_answer_wrong': saved_answer_wrong,
         }
         # Лучшие метрики для code-задач
+        # Код лучших попыток подгружается лениво (ege_task_code_view)
         if q.question_type == 'code' and prog:
             task_data['best_cpu_time_ms'] = prog.best_cpu_time_ms
             task_data['best_memory_kb'] = prog.best_memory_kb
-            task_data['best_cpu_code'] = prog.best_cpu_code or ''
-            task_data['best_memory_code'] = prog.best_memory_code or ''
+            task_data['has_best_cpu_code'] = prog.best_cpu_time_ms is not None
+            task_data['has_best_memory_code'] = prog.best_memory_kb is not None
         tasks_data.append(task_data)
 
     # Сохраняем время начала в session
@@ -471,6 +321,32 @@ def ege_detail_view(request, quiz_id):
     return render(request, 'quizzes/ege_detail.html', context)
 
 
+@login_required
+@require_GET
+def ege_task_code_view(request, quiz_id, question_id):
+    """
+    Код задачи для редактора: последняя отправка и лучшие попытки ученика.
+    Вызывается с ege_detail при первом открытии code-задачи.
+    """
+    question = get_object_or_404(
+        Question, id=question_id, quiz_id=quiz_id,
+        quiz__quiz_type='exam', question_type='code',
+    )
+    last_code = CodeSubmission.objects.filter(
+        user=request.user, quiz_id=quiz_id, question=question,
+    ).order_by('-created_at').values_list('code', flat=True).first()
+    best = ExamTaskProgress.objects.filter(
+        user=request.user, quiz_id=quiz_id, question=question,
+    ).values('best_cpu_code', 'best_memory_code').first() or {}
+
+    return JsonResponse({
+        'question_id': question.id,
+        'last_code': last_code or '',
+        'best_cpu_code': best.get('best_cpu_code') or '',
+        'best_memory_code': best.get('best_memory_code') or '',
+    })
+
+
 @login_required
 @require_POST
 def ege_check_answer_view(request, quiz_id):
@@ -496,25 +372,21 @@ def ege_check_answer_view(request, quiz_id):
         return JsonResponse({'error': 'Тип задачи не поддерживает синхронную проверку'}, status=400)
 
     is_correct = question.check_text_answer(answer)
+    if is_correct:
+        # Время до решения должно попасть в прогресс до заморозки
+        time_buffer.flush_user_time(request.user.id, quiz.id)
 
-    # Обновляем ExamTaskProgress
-    progress, _ = ExamTaskProgress.objects.get_or_create(
-        user=request.user, quiz=quiz, question=question,
-    )
-    progress.attempts_to_solve += 1
-    fields_to_update = ['attempts_to_solve']
-
-    if is_correct and not progress.is_solved:
-        progress.is_solved = True
-        progress.first_solved_at = timezone.now()
-        fields_to_update += ['is_solved', 'first_solved_at']
-
-    progress.save(update_fields=fields_to_update)
+    # Обновляем ExamTaskProgress одним upsert'ом
+    attempts, is_solved = record_attempt(request.user.id, quiz.id, question.id, is_correct)
+    schedule_profile_snapshot(request.user.id)
+    publish_monitor_event(quiz.id, request.user, [
+        {'question_id': question.id, 'attempts': attempts, 'is_solved': is_solved},
+    ])
 
     return JsonResponse({
         'is_correct': is_correct,
-        'attempts': progress.attempts_to_solve,
-        'is_solved': progress.is_solved,
+        'attempts': attempts,
+        'is_solved': is_solved,
     })
 
 
@@ -556,6 +428,17 @@ def ege_finish_view(request, quiz_id):
     total_score = 0
     user_answers_to_create = []
 
+    # Последние CodeSubmission по всем code-задачам — одним запросом
+    code_question_ids = [q.id for q in questions if q.question_type == 'code']
+    latest_subs = latest_submissions(request.user, quiz, code_question_ids)
+
+    # Код написан, но "Проверить" не нажималась — создаём submissions пачкой
+    new_subs = create_submissions(request.user, quiz, {
+        qid: answers_data[str(qid)]
+        for qid in code_question_ids
+        if qid not in latest_subs and answers_data.get(str(qid))
+    })
+
     for question in questions:
         user_input = answers_data.get(str(question.id), '')
         is_correct = False
@@ -572,10 +455,7 @@ def ege_finish_view(request, quiz_id):
                     total_score += question.points
 
         elif question.question_type == 'code':
-            # Берём последний completed CodeSubmission
-            latest_sub = CodeSubmission.objects.filter(
-                user=request.user, quiz=quiz, question=question,
-            ).order_by('-created_at').first()
+            latest_sub = latest_subs.get(question.id)
 
             if latest_sub:
                 code_answer = latest_sub.code
@@ -585,26 +465,10 @@ def ege_finish_view(request, quiz_id):
                     error_log = latest_sub.error_log
                     if is_correct:
                         total_score += question.points
-                elif latest_sub.status in ('pending', 'running'):
-                    # Ещё проверяется — Celery обновит позже
-                    code_answer = latest_sub.code
-            elif user_input:
-                # Код написан, но "Проверить" не нажималась — создаём submission
-                new_sub = CodeSubmission.objects.create(
-                    user=request.user, quiz=quiz, question=question,
-                    code=user_input, status='pending',
-                )
-                try:
-                    task = check_code_task.delay(new_sub.id)
-                    new_sub.celery_task_id = task.id
-                    new_sub.save(update_fields=['celery_task_id'])
-                except Exception:
-                    new_sub.status = 'error'
-                    new_sub.error_log = 'Сервер проверки временно недоступен'
-                    new_sub.completed_at = timezone.now()
-                    new_sub.save(update_fields=['status', 'error_log', 'completed_at'])
+                # pending/running — ещё проверяется, Celery обновит позже
+            elif question.id in new_subs:
                 code_answer = user_input
-                submission = new_sub
+                submission = new_subs[question.id]
 
         user_answers_to_create.append(UserAnswer(
             user_result=user_result,
@@ -618,19 +482,25 @@ def ege_finish_view(request, quiz_id):
 
     UserAnswer.objects.bulk_create(user_answers_to_create)
 
+    # В очередь — после создания UserAnswer, чтобы Celery нашёл ответ по submission
+    enqueue_checks(new_subs.values())
+
     user_result.score = total_score
     user_result.save(update_fields=['score'])
+    schedule_profile_snapshot(request.user.id)
 
     # Обновляем ExamTaskProgress для всех верно решённых задач
-    for ua in user_answers_to_create:
-        if ua.is_correct:
-            progress, _ = ExamTaskProgress.objects.get_or_create(
-                user=request.user, quiz=quiz, question=ua.question,
-            )
-            if not progress.is_solved:
-                progress.is_solved = True
-                progress.first_solved_at = timezone.now()
-                progress.save(update_fields=['is_solved', 'first_solved_at'])
+    time_buffer.flush_user_time(request.user.id, quiz.id)
+    mark_solved_bulk(
+        request.user.id, quiz.id,
+        [ua.question_id for ua in user_answers_to_create if ua.is_correct],
+    )
+    publish_monitor_event(
+        quiz.id, request.user,
+        [{'question_id': ua.question_id, 'is_solved': True} for ua in user_answers_to_create if ua.is_correct]
+        + [{'question_id': qid, 'status': 'pending'} for qid in new_subs],
+        score=total_score, finished=True,
+    )
 
     # Pending code submissions count
     pending_checks = sum(
@@ -694,22 +564,13 @@ def ege_result_view(request, quiz_id):
 def ege_results_view(request, quiz_id):
     """Сводная таблица результатов варианта ЕГЭ."""
     quiz = get_object_or_404(Quiz, id=quiz_id, quiz_type='exam', is_public=True)
-    results_matrix, questions, best_answer_map = build_ege_results_matrix(quiz)
+    results_matrix, questions, best_answer_map, like_counts = build_ege_results_matrix(quiz)
     total_points = sum(q.points for q in questions)
 
     # --- Sort data для клиентской сортировки ---
     question_types = {q.ege_number: q.question_type for q in questions}
     question_id_map = {q.id: q.ege_number for q in questions}
 
-    # Лайки по best_answer_id
-    all_answer_ids = list(best_answer_map.values())
-    like_counts = {}
-    if all_answer_ids:
-        like_qs = SolutionLike.objects.filter(
-            answer_id__in=all_answer_ids,
-        ).values('answer_id').annotate(cnt=Count('id'))
-        like_counts = {row['answer_id']: row['cnt'] for row in like_qs}
-
     # CPU/memory из CodeSubmission
     code_answer_ids = [
         aid for (uid, qid), aid in best_answer_map.items()
@@ -729,9 +590,16 @@ def ege_results_view(request, quiz_id):
     if user_ids:
         progress_qs = ExamTaskProgress.objects.filter(
             quiz=quiz, user_id__in=user_ids,
-        ).values_list('user_id', 'question_id', 'time_spent_seconds')
-        for uid, qid, secs in progress_qs:
+        ).values_list('user_id', 'question_id', 'time_spent_seconds', 'is_solved')
+        solved_keys = set()
+        for uid, qid, secs, is_solved in progress_qs:
             time_map[(uid, qid)] = secs
+            if is_solved:
+                solved_keys.add((uid, qid))
+        # Несброшенное время из буфера (после решения время заморожено)
+        for key, secs in time_buffer.get_pending_time_for_users(quiz.id, user_ids).items():
+            if key not in solved_keys:
+                time_map[key] = time_map.get(key, 0) + secs
 
     # Суммарное время по каждому пользователю
     user_total_time = {}
@@ -771,17 +639,19 @@ def ege_results_view(request, quiz_id):
             user=request.user, quiz=quiz,
         ).select_related('question')
         progress_map = {p.question_id: p for p in progress_qs}
+        pending_time = time_buffer.get_pending_time(request.user.id, quiz.id)
 
-        if progress_map:
+        if progress_map or pending_time:
             personal_stats = []
             for q in questions:
                 p = progress_map.get(q.id)
                 ege_num = q.ege_number or 0
                 rec_min = EGE_RECOMMENDED_TIME.get(ege_num, 5)
+                time_spent = time_buffer.effective_time(p, pending_time.get(q.id, 0))
 
-                if p and p.time_spent_seconds > 0:
-                    mins = p.time_spent_seconds // 60
-                    secs = p.time_spent_seconds % 60
+                if time_spent > 0:
+                    mins = time_spent // 60
+                    secs = time_spent % 60
                     time_mm_ss = f"{mins}:{secs:02d}"
                     if mins <= rec_min:
                         color = 'green'
@@ -815,6 +685,31 @@ def ege_results_view(request, quiz_id):
     })
 
 
+MONITOR_POLL_INTERVAL = 5  # сек, опрос снимка без WebSocket
+
+
+@user_passes_test(lambda u: u.is_superuser)
+def ege_monitor_view(request, quiz_id):
+    """
+    Живой монитор класса по варианту: таблица ученик × задача обновляется
+    по WebSocket (топик monitor:<quiz_id>, quizzes/monitor.py).
+    """
+    quiz = get_object_or_404(Quiz, id=quiz_id, quiz_type='exam', is_public=True)
+    return render(request, 'quizzes/ege_monitor.html', {
+        'quiz': quiz,
+        'push_rate': PUSH_RATE,
+        'poll_interval': MONITOR_POLL_INTERVAL,
+    })
+
+
+@user_passes_test(lambda u: u.is_superuser)
+@require_GET
+def ege_monitor_snapshot_view(request, quiz_id):
+    """Состояние монитора одним JSON — опрос, когда WebSocket недоступен."""
+    quiz = get_object_or_404(Quiz, id=quiz_id, quiz_type='exam', is_public=True)
+    return JsonResponse({'type': 'monitor_snapshot', **monitor_snapshot(quiz.id)})
+
+
 @login_required
 def ege_student_stats_view(request, quiz_id, user_id):
     """Статистика конкретного ученика по варианту ЕГЭ (только для суперпользователя)."""
@@ -829,16 +724,18 @@ def ege_student_stats_view(request, quiz_id, user_id):
 
     progress_qs = ExamTaskProgress.objects.filter(user=student, quiz=quiz).select_related('question')
     progress_map = {p.question_id: p for p in progress_qs}
+    pending_time = time_buffer.get_pending_time(student.id, quiz.id)
 
     stats = []
     for q in questions:
         p = progress_map.get(q.id)
         ege_num = q.ege_number or 0
         rec_min = EGE_RECOMMENDED_TIME.get(ege_num, 5)
+        time_spent = time_buffer.effective_time(p, pending_time.get(q.id, 0))
 
-        if p and p.time_spent_seconds > 0:
-            mins = p.time_spent_seconds // 60
-            secs = p.time_spent_seconds % 60
+        if time_spent > 0:
+            mins = time_spent // 60
+            secs = time_spent % 60
             time_mm_ss = f"{mins}:{secs:02d}"
             if mins <= rec_min:
                 color = 'green'
@@ -896,18 +793,23 @@ def ege_save_time_view(request, quiz_id):
 
     question = get_object_or_404(Question, id=question_id, quiz=quiz)
 
-    progress, _ = ExamTaskProgress.objects.get_or_create(
+    # Только чтение: строку ExamTaskProgress создаёт слив буфера
+    progress = ExamTaskProgress.objects.filter(
         user=request.user, quiz=quiz, question=question,
-    )
+    ).only('time_spent_seconds', 'is_solved').first()
 
     # Не считаем время после первого верного решения
-    if progress.is_solved:
+    if progress and progress.is_solved:
         return JsonResponse({'ok': True, 'total_seconds': progress.time_spent_seconds, 'frozen': True})
 
-    progress.time_spent_seconds += seconds
-    progress.save(update_fields=['time_spent_seconds'])
+    # Копим в Redis, в ExamTaskProgress сливает flush_exam_time_buffer.
+    pending = time_buffer.add_time(request.user.id, quiz.id, question.id, seconds)
 
-    return JsonResponse({'ok': True, 'total_seconds': progress.time_spent_seconds})
+    return JsonResponse({
+        'ok': True,
+        'total_seconds': time_buffer.effective_time(progress, pending),
+        'pending_seconds': pending,
+    })
 
 
 @login_required
@@ -965,6 +867,24 @@ def ege_upload_attachment_view(request, quiz_id, ege_number):
     return redirect('ege:ege_user_solution', quiz_id=quiz.id, ege_number=ege_number, user_id=request.user.id)
 
 
+@login_required
+@require_GET
+def ege_attachment_download_view(request, attachment_id):
+    """Скачивание файла из материалов к решению. Доступ — как к странице решения."""
+    attachment = get_object_or_404(SolutionAttachment, id=attachment_id)
+    can_view = (
+        attachment.user_id == request.user.id
+        or request.user.is_superuser
+        or ExamTaskProgress.objects.filter(
+            user=request.user, quiz_id=attachment.quiz_id,
+            question_id=attachment.question_id, is_solved=True,
+        ).exists()
+    )
+    if not can_view:
+        raise Http404('Файл не найден')
+    return serve_file(request, attachment.file, filename=attachment.get_filename())
+
+
 @login_required
 @require_POST
 def ege_toggle_like_view(request, answer_id):
@@ -977,15 +897,11 @@ def ege_toggle_like_view(request, answer_id):
     if answer.user_result.user == request.user:
         return JsonResponse({'error': 'Нельзя лайкать своё решение'}, status=403)
 
-    existing = SolutionLike.objects.filter(user=request.user, answer=answer)
-    if existing.exists():
-        existing.delete()
-        liked = False
-    else:
-        SolutionLike.objects.create(user=request.user, answer=answer)
-        liked = True
+    # Один запрос: переключение лайка + счётчик UserAnswer.like_count
+    liked, like_count = toggle_like(request.user.id, answer.id)
+    schedule_profile_snapshot(answer.user_result.user_id)
 
-    return JsonResponse({'liked': liked, 'like_count': answer.likes.count()})
+    return JsonResponse({'liked': liked, 'like_count': like_count})
 
 
 @login_required
@@ -1052,9 +968,9 @@ def ege_solution_detail_view(request, quiz_id, ege_number, user_id):
     except SolutionAttachment.DoesNotExist:
         pass
 
-    # Лайки
-    like_count = best.likes.count()
-    user_liked = best.likes.filter(user=request.user).exists()
+    # Лайки: счётчик денормализован в UserAnswer.like_count
+    like_count = best.like_count
+    user_liked = SolutionLike.objects.filter(answer=best, user=request.user).exists()
 
     is_own = (user_id == request.user.id)
 
@@ -1081,16 +997,7 @@ def ege_solution_detail_view(request, quiz_id, ege_number, user_id):
 
 @login_required
 def quiz_detail_view(request, quiz_id):
-    # Оптимизация: предзагружаем связанные объекты
-    quiz = get_object_or_404(
-        Quiz.objects.prefetch_related(
-            'questions__choices',
-            'questions__test_cases',
-            'questions__images',
-            'questions__files'
-        ),
-        id=quiz_id
-    )
+    quiz = get_object_or_404(Quiz, id=quiz_id)
     
     # Check assignment/availability
     eff_settings = get_effective_quiz_settings(request.user, quiz)
@@ -1118,9 +1025,13 @@ def quiz_detail_view(request, quiz_id):
         attempts_count = UserResult.objects.filter(user=request.user, quiz=quiz).count()
         if attempts_count >= max_attempts: return redirect('quizzes:quiz_list')
 
+    # Граф вопросов (choices/test_cases/images/files) — один раз, из кэша версии теста.
+    # Дальше все выборки делаются в Python, без повторных запросов.
+    questions = get_quiz_questions(quiz)
+
     # Read-only mode: show all questions with student's best answers
     if read_only:
-        all_questions = list(quiz.questions.all())
+        all_questions = list(questions)
         all_questions.sort(key=lambda q: _natural_sort_key(q.get_title()))
 
         # Load student's best answer per question (correct preferred, then most recent)
@@ -1160,18 +1071,17 @@ def quiz_detail_view(request, quiz_id):
     # --- Active quiz mode (not read-only) ---
 
     # Находим уже решенные вопросы
-    correctly_answered_question_ids = UserAnswer.objects.filter(
+    correctly_answered_question_ids = set(UserAnswer.objects.filter(
         user_result__user=request.user,
         user_result__quiz=quiz,
         is_correct=True
-    ).values_list('question_id', flat=True).distinct()
+    ).values_list('question_id', flat=True).distinct())
 
     # Считаем, сколько баллов уже "в кармане"
     already_earned_score = len(correctly_answered_question_ids)
 
-    # Исключаем решенные из списка для показа
-    # Вопросы уже предзагружены через prefetch_related
-    questions_to_show = list(quiz.questions.exclude(id__in=correctly_answered_question_ids))
+    # Исключаем решенные из списка для показа (фильтр в Python — prefetch сохраняется)
+    questions_to_show = [q for q in questions if q.id not in correctly_answered_question_ids]
 
     # Восстанавливаем код из последней неудачной попытки для задач с кодом
     last_failed_attempt = UserResult.objects.filter(
@@ -1211,6 +1121,14 @@ def quiz_detail_view(request, quiz_id):
             if question.question_type == 'choice':
                 all_choices[question.id] = {choice.id: choice for choice in question.choices.all()}
 
+        # Код не проверяем внутри запроса: создаём CodeSubmission пачкой,
+        # проверка идёт тем же Celery-пайплайном, что и в finish_quiz_view
+        new_subs = create_submissions(request.user, quiz, {
+            question.id: request.POST.get(f'question_{question.id}')
+            for question in questions_to_show
+            if question.question_type == 'code' and request.POST.get(f'question_{question.id}')
+        })
+
         # Создаем список UserAnswer для bulk_create
         user_answers_to_create = []
 
@@ -1221,6 +1139,7 @@ def quiz_detail_view(request, quiz_id):
             text_answer = None
             code_answer = None
             error_log = None
+            submission = None
 
             # TODO: Refactor into separate function to avoid massive duplication if needed, but keeping inline for now
             if question.question_type == 'choice':
@@ -1240,44 +1159,9 @@ def quiz_detail_view(request, quiz_id):
                         current_attempt_score += 1
 
             elif question.question_type == 'code':
+                # Проверка — в Celery; балл досчитает update_user_answer_from_submission
                 code_answer = user_input
-                if user_input:
-                    all_tests_passed = True
-                    # test_cases уже предзагружены через prefetch_related
-                    test_cases = list(question.test_cases.all())
-
-                    if not test_cases:
-                        all_tests_passed = False
-                        error_log = "Нет тестовых примеров для проверки."
-
-                    extra_files = {}
-                    for qf in question.files.all():
-                        try:
-                            with qf.file.open('rb') as f:
-                                extra_files[os.path.basename(qf.file.name)] = f.read()
-                        except Exception as e:
-                            error_log = f"Ошибка чтения файла задания: {e}"
-                            all_tests_passed = False
-                            break
-
-                    if all_tests_passed:
-                        for test_case in test_cases:
-                            output, error, _, _ = run_code_in_docker(user_input, test_case.input_data, extra_files)
-
-                            if error:
-                                all_tests_passed = False
-                                error_log = error
-                                break
-
-                            if normalize_output(output) != normalize_output(test_case.output_data):
-                                all_tests_passed = False
-                                # Скрываем правильный ответ от пользователя
-                                error_log = f"Неверный ответ на тесте.\nВходные данные: {test_case.input_data}\nВаш ответ: {output}"
-                                break
-
-                    if all_tests_passed:
-                        is_correct = True
-                        current_attempt_score += 1
+                submission = new_subs.get(question.id)
 
             user_answers_to_create.append(
                 UserAnswer(
@@ -1287,33 +1171,46 @@ def quiz_detail_view(request, quiz_id):
                     text_answer=text_answer,
                     code_answer=code_answer,
                     error_log=error_log,
-                    is_correct=is_correct
+                    is_correct=is_correct,
+                    submission=submission,
                 )
             )
 
         # Оптимизация: создаем все ответы одним запросом
         UserAnswer.objects.bulk_create(user_answers_to_create)
 
+        # Проверку кода ставим в очередь после создания ответов — иначе
+        # Celery не найдёт UserAnswer для пересчёта балла
+        enqueue_checks(new_subs.values())
+
         # Финальный балл = (баллы за эту попытку) + (баллы за старые решенные вопросы)
         total_score = current_attempt_score + already_earned_score
 
         user_result.score = total_score
         user_result.save()
+        schedule_profile_snapshot(request.user.id)
 
-        # Получаем неудачные ответы для детального отчета
-        failed_answers = UserAnswer.objects.filter(
+        # Получаем неудачные ответы для детального отчета.
+        # Code-ответы на проверке тоже is_correct=False — помечаем их is_pending,
+        # шаблон покажет статус «проверяется» вместо ошибки
+        failed_answers = list(UserAnswer.objects.filter(
             user_result=user_result,
             is_correct=False
-        ).select_related('question').order_by('question_id')
+        ).select_related('question', 'selected_choice', 'submission').order_by('question_id'))
+        for answer in failed_answers:
+            answer.is_pending = bool(
+                answer.submission and answer.submission.status in ('pending', 'running')
+            )
+        pending_checks = sum(1 for answer in failed_answers if answer.is_pending)
 
-        # Используем предзагруженные вопросы вместо запроса к БД
-        total_questions = quiz.questions.count() if hasattr(quiz.questions, 'count') else len(list(quiz.questions.all()))
+        total_questions = len(questions)
 
         return render(request, 'quizzes/quiz_result.html', {
             'quiz': quiz,
             'score': total_score,
             'total': total_questions,  # Общее кол-во вопросов в тесте
             'failed_answers': failed_answers,  # Неудачные ответы для детального отчета
+            'pending_checks': pending_checks,  # Code-ответы, ещё не проверенные Celery
             'user_result': user_result,
         })
 
@@ -1322,7 +1219,7 @@ def quiz_detail_view(request, quiz_id):
     last_attempt_codes_json = json.dumps({str(k): v for k, v in last_attempt_codes.items()})
 
     # Все вопросы теста, отсортированные натурально по заголовку
-    all_questions = list(quiz.questions.all())
+    all_questions = list(questions)
     all_questions.sort(key=lambda q: _natural_sort_key(q.get_title()))
 
     # Данные о решённых вопросах (для просмотра удачного решения)
@@ -1340,38 +1237,31 @@ def quiz_detail_view(request, quiz_id):
 
     # Аннотируем вопросы статусом решённости для единого цикла в шаблоне
     for q in all_questions:
-        q.is_solved = q.id in set(correctly_answered_question_ids)
+        q.is_solved = q.id in correctly_answered_question_ids
         q.solved_answer = solved_answers.get(q.id)
 
-    # Последние CodeSubmission для code-задач
-    code_questions = [q for q in all_questions if q.question_type == 'code']
+    # Последние CodeSubmission и лучшие метрики для code-задач —
+    # по одному DISTINCT ON-запросу на всё, а не на каждый вопрос
+    code_question_ids = [q.id for q in all_questions if q.question_type == 'code']
     last_submissions = {}
-    # Лучшие метрики для code-задач (из всех successful submissions)
+    for qid, sub in latest_submissions(request.user, quiz, code_question_ids).items():
+        last_submissions[qid] = {
+            'id': sub.id,
+            'status': sub.status,
+            'is_correct': sub.is_correct,
+            'code': sub.code,
+            'cpu_time_ms': sub.cpu_time_ms,
+            'memory_kb': sub.memory_kb,
+        }
+    # Лучшие метрики из всех правильных submissions
     best_metrics = {}  # question_id -> {best_cpu_time_ms, best_cpu_code, best_memory_kb, best_memory_code}
-    for q in code_questions:
-        sub = CodeSubmission.objects.filter(
-            user=request.user, quiz=quiz, question=q
-        ).order_by('-created_at').first()
-        if sub:
-            last_submissions[q.id] = {
-                'id': sub.id,
-                'status': sub.status,
-                'is_correct': sub.is_correct,
-                'code': sub.code,
-                'cpu_time_ms': sub.cpu_time_ms,
-                'memory_kb': sub.memory_kb,
-            }
-        # Лучшие метрики из всех правильных submissions
-        best_cpu_sub = CodeSubmission.objects.filter(
-            user=request.user, quiz=quiz, question=q,
-            is_correct=True, cpu_time_ms__isnull=False,
-        ).order_by('cpu_time_ms').first()
-        best_mem_sub = CodeSubmission.objects.filter(
-            user=request.user, quiz=quiz, question=q,
-            is_correct=True, memory_kb__isnull=False,
-        ).order_by('memory_kb').first()
+    best_cpu_subs = best_submissions(request.user, quiz, code_question_ids, 'cpu_time_ms')
+    best_mem_subs = best_submissions(request.user, quiz, code_question_ids, 'memory_kb')
+    for qid in code_question_ids:
+        best_cpu_sub = best_cpu_subs.get(qid)
+        best_mem_sub = best_mem_subs.get(qid)
         if best_cpu_sub or best_mem_sub:
-            best_metrics[q.id] = {
+            best_metrics[qid] = {
                 'best_cpu_time_ms': best_cpu_sub.cpu_time_ms if best_cpu_sub else None,
                 'best_cpu_code': best_cpu_sub.code if best_cpu_sub else '',
                 'best_memory_kb': best_mem_sub.memory_kb if best_mem_sub else None,
@@ -1406,7 +1296,7 @@ def quiz_detail_view(request, quiz_id):
         'quiz': quiz,
         'questions_to_show': questions_to_show,
         'all_questions': all_questions,
-        'correctly_answered_ids': set(correctly_answered_question_ids),
+        'correctly_answered_ids': correctly_answered_question_ids,
         'last_attempt_codes': last_attempt_codes,
         'last_attempt_codes_json': last_attempt_codes_json,
         'end_date': end_date,
@@ -1603,6 +1493,7 @@ def submit_code_view(request, quiz_id, question_id):
         code=code,
         status='pending'
     )
+    bump_version(request.user.id)
 
     # Queue Celery task
     try:
@@ -1613,6 +1504,7 @@ def submit_code_view(request, quiz_id, question_id):
         submission.status = 'error'
         submission.error_log = 'Сервер проверки временно недоступен. Попробуйте через минуту.'
         submission.save(update_fields=['status', 'error_log'])
+        bump_version(request.user.id)
         return JsonResponse({
             'submission_id': submission.id,
             'status': 'error',
@@ -1626,6 +1518,23 @@ def submit_code_view(request, quiz_id, question_id):
     })
 
 
+MAX_STATUS_IDS = 100
+
+
+def _submission_status_data(submission):
+    return {
+        'submission_id': submission.id,
+        'question_id': submission.question_id,
+        'status': submission.status,
+        'is_correct': submission.is_correct,
+        'error_log': submission.error_log,
+        'cpu_time_ms': submission.cpu_time_ms,
+        'memory_kb': submission.memory_kb,
+        'created_at': submission.created_at.isoformat(),
+        'completed_at': submission.completed_at.isoformat() if submission.completed_at else None,
+    }
+
+
 @login_required
 @require_GET
 def submission_status_view(request, submission_id):
@@ -1638,17 +1547,61 @@ def submission_status_view(request, submission_id):
         user=request.user
     )
 
-    return JsonResponse({
-        'submission_id': submission.id,
-        'question_id': submission.question_id,
-        'status': submission.status,
-        'is_correct': submission.is_correct,
-        'error_log': submission.error_log,
-        'cpu_time_ms': submission.cpu_time_ms,
-        'memory_kb': submission.memory_kb,
-        'created_at': submission.created_at.isoformat(),
-        'completed_at': submission.completed_at.isoformat() if submission.completed_at else None,
+    return JsonResponse(_submission_status_data(submission))
+
+
+@login_required
+@require_GET
+def submission_statuses_view(request):
+    """
+    Статусы нескольких отправок одним запросом (polling fallback).
+    ?ids=1,2,3 — указанные отправки пользователя (до MAX_STATUS_IDS);
+    ?quiz=<id> — последняя отправка по каждому вопросу теста.
+
+    ETag строится из версии отправок пользователя (submission_version):
+    пока ни один статус не сменился, If-None-Match даёт 304 без запроса
+    к CodeSubmission.
+    """
+    quiz_id = request.GET.get('quiz', '')
+    raw_ids = request.GET.get('ids', '')
+    try:
+        if quiz_id:
+            quiz_id = int(quiz_id)
+            scope = f'q{quiz_id}'
+        else:
+            ids = sorted({int(i) for i in raw_ids.split(',') if i.strip()})
+            if not ids:
+                return JsonResponse({'error': 'Укажите ids или quiz'}, status=400)
+            if len(ids) > MAX_STATUS_IDS:
+                return JsonResponse({'error': f'Не больше {MAX_STATUS_IDS} отправок за запрос'}, status=400)
+            scope = 'i' + '.'.join(map(str, ids))
+    except ValueError:
+        return JsonResponse({'error': 'Некорректные параметры'}, status=400)
+
+    version = get_version(request.user.id)
+    etag = None
+    if version is not None:
+        # Набор отправок входит в ETag: другие ids — другой ответ
+        etag = f'"{request.user.id}-{version}-{scope}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['Cache-Control'] = 'private, no-cache'
+            return not_modified
+
+    submissions = CodeSubmission.objects.filter(user=request.user)
+    if quiz_id:
+        submissions = submissions.filter(quiz_id=quiz_id).order_by('question_id', '-created_at').distinct('question_id')
+    else:
+        submissions = submissions.filter(id__in=ids)
+
+    response = JsonResponse({
+        'version': version,
+        'submissions': [_submission_status_data(sub) for sub in submissions],
     })
+    if etag:
+        response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @login_required
@@ -1704,8 +1657,10 @@ def finish_quiz_view(request, quiz_id):
 
     already_earned_score = len(correctly_answered_question_ids)
 
-    # Get questions to process (not already solved)
-    questions_to_process = list(quiz.questions.exclude(id__in=correctly_answered_question_ids))
+    # Get questions to process (not already solved), choices prefetched in one query
+    questions_to_process = list(
+        quiz.questions.exclude(id__in=correctly_answered_question_ids).prefetch_related('choices')
+    )
 
     # Calculate duration
     duration = None
@@ -1730,6 +1685,23 @@ def finish_quiz_view(request, quiz_id):
 
     answers_data = data.get('answers', {})
 
+    # Latest submissions for all code questions: one DISTINCT ON query per status group
+    code_question_ids = [q.id for q in questions_to_process if q.question_type == 'code']
+    completed_subs = latest_submissions(
+        request.user, quiz, code_question_ids,
+        statuses=['success', 'failed'], order_field='completed_at',
+    )
+    active_subs = latest_submissions(
+        request.user, quiz, code_question_ids,
+        statuses=['pending', 'running'],
+    )
+    # Never clicked "Проверить" — create all missing submissions in one INSERT
+    new_subs = create_submissions(request.user, quiz, {
+        qid: answers_data[str(qid)]
+        for qid in code_question_ids
+        if qid not in completed_subs and qid not in active_subs and answers_data.get(str(qid))
+    })
+
     # Process each question
     for question in questions_to_process:
         user_input = answers_data.get(str(question.id))
@@ -1742,14 +1714,15 @@ def finish_quiz_view(request, quiz_id):
 
         if question.question_type == 'choice':
             if user_input:
+                # Choices are prefetched — resolve from the in-memory map
+                choices = {choice.id: choice for choice in question.choices.all()}
                 try:
-                    choice = Choice.objects.get(id=int(user_input), question=question)
-                    selected_choice = choice
-                    if choice.is_correct:
-                        is_correct = True
-                        current_attempt_score += 1
-                except (Choice.DoesNotExist, ValueError):
-                    pass
+                    selected_choice = choices.get(int(user_input))
+                except (TypeError, ValueError):
+                    selected_choice = None
+                if selected_choice and selected_choice.is_correct:
+                    is_correct = True
+                    current_attempt_score += 1
 
         elif question.question_type == 'text':
             text_answer = user_input
@@ -1759,13 +1732,8 @@ def finish_quiz_view(request, quiz_id):
                     current_attempt_score += 1
 
         elif question.question_type == 'code':
-            # Get latest completed submission for this question
-            latest_submission = CodeSubmission.objects.filter(
-                user=request.user,
-                quiz=quiz,
-                question=question,
-                status__in=['success', 'failed']
-            ).order_by('-completed_at').first()
+            latest_submission = completed_subs.get(question.id)
+            pending_sub = active_subs.get(question.id)
 
             if latest_submission:
                 code_answer = latest_submission.code
@@ -1774,39 +1742,13 @@ def finish_quiz_view(request, quiz_id):
                 submission = latest_submission
                 if is_correct:
                     current_attempt_score += 1
-            else:
-                # Check for pending/running submission (submitted but still checking)
-                pending_sub = CodeSubmission.objects.filter(
-                    user=request.user,
-                    quiz=quiz,
-                    question=question,
-                    status__in=['pending', 'running']
-                ).order_by('-created_at').first()
-
-                if pending_sub:
-                    # Link pending submission — Celery will update score when done
-                    code_answer = pending_sub.code
-                    submission = pending_sub
-                elif user_input:
-                    # Never clicked "Проверить" — auto-create submission and queue check
-                    new_sub = CodeSubmission.objects.create(
-                        user=request.user,
-                        quiz=quiz,
-                        question=question,
-                        code=user_input,
-                        status='pending'
-                    )
-                    try:
-                        task = check_code_task.delay(new_sub.id)
-                        new_sub.celery_task_id = task.id
-                        new_sub.save(update_fields=['celery_task_id'])
-                    except Exception:
-                        new_sub.status = 'error'
-                        new_sub.error_log = 'Сервер проверки временно недоступен'
-                        new_sub.completed_at = timezone.now()
-                        new_sub.save(update_fields=['status', 'error_log', 'completed_at'])
-                    code_answer = user_input
-                    submission = new_sub
+            elif pending_sub:
+                # Link pending submission — Celery will update score when done
+                code_answer = pending_sub.code
+                submission = pending_sub
+            elif question.id in new_subs:
+                code_answer = user_input
+                submission = new_subs[question.id]
 
         user_answers_to_create.append(
             UserAnswer(
@@ -1824,10 +1766,14 @@ def finish_quiz_view(request, quiz_id):
     # Bulk create answers
     UserAnswer.objects.bulk_create(user_answers_to_create)
 
+    # Queue new checks as one group — after answers exist, so Celery can update them
+    enqueue_checks(new_subs.values())
+
     # Calculate final score
     total_score = current_attempt_score + already_earned_score
     user_result.score = total_score
     user_result.save()
+    schedule_profile_snapshot(request.user.id)
 
     total_questions = quiz.questions.count()
 
@@ -1898,8 +1844,8 @@ def help_request_view(request, quiz_id, question_id):
             comments = hr.comments.select_related('author').all()
             # Отмечаем как прочитанное только при явном открытии диалога
             if hr.has_unread_for_student and request.GET.get('mark_read') == '1':
-                hr.has_unread_for_student = False
-                hr.save(update_fields=['has_unread_for_student'])
+                update_help_request(hr, touch=False, has_unread_for_student=False)
+                _send_help_unread_update(student_id=hr.student_id)
             return JsonResponse({
                 'help_request_id': hr.id,
                 'status': hr.status,
@@ -1935,11 +1881,10 @@ def help_request_view(request, quiz_id, question_id):
         )
 
         # Если запрос был решён — переоткрываем
-        if hr.status == 'resolved':
-            hr.status = 'open'
-
-        hr.has_unread_for_teacher = True
-        hr.save(update_fields=['status', 'has_unread_for_teacher', 'updated_at'])
+        previous = update_help_request(hr, reopen=True, has_unread_for_teacher=True)
+        reopened = previous['status'] == 'resolved'
+        if created or reopened:
+            schedule_profile_snapshot(request.user.id)
 
         # Создаём комментарий
         comment = HelpComment.objects.create(
@@ -1966,27 +1911,17 @@ def help_request_view(request, quiz_id, question_id):
 
 @user_passes_test(lambda u: u.is_superuser)
 def help_requests_list_view(request):
-    """Дашборд учителя: список запросов помощи."""
+    """Дашборд учителя: список запросов помощи (страницами, см. quizzes/help_inbox.py)."""
     status_filter = request.GET.get('status', 'open')
+    cursor = request.GET.get('after')
 
-    qs = HelpRequest.objects.select_related('student', 'question', 'quiz').order_by('-updated_at')
-
-    if status_filter == 'open':
-        qs = qs.filter(status='open')
-    elif status_filter == 'answered':
-        qs = qs.filter(status='answered')
-    elif status_filter == 'resolved':
-        qs = qs.filter(status='resolved')
-    # 'all' — без фильтра
-
-    # Добавляем последний комментарий для превью
-    help_requests = list(qs)
-    for hr in help_requests:
-        hr.last_comment = hr.comments.select_related('author').last()
+    help_requests, next_cursor = inbox_page(status_filter, cursor)
 
     return render(request, 'quizzes/help_requests_list.html', {
         'help_requests': help_requests,
         'status_filter': status_filter,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
     })
 
 
@@ -2001,8 +1936,8 @@ def help_request_review_view(request, help_request_id):
 
     # Отмечаем как прочитанное для учителя
     if hr.has_unread_for_teacher:
-        hr.has_unread_for_teacher = False
-        hr.save(update_fields=['has_unread_for_teacher'])
+        update_help_request(hr, touch=False, has_unread_for_teacher=False)
+        _send_help_unread_update(teachers=True)
 
     # Получаем код: из последнего снапшота или из последней CodeSubmission
     code = ''
@@ -2064,10 +1999,9 @@ def help_request_reply_view(request, help_request_id):
         line_number=line_number,
     )
 
-    hr.has_unread_for_student = True
-    hr.has_unread_for_teacher = False
-    hr.status = 'answered'
-    hr.save(update_fields=['status', 'has_unread_for_student', 'has_unread_for_teacher', 'updated_at'])
+    update_help_request(
+        hr, status='answered', has_unread_for_student=True, has_unread_for_teacher=False,
+    )
 
     # WebSocket-нотификация ученику
     _send_help_ws_notification(hr, comment, is_teacher_reply=True)
@@ -2083,10 +2017,11 @@ def help_request_reply_view(request, help_request_id):
 def help_request_resolve_view(request, help_request_id):
     """Учитель помечает запрос как решённый."""
     hr = get_object_or_404(HelpRequest, id=help_request_id)
-    hr.status = 'resolved'
-    hr.has_unread_for_student = True
-    hr.has_unread_for_teacher = False
-    hr.save(update_fields=['status', 'has_unread_for_student', 'has_unread_for_teacher', 'updated_at'])
+    update_help_request(
+        hr, status='resolved', has_unread_for_student=True, has_unread_for_teacher=False,
+    )
+
+    schedule_profile_snapshot(hr.student_id)
 
     # Нотификация ученику
     _send_help_ws_notification(hr, None, is_teacher_reply=True, resolved=True)
@@ -2096,12 +2031,20 @@ def help_request_resolve_view(request, help_request_id):
 
 @login_required
 def help_unread_count_view(request):
-    """Счётчик непрочитанных (polling fallback)."""
-    if request.user.is_superuser:
-        count = HelpRequest.objects.filter(has_unread_for_teacher=True).exclude(status='resolved').count()
-    else:
-        count = HelpRequest.objects.filter(student=request.user, has_unread_for_student=True).count()
-    return JsonResponse({'unread_count': count})
+    """
+    Счётчик непрочитанных (polling fallback).
+    Число берётся из Redis-счётчика (quizzes/unread.py), ETag — из него же:
+    пока бейдж не изменился, повторный опрос получает 304 без тела.
+    """
+    count = get_unread_count(request.user)
+    scope = 'teachers' if request.user.is_superuser else f'student-{request.user.id}'
+    etag = f'"unread-{scope}-{count}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({'unread_count': count})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @login_required
@@ -2138,44 +2081,56 @@ def help_my_notifications_view(request):
 
 
 def _send_help_ws_notification(hr, comment, is_teacher_reply, resolved=False):
-    """Отправляет WebSocket-нотификацию через channel layer."""
+    """Отправляет WebSocket-нотификацию через channel layer (фоновый publisher)."""
     try:
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
-
-        channel_layer = get_channel_layer()
-        if not channel_layer:
-            return
-
         comment_data = _serialize_comment(comment) if comment else None
 
         if is_teacher_reply:
             # Ученику через quiz-consumer (inline на quiz_detail)
             quiz_group = f"user_{hr.student_id}_quiz_{hr.quiz_id}"
-            async_to_sync(channel_layer.group_send)(quiz_group, {
+            message = {
                 'type': 'help_comment_update',
+                'quiz_id': hr.quiz_id,
                 'question_id': hr.question_id,
                 'comment': comment_data,
                 'status': hr.status,
                 'resolved': resolved,
-            })
+            }
+            publish_event(hr.student_id, hr.quiz_id, message)
+            publish(quiz_group, message)
             # Ученику через notification consumer (бейдж)
-            notif_group = f"notifications_{hr.student_id}"
-            async_to_sync(channel_layer.group_send)(notif_group, {
+            publish(f"notifications_{hr.student_id}", {
                 'type': 'help_notification',
                 'help_request_id': hr.id,
                 'question_id': hr.question_id,
                 'quiz_id': hr.quiz_id,
+                'unread_count': get_student_unread_count(hr.student_id),
             })
         else:
             # Учителям через notification consumer (бейдж)
-            async_to_sync(channel_layer.group_send)('notifications_teachers', {
+            publish('notifications_teachers', {
                 'type': 'help_notification',
                 'help_request_id': hr.id,
                 'question_id': hr.question_id,
                 'quiz_id': hr.quiz_id,
                 'student_name': hr.student.get_full_name() or hr.student.username,
+                'unread_count': get_teacher_unread_count(),
             })
     except Exception:
         # WS нотификации не критичны — есть polling fallback
         pass
+
+
+def _send_help_unread_update(student_id=None, teachers=False):
+    """Рассылает новый счётчик бейджа после прочтения (другие вкладки)."""
+    try:
+        if teachers:
+            group, count = 'notifications_teachers', get_teacher_unread_count()
+        else:
+            group, count = f"notifications_{student_id}", get_student_unread_count(student_id)
+        publish(group, {
+            'type': 'unread_count_update',
+            'unread_count': count,
+        })
+    except Exception:
+        pass
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spetskurs', '0002_simulation_html_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='theoryblock',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Производные изображения'),
+        ),
+    ]
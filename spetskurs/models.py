@@ -62,6 +62,11 @@ class TheoryBlock(models.Model):
         upload_to='spetskurs/theory/images/', blank=True, null=True,
         verbose_name="Изображение"
     )
+    # WebP/AVIF-копии разных ширин, собираются в фоне (pages/images.py)
+    image_derivatives = models.JSONField(
+        default=dict, blank=True, editable=False,
+        verbose_name="Производные изображения"
+    )
     order = models.PositiveIntegerField(default=0, verbose_name="Порядок")
 
     class Meta:
@@ -1,12 +1,16 @@
 /**
  * NotificationManager - Badge notifications via WebSocket with polling fallback
  * + Dropdown with teacher replies for students
+ *
+ * Uses the shared session socket (topic 'notifications', session-socket.js)
+ * when it is loaded, otherwise a dedicated ws/notifications/ socket.
  */
 class NotificationManager {
     constructor() {
         this.socket = null;
         this.connected = false;
         this.pollInterval = null;
+        this.unreadEtag = null; // ETag последнего ответа unread-count: 304, пока счётчик тот же
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 3;
         this.badgeEl = document.getElementById('help-badge-global');
@@ -15,7 +19,31 @@ class NotificationManager {
     }
 
     init() {
-        this.connectWebSocket();
+        if (window.sessionSocket) {
+            this.subscribeSession();
+        } else {
+            this.connectWebSocket();
+        }
+    }
+
+    subscribeSession() {
+        window.sessionSocket.subscribe('notifications', {
+            onMessage: (data) => this.handleMessage(data),
+            onStatus: (status) => {
+                this.connected = status === 'connected';
+                if (status === 'connected') {
+                    this.stopPolling();
+                } else if (status === 'polling') {
+                    this.startPolling();
+                }
+            },
+        });
+    }
+
+    handleMessage(data) {
+        if (data.type === 'unread_count_update' || data.type === 'help_notification') {
+            this.updateBadge(data.unread_count);
+        }
     }
 
     connectWebSocket() {
@@ -32,10 +60,7 @@ class NotificationManager {
             };
 
             this.socket.onmessage = (event) => {
-                const data = JSON.parse(event.data);
-                if (data.type === 'unread_count_update' || data.type === 'help_notification') {
-                    this.updateBadge(data.unread_count);
-                }
+                this.handleMessage(JSON.parse(event.data));
             };
 
             this.socket.onclose = () => {
@@ -77,12 +102,17 @@ class NotificationManager {
             clearInterval(this.pollInterval);
             this.pollInterval = null;
         }
+        // Пока работал WS, бейдж мог измениться — следующий опрос без If-None-Match
+        this.unreadEtag = null;
     }
 
     async poll() {
         try {
-            const response = await fetch('/quizzes/help-requests/unread-count/');
+            const headers = this.unreadEtag ? { 'If-None-Match': this.unreadEtag } : {};
+            const response = await fetch('/quizzes/help-requests/unread-count/', { headers, cache: 'no-store' });
+            if (response.status === 304) return;
             if (response.ok) {
+                this.unreadEtag = response.headers.get('ETag');
                 const data = await response.json();
                 this.updateBadge(data.unread_count);
             }
@@ -5,7 +5,11 @@
  * - WebSocket connection for real-time updates
  * - Code submission via AJAX
  * - UI state management (pending/running/success/failed)
- * - Polling fallback if WebSocket fails
+ * - SSE fallback if WebSocket is blocked (/sse/quiz/<id>/), polling if SSE fails too
+ * - Replay of missed events after reconnect (?last_event_id=, Redis stream)
+ *
+ * Uses the shared session socket (topic 'quiz:<id>', session-socket.js)
+ * when it is loaded, otherwise a dedicated ws/quiz/<id>/ socket.
  */
 class QuizCodeChecker {
     constructor(quizId, csrfToken) {
@@ -15,9 +19,14 @@ class QuizCodeChecker {
         this.connected = false;
         this.pendingSubmissions = new Map(); // questionId -> submissionId
         this.pollInterval = null;
+        this.eventSource = null;
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
         this.reconnectDelay = 1000;
+        this.lastEventId = null; // Наибольший ID события из журнала (quizzes/event_stream.py)
+        this.replayFrom = null; // lastEventId, с которым запрошен повтор, до events_replayed
+        this.seenEventIds = new Set(); // Последние SEEN_EVENT_LIMIT принятых event_id
+        this.statusEtag = null; // ETag последнего ответа /quizzes/submissions/status/
 
         // UI callbacks
         this.onStatusChange = null;
@@ -27,12 +36,44 @@ class QuizCodeChecker {
     }
 
     init() {
-        this.connectWebSocket();
+        if (window.sessionSocket) {
+            this.subscribeSession();
+        } else {
+            this.connectWebSocket();
+        }
+    }
+
+    subscribeSession() {
+        this.topic = `quiz:${this.quizId}`;
+        window.sessionSocket.subscribe(this.topic, {
+            onMessage: (data) => this.handleMessage(data),
+            params: () => {
+                this.replayFrom = this.lastEventId;
+                return this.lastEventId ? { last_event_id: this.lastEventId } : {};
+            },
+            onStatus: (status, info = {}) => {
+                this.connected = status === 'connected';
+                if (status === 'connected') {
+                    this.stopFallback();
+                    if (info.reconnect && !this.lastEventId && this.pendingSubmissions.size > 0) {
+                        this._pollOnce();
+                    }
+                } else if (status === 'polling') {
+                    this.startFallback();
+                    return;
+                }
+                this._notifyConnection(status);
+            },
+        });
     }
 
     connectWebSocket() {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws/quiz/${this.quizId}/`;
+        let wsUrl = `${protocol}//${window.location.host}/ws/quiz/${this.quizId}/`;
+        if (this.lastEventId) {
+            wsUrl += `?last_event_id=${encodeURIComponent(this.lastEventId)}`;
+        }
+        this.replayFrom = this.lastEventId;
 
         try {
             this.socket = new WebSocket(wsUrl);
@@ -42,10 +83,11 @@ class QuizCodeChecker {
                 this.connected = true;
                 const wasReconnect = this.reconnectAttempts > 0;
                 this.reconnectAttempts = 0;
-                this.stopPolling();
+                this.stopFallback();
                 this._notifyConnection('connected');
-                // After reconnect, poll pending submissions once (WS notifications may have been lost)
-                if (wasReconnect && this.pendingSubmissions.size > 0) {
+                // After reconnect the server replays missed events by lastEventId
+                // (events_replayed); without it poll pending submissions once
+                if (wasReconnect && !this.lastEventId && this.pendingSubmissions.size > 0) {
                     this._pollOnce();
                 }
             };
@@ -68,7 +110,7 @@ class QuizCodeChecker {
             };
         } catch (e) {
             console.error('WebSocket connection failed:', e);
-            this.startPolling();
+            this.startFallback();
         }
     }
 
@@ -80,9 +122,8 @@ class QuizCodeChecker {
             this._notifyConnection('reconnecting');
             setTimeout(() => this.connectWebSocket(), delay);
         } else {
-            console.log('Max reconnect attempts reached, falling back to polling');
-            this._notifyConnection('polling');
-            this.startPolling();
+            console.log('Max reconnect attempts reached, falling back to SSE');
+            this.startFallback();
         }
     }
 
@@ -93,7 +134,19 @@ class QuizCodeChecker {
     }
 
     handleMessage(data) {
-        if (data.type === 'submission_update') {
+        if (data.event_id) {
+            // Повтор и живая доставка могут пересечься — пропускаем уже виденное
+            if (!this._isNewEvent(data.event_id)) return;
+            this._rememberEvent(data.event_id);
+        }
+
+        if (data.type === 'events_replayed') {
+            this.replayFrom = null;
+            // Журнал не покрыл разрыв — досверяем ожидающие проверки
+            if (!data.complete && this.pendingSubmissions.size > 0) {
+                this._pollOnce();
+            }
+        } else if (data.type === 'submission_update') {
             this.handleSubmissionUpdate(data);
         } else if (data.type === 'active_submissions') {
             this.handleActiveSubmissions(data.submissions);
@@ -105,6 +158,35 @@ class QuizCodeChecker {
         }
     }
 
+    /**
+     * Повтор из журнала идёт по порядку ID после replayFrom — там достаточно
+     * сравнения. Живые события пишут несколько процессов, а публикатор
+     * собирает их пачками, поэтому порядок ID не гарантирован: их сверяем
+     * с множеством недавно принятых.
+     */
+    _isNewEvent(eventId) {
+        if (this.seenEventIds.has(eventId)) return false;
+        if (this.replayFrom && this._compareEventIds(eventId, this.replayFrom) <= 0) return false;
+        return true;
+    }
+
+    _rememberEvent(eventId) {
+        this.seenEventIds.add(eventId);
+        if (this.seenEventIds.size > QuizCodeChecker.SEEN_EVENT_LIMIT) {
+            // Set хранит порядок вставки — удаляем самый старый
+            this.seenEventIds.delete(this.seenEventIds.values().next().value);
+        }
+        if (!this.lastEventId || this._compareEventIds(eventId, this.lastEventId) > 0) {
+            this.lastEventId = eventId;
+        }
+    }
+
+    _compareEventIds(a, b) {
+        const [aMs, aSeq] = a.split('-').map(Number);
+        const [bMs, bSeq] = b.split('-').map(Number);
+        return aMs - bMs || aSeq - bSeq;
+    }
+
     handleSubmissionUpdate(data) {
         const { question_id, status, is_correct, error_log, cpu_time_ms, memory_kb } = data;
 
@@ -224,43 +306,118 @@ class QuizCodeChecker {
         return Array.from(this.pendingSubmissions.keys());
     }
 
+    /**
+     * Статусы всех ожидающих отправок одним запросом.
+     * If-None-Match с прошлым ETag: пока статусы не менялись, сервер
+     * отвечает 304 без запроса к БД — тогда возвращается null.
+     */
+    async checkSubmissionStatuses() {
+        const ids = Array.from(this.pendingSubmissions.values()).filter(Boolean);
+        if (ids.length === 0) return null;
+
+        const url = `/quizzes/submissions/status/?ids=${ids.join(',')}`;
+        const headers = this.statusEtag ? { 'If-None-Match': this.statusEtag } : {};
+
+        try {
+            const response = await fetch(url, { headers, cache: 'no-store' });
+            if (response.status === 304 || !response.ok) return null;
+            this.statusEtag = response.headers.get('ETag');
+            const data = await response.json();
+            return data.submissions;
+        } catch (e) {
+            console.error('Status check error:', e);
+            return null;
+        }
+    }
+
+    async _pollStatuses() {
+        const statuses = await this.checkSubmissionStatuses();
+        if (!statuses) return;
+        for (const status of statuses) {
+            if (status.status === 'pending' || status.status === 'running') continue;
+            if (this.pendingSubmissions.get(status.question_id) !== status.submission_id) continue;
+            this.handleSubmissionUpdate({
+                question_id: status.question_id,
+                status: status.status,
+                is_correct: status.is_correct,
+                error_log: status.error_log,
+                cpu_time_ms: status.cpu_time_ms,
+                memory_kb: status.memory_kb,
+            });
+        }
+    }
+
     // One-time poll after WS reconnect to catch missed notifications
     async _pollOnce() {
-        for (const [questionId, submissionId] of this.pendingSubmissions) {
-            if (!submissionId) continue;
-            const status = await this.checkSubmissionStatus(submissionId);
-            if (status && status.status !== 'pending' && status.status !== 'running') {
-                this.handleSubmissionUpdate({
-                    question_id: questionId,
-                    status: status.status,
-                    is_correct: status.is_correct,
-                    error_log: status.error_log,
-                    cpu_time_ms: status.cpu_time_ms,
-                    memory_kb: status.memory_kb,
-                });
+        await this._pollStatuses();
+    }
+
+    /**
+     * Fallback при заблокированном WebSocket: поток Server-Sent Events
+     * (QuizEventsConsumer) доставляет вердикты сразу. Сервер закрывает поток
+     * по таймауту, EventSource переподключается сам с Last-Event-ID.
+     * Если SSE тоже не работает — опрос каждые 2 сек.
+     */
+    startFallback() {
+        if (this.eventSource || this.pollInterval) return;
+        if (!window.EventSource) {
+            this._notifyConnection('polling');
+            this.startPolling();
+            return;
+        }
+
+        let url = `/sse/quiz/${this.quizId}/`;
+        if (this.lastEventId) {
+            url += `?last_event_id=${encodeURIComponent(this.lastEventId)}`;
+        }
+
+        let opened = false;
+        let failures = 0;
+        this.eventSource = new EventSource(url);
+
+        this.eventSource.onopen = () => {
+            failures = 0;
+            // Каждое (пере)подключение начинается с повтора журнала
+            this.replayFrom = this.lastEventId;
+            if (!opened) {
+                opened = true;
+                this._notifyConnection('connected');
+            }
+        };
+
+        this.eventSource.onmessage = (event) => {
+            this.handleMessage(JSON.parse(event.data));
+        };
+
+        this.eventSource.onerror = () => {
+            // CONNECTING — штатное переподключение после таймаута сервера
+            if (this.eventSource.readyState === EventSource.CLOSED
+                    || ++failures >= this.maxReconnectAttempts) {
+                console.log('SSE unavailable, falling back to polling');
+                this.stopEventSource();
+                this._notifyConnection('polling');
+                this.startPolling();
             }
+        };
+    }
+
+    stopEventSource() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
         }
     }
 
+    stopFallback() {
+        this.stopEventSource();
+        this.stopPolling();
+    }
+
     // Polling fallback
     startPolling() {
         if (this.pollInterval) return;
 
-        this.pollInterval = setInterval(async () => {
-            for (const [questionId, submissionId] of this.pendingSubmissions) {
-                const status = await this.checkSubmissionStatus(submissionId);
-                if (status && status.status !== 'pending' && status.status !== 'running') {
-                    this.handleSubmissionUpdate({
-                        question_id: questionId,
-                        status: status.status,
-                        is_correct: status.is_correct,
-                        error_log: status.error_log,
-                        cpu_time_ms: status.cpu_time_ms,
-                        memory_kb: status.memory_kb,
-                    });
-                }
-            }
-        }, 2000);
+        this.pollInterval = setInterval(() => this._pollStatuses(), 2000);
     }
 
     stopPolling() {
@@ -271,13 +428,19 @@ class QuizCodeChecker {
     }
 
     destroy() {
-        this.stopPolling();
+        this.stopFallback();
+        if (this.topic && window.sessionSocket) {
+            window.sessionSocket.unsubscribe(this.topic);
+        }
         if (this.socket) {
             this.socket.close();
         }
     }
 }
 
+// Столько же, сколько событий сервер повторяет за раз (REPLAY_LIMIT)
+QuizCodeChecker.SEEN_EVENT_LIMIT = 200;
+
 // Export for module systems, also attach to window for direct use
 if (typeof module !== 'undefined' && module.exports) {
     module.exports = QuizCodeChecker;
@@ -0,0 +1,132 @@
+/**
+ * SessionSocket - one multiplexed WebSocket per page (ws/session/)
+ *
+ * Вместо отдельных ws/quiz/<id>/ и ws/notifications/ менеджеры подписываются
+ * на топики общего сокета:
+ * - 'notifications' — бейдж запросов помощи (NotificationManager)
+ * - 'quiz:<id>'     — проверки кода и ответы учителя (QuizCodeChecker)
+ *
+ * Сообщения сервера несут поле topic и уходят подписчику этого топика.
+ * После переподключения все подписки восстанавливаются автоматически;
+ * params() подписчика добавляются к subscribe (например, last_event_id).
+ * После maxReconnectAttempts неудачных попыток подписчики получают
+ * статус 'polling' и переходят на HTTP-опрос.
+ */
+class SessionSocket {
+    constructor() {
+        this.socket = null;
+        this.connected = false;
+        this.subscriptions = new Map(); // topic -> {onMessage, onStatus, params}
+        this.reconnectAttempts = 0;
+        this.maxReconnectAttempts = 5;
+        this.reconnectDelay = 1000;
+        this.wasConnected = false;
+        this.gaveUp = false;
+    }
+
+    subscribe(topic, { onMessage, onStatus = null, params = null }) {
+        this.subscriptions.set(topic, { onMessage, onStatus, params });
+        if (this.connected) {
+            this._sendSubscribe(topic);
+            this._notify(topic, 'connected', { reconnect: false });
+        } else if (this.gaveUp) {
+            this._notify(topic, 'polling');
+        } else if (!this.socket) {
+            this.connect();
+        }
+    }
+
+    unsubscribe(topic) {
+        if (!this.subscriptions.delete(topic)) return;
+        this.send({ action: 'unsubscribe', topic });
+        if (this.subscriptions.size === 0 && this.socket) {
+            this.socket.onclose = null;
+            this.socket.close();
+            this.socket = null;
+            this.connected = false;
+        }
+    }
+
+    send(data) {
+        if (this.connected && this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(JSON.stringify(data));
+            return true;
+        }
+        return false;
+    }
+
+    connect() {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const wsUrl = `${protocol}//${window.location.host}/ws/session/`;
+
+        try {
+            this.socket = new WebSocket(wsUrl);
+
+            this.socket.onopen = () => {
+                this.connected = true;
+                const reconnect = this.wasConnected || this.reconnectAttempts > 0;
+                this.wasConnected = true;
+                this.reconnectAttempts = 0;
+                for (const topic of this.subscriptions.keys()) {
+                    this._sendSubscribe(topic);
+                    this._notify(topic, 'connected', { reconnect });
+                }
+            };
+
+            this.socket.onmessage = (event) => {
+                const data = JSON.parse(event.data);
+                const sub = this.subscriptions.get(data.topic);
+                if (sub) sub.onMessage(data);
+            };
+
+            this.socket.onclose = () => {
+                this.connected = false;
+                this._notifyAll('disconnected');
+                this.attemptReconnect();
+            };
+
+            this.socket.onerror = () => {
+                this.connected = false;
+            };
+        } catch (e) {
+            this.gaveUp = true;
+            this._notifyAll('polling');
+        }
+    }
+
+    attemptReconnect() {
+        if (this.subscriptions.size === 0) {
+            this.socket = null;
+            return;
+        }
+        if (this.reconnectAttempts < this.maxReconnectAttempts) {
+            this.reconnectAttempts++;
+            const delay = this.reconnectDelay * Math.pow(2, this.reconnectAttempts - 1);
+            this._notifyAll('reconnecting');
+            setTimeout(() => this.connect(), delay);
+        } else {
+            this.gaveUp = true;
+            this._notifyAll('polling');
+        }
+    }
+
+    _sendSubscribe(topic) {
+        const sub = this.subscriptions.get(topic);
+        const params = sub && sub.params ? sub.params() : {};
+        this.send({ action: 'subscribe', topic, ...params });
+    }
+
+    _notify(topic, status, info = {}) {
+        const sub = this.subscriptions.get(topic);
+        if (sub && sub.onStatus) sub.onStatus(status, info);
+    }
+
+    _notifyAll(status) {
+        for (const topic of this.subscriptions.keys()) {
+            this._notify(topic, status);
+        }
+    }
+}
+
+window.SessionSocket = SessionSocket;
+window.sessionSocket = new SessionSocket();